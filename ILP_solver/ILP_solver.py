@@ -1,12 +1,17 @@
 from gurobipy import *
+import sys
 import networkx
 import time as python_time
 sys.path.append("..")
 from utils import execution_time, print_edges_in_graph
+from ILP_solver.formulation import build_formulation, edge_variable_slice
+from ILP_solver.backends import build_gurobi_model, gurobi_status
+from ILP_solver.instrumentation import new_stats, timed_phase, gurobi_model_stats, first_incumbent_callback
 
 epsilon = 0.000000001
 
-def solve_TCP_instance(model, graph, edge_variables, detailed_output=True, time_output=False):
+def solve_TCP_instance(model, graph, edge_variables, detailed_output=True, time_output=False, return_stats=False,
+					   quiet=False, profiler=None, edge_mapping=None):
 
 	"""
 	Given a simple TCP problem instance, returns a minimum weight subgraph that satisfies the demand.
@@ -16,29 +21,19 @@ def solve_TCP_instance(model, graph, edge_variables, detailed_output=True, time_
 	:param edge_variables: a dictionary of variables corresponding to the variables d_v,w
 	:param detailed_output: flag which when True will print the edges in the optimal subgraph
 	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
-	:return: a optimal subgraph containing the path if the solution is Optimal, else None
+	:param return_stats: flag which when True also returns a stats record (see ILP_solver/instrumentation.py)
+	:param quiet: flag which when True prints nothing, the Gurobi log included
+	:param profiler: a function profiler(phase, seconds, stats) called at the end of every phase (ignored if None)
+	:param edge_mapping: the edge mapping of a reduced graph (see graph_tools/reduction.py), to return the subgraph
+						 over the edges of the original graph (ignored if None)
+	:return: a optimal subgraph containing the path if the solution is Optimal, else None (followed by the stats
+			 record if return_stats)
 	"""
+	return solve_model(model, graph, edge_variables, detailed_output, time_output, return_stats, quiet, profiler,
+					   edge_mapping)
 
-	start_time = python_time.time()
-
-
-	# SOLVE AND RECOVER SOLUTION
-	print('-----------------------------------------------------------------------')
-	model.optimize()
-	print "Solution Count: " + str(model.SolCount)
-	subgraph = retreive_and_print_subgraph(model, graph, edge_variables, detailed_output)
-
-	end_time = python_time.time()
-	days, hours, minutes, seconds = execution_time(start_time, end_time)
-	print('sDCP solving took %s days, %s hours, %s minutes, %s seconds' % (days, hours, minutes, seconds))
-
-	# Return solution iff found
-	if time_output:
-		return end_time - start_time
-
-	return subgraph if model.status == GRB.status.OPTIMAL else None
-
-def solve_multi_destination_TCP_instance(model, graph, edge_variables, detailed_output=True, time_output=False):
+def solve_multi_destination_TCP_instance(model, graph, edge_variables, detailed_output=True, time_output=False,
+										 return_stats=False, quiet=False, profiler=None, edge_mapping=None):
 	"""
 	Given a multi-destination TCP problem instance, returns a minimum weight subgraph that satisfies the demand.
 
@@ -47,36 +42,67 @@ def solve_multi_destination_TCP_instance(model, graph, edge_variables, detailed_
 	:param edge_variables: a dictionary of variables corresponding to the variables d_v,w
 	:param detailed_output: flag which when True will print the edges in the optimal subgraph
 	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
-	:return: a optimal subgraph containing the path(s) if the solution is Optimal, else None
+	:param return_stats: flag which when True also returns a stats record (see ILP_solver/instrumentation.py)
+	:param quiet: flag which when True prints nothing, the Gurobi log included
+	:param profiler: a function profiler(phase, seconds, stats) called at the end of every phase (ignored if None)
+	:param edge_mapping: the edge mapping of a reduced graph (see graph_tools/reduction.py), to return the subgraph
+						 over the edges of the original graph (ignored if None)
+	:return: a optimal subgraph containing the path(s) if the solution is Optimal, else None (followed by the stats
+			 record if return_stats)
 	"""
-	start_time = python_time.time()
+	return solve_model(model, graph, edge_variables, detailed_output, time_output, return_stats, quiet, profiler,
+					   edge_mapping)
 
+def solve_model(model, graph, edge_variables, detailed_output=True, time_output=False, return_stats=False, quiet=False,
+				profiler=None, edge_mapping=None):
+	"""
+	Shared solver of solve_TCP_instance and solve_multi_destination_TCP_instance. The build time in the stats record
+	is the one measured by the model generator.
+	"""
+	start_time = python_time.time()
+	stats = new_stats()
+	stats['build_time'] = getattr(model, '_build_time', None)
+	if quiet:
+		model.Params.OutputFlag = 0
 
 	# SOLVE AND RECOVER SOLUTION
-	print('-----------------------------------------------------------------------')
-	model.optimize()
-
-	# Recover minimal subgraph
-	subgraph = retreive_and_print_subgraph(model, graph, edge_variables, detailed_output)
-
+	if not quiet:
+		print('-----------------------------------------------------------------------')
+	with timed_phase(stats, 'solve', profiler):
+		model.optimize(first_incumbent_callback(stats))
+	gurobi_model_stats(stats, model)
+	if not quiet:
+		print('Solution Count: ' + str(model.SolCount))
+	with timed_phase(stats, 'extraction', profiler):
+		subgraph = retreive_and_print_subgraph(model, graph, edge_variables, detailed_output, quiet, edge_mapping)
+	stats['status'] = gurobi_status(model)
+	stats['objective'] = model.objVal if model.SolCount > 0 else None
 
 	end_time = python_time.time()
-	days, hours, minutes, seconds = execution_time(start_time, end_time)
-	print('sDCP solving took %s days, %s hours, %s minutes, %s seconds' % (days, hours, minutes, seconds))
+	stats['total_time'] = end_time - start_time
+	if not quiet:
+		days, hours, minutes, seconds = execution_time(start_time, end_time)
+		print('sDCP solving took %s days, %s hours, %s minutes, %s seconds' % (days, hours, minutes, seconds))
 
 	# Return solution iff found
 	if time_output:
 		return end_time - start_time
-	return subgraph if model.status == GRB.status.OPTIMAL else None
+	subgraph = subgraph if model.status == GRB.status.OPTIMAL else None
+	if return_stats:
+		return subgraph, stats
+	return subgraph
 
-def generate_TCP_model(graph, existence_for_node_time, connectivity_demand):
+def generate_TCP_model(graph, existence_for_node_time, connectivity_demand, waiting=False):
 	"""
 
 	:param graph: a directed graph with attribute 'weight' on all edges
 	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
 	:param connectivity_demand: a connectivity demand (source, demand)
+	:param waiting: flag which when True lets flow wait at active nodes for free (see generate_waiting_variables)
 	:return: a Gurobi model pertaining to the TCP instance, and the edge_variables involved
 	"""
+	start_time = python_time.time()
+
 	# MODEL SETUP
 	# Infer a list of times
 	times = list(set([node_time[1] for node_time in existence_for_node_time.keys()]))
@@ -102,6 +128,9 @@ def generate_TCP_model(graph, existence_for_node_time, connectivity_demand):
 	for u, v in graph.edges_iter():
 		edge_variables[u, v] = model.addVar(vtype=GRB.BINARY, name='edge_%s_%s' % (u, v))
 
+	# Create variables w_{vt}
+	waiting_variables = generate_waiting_variables(model, graph, existence_for_node_time, times, 1) if waiting else {}
+
 	model.update()
 
 	# CONSTRAINTS
@@ -130,23 +159,26 @@ def generate_TCP_model(graph, existence_for_node_time, connectivity_demand):
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t - 1, t] for u in graph.predecessors_iter(v)) +
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
 					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
-					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v))
+					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 			if t == 0:
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
 					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
-					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v))
+					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 			if t == max(times):
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t - 1, t] for u in graph.predecessors_iter(v)) +
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
-					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v))
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
+					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 
 	# OBJECTIVE
@@ -154,15 +186,20 @@ def generate_TCP_model(graph, existence_for_node_time, connectivity_demand):
 	objective_expression = quicksum(edge_variables[u, v] * graph[u][v]['weight'] for u, v in graph.edges_iter())
 	model.setObjective(objective_expression, GRB.MINIMIZE)
 
+	# Build time, reported by solve_TCP_instance/solve_multi_destination_TCP_instance with return_stats
+	model._build_time = python_time.time() - start_time
 	return model, edge_variables
 
-def generate_mTCP_model(graph, existence_for_node_time, source, destinations):
+def generate_mTCP_model(graph, existence_for_node_time, source, destinations, waiting=False):
 	"""
 	:param graph: a directed graph with attribute 'weight' on all edges
 	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
 	:param connectivity_demand: a connectivity demand (source, demand)
+	:param waiting: flag which when True lets flow wait at active nodes for free (see generate_waiting_variables)
 	:return: a Gurobi model pertaining to the mTCP instance, and the edge_variables involved
 	"""
+	start_time = python_time.time()
+
 	# Infer a list of times
 	times = list(set([node_time[1] for node_time in existence_for_node_time.keys()]))
 
@@ -187,6 +224,10 @@ def generate_mTCP_model(graph, existence_for_node_time, source, destinations):
 	for u, v in graph.edges_iter():
 		edge_variables[u, v] = model.addVar(vtype=GRB.BINARY, name='edge_%s_%s' % (u, v))
 
+	# Create variables w_{vt}
+	waiting_variables = generate_waiting_variables(model, graph, existence_for_node_time, times,
+												   len(destinations)) if waiting else {}
+
 	model.update()
 
 	# CONSTRAINTS
@@ -215,23 +256,26 @@ def generate_mTCP_model(graph, existence_for_node_time, source, destinations):
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t-1, t] for u in graph.predecessors_iter(v)) +
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
 					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
-					quicksum(edge_time_variables[v, w, t, t+1] for w in graph.successors_iter(v))
+					quicksum(edge_time_variables[v, w, t, t+1] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 			if t == 0:
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
 					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
-					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v))
+					quicksum(edge_time_variables[v, w, t, t + 1] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 			if t == max(times):
 				model.addConstr(
 					quicksum(edge_time_variables[u, v, t - 1, t] for u in graph.predecessors_iter(v)) +
 					quicksum(edge_time_variables[u, v, t, t] for u in graph.predecessors_iter(v)) +
-					sourceflow[v, t] ==
-					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v))
+					waiting_variables.get((v, t - 1), 0) + sourceflow[v, t] ==
+					quicksum(edge_time_variables[v, w, t, t] for w in graph.successors_iter(v)) +
+					waiting_variables.get((v, t), 0)
 				)
 
 
@@ -240,6 +284,76 @@ def generate_mTCP_model(graph, existence_for_node_time, source, destinations):
 	objective_expression = quicksum(edge_variables[u, v] * graph[u][v]['weight'] for u, v in graph.edges_iter())
 	model.setObjective(objective_expression, GRB.MINIMIZE)
 
+	# Build time, reported by solve_TCP_instance/solve_multi_destination_TCP_instance with return_stats
+	model._build_time = python_time.time() - start_time
+	return model, edge_variables
+
+def generate_waiting_variables(model, graph, existence_for_node_time, times, capacity):
+	"""
+	Creates the variables w_{vt} of the flow waiting at node v from t to t+1, for every node active at t and t+1.
+	They replace the self-loop edges of weight 0.001 that the graph generators add to let paths wait
+	(see remove_waiting_self_loops in graph_tools/graph_generator.py).
+
+	:param model: a Gurobi model
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param times: the list of times
+	:param capacity: the upper bound of the variables (the number of destinations)
+	:return: a dictionary from (node, time) to waiting variable
+	"""
+	waiting_variables = {}
+	for v in graph.nodes_iter():
+		for t in times:
+			if t + 1 in times and existence_for_node_time[v, t] and existence_for_node_time[v, t + 1]:
+				waiting_variables[v, t] = model.addVar(vtype=GRB.BINARY if capacity == 1 else GRB.INTEGER, lb=0,
+													   ub=capacity, name='wait_%s_%s' % (v, t))
+	return waiting_variables
+
+def generate_sparse_TCP_model(graph, existence_for_node_time, connectivity_demand, variable_names=True, waiting=False):
+	"""
+	Builds the same TCP model as generate_TCP_model, but only creates the variables d_{uvtt'} with t' in {t, t+1}
+	whose endpoints are both active, and adds all constraints in bulk through the matrix API.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param variable_names: flag which when False skips the per-variable string names
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:return: a Gurobi model pertaining to the TCP instance, and the edge_variables involved
+	"""
+	source, destination = connectivity_demand
+	return generate_sparse_model(graph, existence_for_node_time, source, [destination], variable_names, waiting)
+
+def generate_sparse_mTCP_model(graph, existence_for_node_time, source, destinations, variable_names=True,
+							   waiting=False):
+	"""
+	Builds the same mTCP model as generate_mTCP_model, but only creates the variables d_{uvtt'} with t' in {t, t+1}
+	whose endpoints are both active, and adds all constraints in bulk through the matrix API.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param variable_names: flag which when False skips the per-variable string names
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:return: a Gurobi model pertaining to the mTCP instance, and the edge_variables involved
+	"""
+	return generate_sparse_model(graph, existence_for_node_time, source, destinations, variable_names, waiting)
+
+def generate_sparse_model(graph, existence_for_node_time, source, destinations, variable_names=True, waiting=False):
+	"""
+	Shared builder of generate_sparse_TCP_model and generate_sparse_mTCP_model. With a single destination the
+	edge-time variables are binary, otherwise they are integers in [0, len(destinations)].
+
+	:return: a Gurobi model, and the edge_variables involved
+	"""
+	start_time = python_time.time()
+	formulation = build_formulation(graph, existence_for_node_time, source, destinations, waiting)
+	model, variables = build_gurobi_model(formulation, variable_names)
+
+	model_variables = model.getVars()
+	edge_variables = dict(zip(formulation.instance.edge_list(), model_variables[edge_variable_slice(formulation)]))
+	model._build_time = python_time.time() - start_time
 	return model, edge_variables
 
 
@@ -263,15 +377,34 @@ def add_optimal_solution_constraint(model, subgraph, edge_variables, strictly_op
 
 	return model
 
+def add_heuristic_start(model, subgraph, edge_variables):
+	"""
+	Uses a feasible subgraph (e.g. from heuristic_TCP_instance or heuristic_mTCP_instance) as a MIP start, and cuts off
+	every solution more expensive than it. Only the edge variables are set, Gurobi completes the edge-time variables.
 
+	:param model: a Gurobi model to be optimized, from generate_TCP_model, generate_mTCP_model or the sparse builders
+	:param subgraph: a directed graph with attribute 'weight' on all edges, which satisfies the demand of the model
+	:param edge_variables: a dictionary of variables corresponding to the variables d_v,w
+	:return: the model
+	"""
+	for (u, v), edge_variable in edge_variables.items():
+		edge_variable.Start = 1 if subgraph.has_edge(u, v) else 0
 
-def retreive_and_print_subgraph(model, graph, edge_variables, detailed_output):
+	cost = subgraph.size(weight='weight')
+	model.Params.Cutoff = cost + 1e-6 * max(1.0, abs(cost))
+	return model
+
+
+def retreive_and_print_subgraph(model, graph, edge_variables, detailed_output, quiet=False, edge_mapping=None):
 	"""
 
 	:param model: an optimized gurobi model
 	:param graph: a directed graph with attribute 'weight' on all edges
 	:param edge_variables: a dictionary of variables corresponding to the variables d_v,w
 	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param quiet: flag which when True prints nothing
+	:param edge_mapping: a dictionary from every edge of a reduced graph to the list of original edges (u, v, weight)
+						 it stands for (see graph_tools/reduction.py), which the subgraph is expanded to (ignored if None)
 	"""
 	# Recover minimal subgraph
 	subgraph = networkx.DiGraph()
@@ -279,13 +412,18 @@ def retreive_and_print_subgraph(model, graph, edge_variables, detailed_output):
 		value_for_edge = model.getAttr('x', edge_variables)
 		for u,v in graph.edges_iter():
 			if value_for_edge[u,v] > 0:
-				subgraph.add_edge(u, v, weight=graph[u][v]['weight'])
+				if edge_mapping is None:
+					subgraph.add_edge(u, v, weight=graph[u][v]['weight'])
+				else:
+					for tail, head, weight in edge_mapping[u, v]:
+						subgraph.add_edge(tail, head, weight=weight)
 
 		# Print solution
-		print('-----------------------------------------------------------------------')
-		print('Solved sDCP instance. Optimal Solution costs ' + str(model.objVal))
-		if detailed_output:
-			print('Edges in minimal subgraph:')
-			print_edges_in_graph(subgraph)
+		if not quiet:
+			print('-----------------------------------------------------------------------')
+			print('Solved sDCP instance. Optimal Solution costs ' + str(model.objVal))
+			if detailed_output:
+				print('Edges in minimal subgraph:')
+				print_edges_in_graph(subgraph)
 		return subgraph
 
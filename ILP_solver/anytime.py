@@ -0,0 +1,315 @@
+"""
+This file implements anytime solving: under a wall-clock budget, the solver streams every improving feasible subgraph
+(incumbent) as soon as it is found, together with its objective and the best known lower bound, and stops as soon as
+the relative gap between the two reaches a target or the budget runs out.
+
+The first incumbent is the heuristic subgraph (see ILP_solver/heuristic.py), available before the solver starts.
+With the gurobi backend, every incumbent found during the branch and bound is streamed from a callback, while the
+solver keeps running in a background thread. scipy.optimize.milp has no callbacks and blocks until it returns, so with
+the highs backend nothing is streamed while the solver runs: only the heuristic subgraph and the final solution are
+yielded, which makes it a plain time-limited solve. The backend is gurobi by default when gurobipy is installed.
+
+Anytime solves are generators of Incumbent records, which can be stopped at any time:
+
+	for incumbent in anytime_TCP_instance(graph, existence_for_node_time, (source, destination), time_budget=60):
+		print(incumbent.objective, incumbent.bound)
+
+or are run to the end with solve_anytime_TCP_instance/solve_anytime_mTCP_instance, which call a callback on every
+incumbent and return the best one.
+"""
+from collections import namedtuple
+import threading
+import time as python_time
+import networkx
+import numpy
+from ILP_solver.backends import OPTIMAL, INFEASIBLE, build_gurobi_model, set_gurobi_options, solve_with_highs, \
+	formulation_subgraph, start_cutoff, SolveResult
+from ILP_solver.formulation import build_instance_formulation
+from ILP_solver.heuristic import heuristic_start
+from ILP_solver.presolve import presolve_instance
+from graph_tools.temporal_instance import TemporalInstance
+from utils import print_edges_in_graph
+
+try:
+	import gurobipy
+except ImportError:
+	gurobipy = None
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+# The only backend that streams the incumbents found while the solver runs, when it is installed
+DEFAULT_BACKEND = 'gurobi' if gurobipy is not None else 'highs'
+
+# An improving feasible solution: the subgraph, its objective, the best lower bound known when it was found (None if
+# no bound is known yet) and the wall-clock time since the start of the solve, in seconds
+Incumbent = namedtuple('Incumbent', ['subgraph', 'objective', 'bound', 'time'])
+
+# Seconds between two checks of the time budget while waiting for the next Gurobi incumbent
+POLL_INTERVAL = 0.1
+
+
+def solve_anytime_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_budget, target_gap=0.0,
+							   callback=None, backend=DEFAULT_BACKEND, detailed_output=True, **options):
+	"""
+	Given a simple TCP problem instance, returns the best subgraph that satisfies the demand found within the time
+	budget.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param time_budget: wall-clock budget in seconds, presolve and model building included
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param callback: a function callback(incumbent) called on every Incumbent (ignored if None)
+	:param backend: 'gurobi' or 'highs' (see anytime_instance)
+	:param detailed_output: flag which when True will print the edges in the best subgraph
+	:param options: the options of anytime_instance
+	:return: the best Incumbent, or None if no feasible subgraph was found
+	"""
+	source, destination = connectivity_demand
+	return solve_anytime_mTCP_instance(graph, existence_for_node_time, source, [destination], time_budget, target_gap,
+									   callback, backend, detailed_output, **options)
+
+def solve_anytime_mTCP_instance(graph, existence_for_node_time, source, destinations, time_budget, target_gap=0.0,
+								callback=None, backend=DEFAULT_BACKEND, detailed_output=True, **options):
+	"""
+	Given a multi-destination TCP problem instance, returns the best subgraph that satisfies the demand found within
+	the time budget.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param time_budget: wall-clock budget in seconds, presolve and model building included
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param callback: a function callback(incumbent) called on every Incumbent (ignored if None)
+	:param backend: 'gurobi' or 'highs' (see anytime_instance)
+	:param detailed_output: flag which when True will print the edges in the best subgraph
+	:param options: the options of anytime_instance
+	:return: the best Incumbent, or None if no feasible subgraph was found
+	"""
+	best = None
+	for incumbent in anytime_mTCP_instance(graph, existence_for_node_time, source, destinations, time_budget,
+										   target_gap, backend, **options):
+		if callback is not None:
+			callback(incumbent)
+		best = incumbent
+
+	print('-----------------------------------------------------------------------')
+	if best is None:
+		print('No feasible subgraph of sDCP instance found')
+		return None
+	print('Best subgraph of sDCP instance costs %s (lower bound %s, found after %.3f s)'
+		  % (best.objective, best.bound, best.time))
+	if detailed_output:
+		print('Edges in best subgraph:')
+		print_edges_in_graph(best.subgraph)
+	return best
+
+def anytime_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_budget, target_gap=0.0,
+						 backend=DEFAULT_BACKEND, **options):
+	"""
+	Generator of the improving subgraphs of a TCP instance found within the time budget (see anytime_instance).
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param time_budget: wall-clock budget in seconds, presolve and model building included
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param backend: 'gurobi' or 'highs' (see anytime_instance)
+	:param options: the options of anytime_instance
+	"""
+	source, destination = connectivity_demand
+	return anytime_mTCP_instance(graph, existence_for_node_time, source, [destination], time_budget, target_gap,
+								 backend, **options)
+
+def anytime_mTCP_instance(graph, existence_for_node_time, source, destinations, time_budget, target_gap=0.0,
+						  backend=DEFAULT_BACKEND, **options):
+	"""
+	Generator of the improving subgraphs of an mTCP instance found within the time budget (see anytime_instance).
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param time_budget: wall-clock budget in seconds, presolve and model building included
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param backend: 'gurobi' or 'highs' (see anytime_instance)
+	:param options: the options of anytime_instance
+	"""
+	start_time = python_time.time()
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	return anytime_instance(instance, source, destinations, time_budget, target_gap, backend,
+							start_time=start_time, **options)
+
+def anytime_instance(instance, source, destinations, time_budget, target_gap=0.0, backend=DEFAULT_BACKEND,
+					 waiting=False, presolve=True, use_heuristic=True, threads=None, output=False, start_time=None):
+	"""
+	Generator of the improving subgraphs of a TemporalInstance found within the time budget. Every Incumbent is
+	cheaper than the previous one, except the last, which repeats the best subgraph with the final bound when the
+	solver improved the bound after it was found. The generator ends when the gap reaches target_gap (in particular
+	when the best subgraph is proven optimal), when the budget runs out, or when the instance is infeasible (in which
+	case nothing is yielded). Stopping the generator early stops the solver.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param time_budget: wall-clock budget in seconds, presolve and model building included
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param backend: 'gurobi' (every incumbent is streamed as it is found) or 'highs' (only the heuristic subgraph and
+					the final solution are yielded), gurobi by default when gurobipy is installed
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param presolve: flag which when True runs the temporal reachability presolve before building the model
+	:param use_heuristic: flag which when True yields the heuristic subgraph first, and passes it to the backend as a
+						  MIP start and cutoff
+	:param threads: number of solver threads (solver default if None)
+	:param output: flag which when True prints the solver log
+	:param start_time: the time.time() at which the budget started (now if None)
+	"""
+	if backend not in ('gurobi', 'highs'):
+		raise ValueError('Unknown backend %s, expected gurobi or highs' % backend)
+	if start_time is None:
+		start_time = python_time.time()
+	deadline = start_time + time_budget
+
+	if presolve:
+		instance, presolve_stats = presolve_instance(instance, source, destinations, detailed_output=output,
+													 waiting=waiting)
+		if not presolve_stats['feasible']:
+			return
+	formulation = build_instance_formulation(instance, source, destinations, waiting)
+
+	start = heuristic_start(formulation, source, destinations) if use_heuristic else None
+	best_objective, best_values, best_bound = None, start, None
+	if start is not None:
+		best_objective = float(formulation.objective.dot(start))
+		yield Incumbent(values_subgraph(formulation, start), best_objective, None, python_time.time() - start_time)
+
+	time_limit = deadline - python_time.time()
+	if time_limit <= 0:
+		return
+	if backend == 'gurobi':
+		solutions = gurobi_formulation_incumbents(formulation, start, time_limit, target_gap, threads, output)
+	else:
+		solutions = highs_formulation_incumbents(formulation, start, time_limit, target_gap, output)
+
+	for objective, bound, values in solutions:
+		if values is not None:
+			if best_objective is None or objective < best_objective - 1e-9:
+				best_objective, best_values, best_bound = objective, values, bound
+				yield Incumbent(values_subgraph(formulation, values), objective, bound, python_time.time() - start_time)
+		elif best_values is not None and bound is not None and bound != best_bound:
+			# The final bound of the solve, reported with the best subgraph found
+			yield Incumbent(values_subgraph(formulation, best_values), best_objective, min(bound, best_objective),
+							python_time.time() - start_time)
+
+def values_subgraph(formulation, values):
+	"""
+	:return: the subgraph chosen by a solution vector of a formulation
+	"""
+	return formulation_subgraph(formulation, SolveResult(OPTIMAL, None, values, None))
+
+def gurobi_formulation_incumbents(formulation, start, time_limit, target_gap, threads=None, output=False):
+	"""
+	Solves a formulation with Gurobi, generating (objective, bound, values) for every incumbent found, where values is
+	the solution vector, then (None, final bound, None) when the solve ends.
+	"""
+	model, variables = build_gurobi_model(formulation)
+	set_gurobi_options(model, threads, time_limit, output, target_gap)
+	if start is not None:
+		variables.Start = start
+		model.Params.Cutoff = start_cutoff(formulation, start)
+
+	for objective, bound, values in gurobi_incumbents(model, model.getVars()):
+		yield objective, bound, numpy.array(values)
+
+	if model.Status == gurobipy.GRB.CUTOFF:
+		# Nothing is cheaper than the start
+		yield None, float(formulation.objective.dot(start)), None
+	elif model.Status == gurobipy.GRB.INFEASIBLE:
+		return
+	elif model.SolCount > 0 or start is not None:
+		yield None, model.ObjBound, None
+
+def highs_formulation_incumbents(formulation, start, time_limit, target_gap, output=False):
+	"""
+	Solves a formulation with HiGHS, generating (objective, bound, values) for the solution found, if any, then
+	(None, final bound, None).
+	"""
+	stats = {}
+	result = solve_with_highs(formulation, time_limit=time_limit, output=output, start=start, stats=stats,
+							  mip_gap=target_gap)
+	if result.status == INFEASIBLE or result.values is None:
+		return
+	yield result.objective, stats['bound'], result.values
+	bound = result.objective if result.status == OPTIMAL and stats['bound'] is None else stats['bound']
+	yield None, bound, None
+
+def gurobi_incumbents(model, variables):
+	"""
+	Optimizes a Gurobi model in a background thread, generating (objective, bound, values) for every incumbent as soon
+	as the solver finds it, where values are the values of the given variables. The solver stops at its own time limit
+	and gap, and is terminated if the generator is closed early.
+
+	:param model: a Gurobi model, with its parameters set
+	:param variables: a list of the model's variables whose values are reported
+	"""
+	GRB = gurobipy.GRB
+	solutions = queue.Queue()
+	done = object()
+
+	def callback(callback_model, where):
+		if where == GRB.Callback.MIPSOL:
+			solutions.put((callback_model.cbGet(GRB.Callback.MIPSOL_OBJ), callback_model.cbGet(GRB.Callback.MIPSOL_OBJBND),
+						   callback_model.cbGetSolution(variables)))
+
+	def optimize():
+		try:
+			model.optimize(callback)
+		finally:
+			solutions.put(done)
+
+	thread = threading.Thread(target=optimize)
+	thread.daemon = True
+	thread.start()
+	try:
+		while True:
+			try:
+				solution = solutions.get(timeout=POLL_INTERVAL)
+			except queue.Empty:
+				continue
+			if solution is done:
+				break
+			yield solution
+	finally:
+		model.terminate()
+		thread.join()
+
+def anytime_model(model, graph, edge_variables, time_budget, target_gap=0.0, output=True):
+	"""
+	Generator of the improving subgraphs of a model built by generate_TCP_model/generate_mTCP_model found within the
+	time budget, followed by the best subgraph again with the final bound. Stopping the generator early stops the
+	solver.
+
+	:param model: a gurobi model
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param edge_variables: a dictionary of variables corresponding to the variables d_v,w
+	:param time_budget: wall-clock budget in seconds
+	:param target_gap: relative gap between the incumbent and the bound at which the solve stops
+	:param output: flag which when False silences the solver log
+	"""
+	start_time = python_time.time()
+	set_gurobi_options(model, time_limit=time_budget, output=output, mip_gap=target_gap)
+	edges = graph.edges()
+	best = None
+	for objective, bound, values in gurobi_incumbents(model, [edge_variables[u, v] for u, v in edges]):
+		subgraph = networkx.DiGraph()
+		for (u, v), value in zip(edges, values):
+			if value > 0.5:
+				subgraph.add_edge(u, v, weight=graph[u][v]['weight'])
+		best = Incumbent(subgraph, objective, bound, python_time.time() - start_time)
+		yield best
+	if best is not None and model.SolCount > 0 and model.ObjBound != best.bound:
+		yield best._replace(bound=min(model.ObjBound, best.objective), time=python_time.time() - start_time)
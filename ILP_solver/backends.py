@@ -0,0 +1,350 @@
+"""
+This file solves sparse TCP/mTCP formulations (see ILP_solver/formulation.py) with interchangeable MILP backends:
+Gurobi (requires a license) and HiGHS through scipy.optimize.milp (open source, runs locally).
+"""
+from collections import namedtuple
+import time as python_time
+import networkx
+import numpy
+from ILP_solver.formulation import build_instance_formulation, edge_variable_slice
+from ILP_solver.heuristic import heuristic_start
+from ILP_solver.instrumentation import new_stats, timed_phase, formulation_size_stats, gurobi_model_stats, first_incumbent_callback
+from ILP_solver.presolve import presolve_instance
+from graph_tools.reduction import reduce_instance, expand_subgraph
+from graph_tools.temporal_instance import TemporalInstance
+from utils import execution_time, print_edges_in_graph
+
+try:
+	import gurobipy
+except ImportError:
+	gurobipy = None
+
+OPTIMAL = 'optimal'
+# A feasible solution was found, but the solve stopped (e.g. at its time limit) before proving it optimal
+FEASIBLE = 'feasible'
+INFEASIBLE = 'infeasible'
+TIME_LIMIT = 'time_limit'
+OTHER = 'other'
+
+# status is one of the constants above, values is the solution vector over the formulation's variables
+# (None if no feasible solution was found, in which case the status is never OPTIMAL or FEASIBLE)
+SolveResult = namedtuple('SolveResult', ['status', 'objective', 'values', 'solve_time'])
+
+
+def solve_sparse_TCP_instance(graph, existence_for_node_time, connectivity_demand, backend='highs', detailed_output=True,
+							  time_output=False, **options):
+	"""
+	Given a simple TCP problem instance, returns a minimum weight subgraph that satisfies the demand, using the
+	sparse formulation and the chosen backend.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
+	:param options: use_heuristic, presolve, reduce_graph, waiting, return_stats, quiet, profiler (see
+					solve_sparse_instance) and backend options (threads, time_limit, output)
+	:return: a optimal subgraph containing the path if the solution is Optimal, the best subgraph found if the solve
+			 stopped before proving optimality (status 'feasible'), else None
+	"""
+	source, destination = connectivity_demand
+	return solve_sparse_instance(graph, existence_for_node_time, source, [destination], backend, detailed_output,
+								 time_output, **options)
+
+def solve_sparse_mTCP_instance(graph, existence_for_node_time, source, destinations, backend='highs',
+							   detailed_output=True, time_output=False, **options):
+	"""
+	Given a multi-destination TCP problem instance, returns a minimum weight subgraph that satisfies the demand, using
+	the sparse formulation and the chosen backend.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
+	:param options: use_heuristic, presolve, reduce_graph, waiting, return_stats, quiet, profiler (see
+					solve_sparse_instance) and backend options (threads, time_limit, output)
+	:return: a optimal subgraph containing the path(s) if the solution is Optimal, the best subgraph found if the solve
+			 stopped before proving optimality (status 'feasible'), else None
+	"""
+	return solve_sparse_instance(graph, existence_for_node_time, source, destinations, backend, detailed_output,
+								 time_output, **options)
+
+def solve_sparse_instance(graph, existence_for_node_time, source, destinations, backend='highs', detailed_output=True,
+						  time_output=False, use_heuristic=True, presolve=False, reduce_graph=False, waiting=False,
+						  return_stats=False, quiet=False, profiler=None, **options):
+	"""
+	Shared solver of solve_sparse_TCP_instance and solve_sparse_mTCP_instance.
+
+	:param use_heuristic: flag which when True passes the heuristic subgraph (see ILP_solver/heuristic.py) to the
+						  backend as a MIP start and cutoff
+	:param presolve: flag which when True runs the temporal reachability presolve before building the model
+	:param reduce_graph: flag which when True runs the structural reduction (see graph_tools/reduction.py) first, and
+						 expands the subgraph back to the edges of the graph
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param return_stats: flag which when True also returns a stats record (see ILP_solver/instrumentation.py)
+	:param quiet: flag which when True prints nothing, the solver log included
+	:param profiler: a function profiler(phase, seconds, stats) called at the end of every phase (ignored if None)
+	:return: the optimal (or best found) subgraph, or None, followed by the stats record if return_stats
+	"""
+	start_time = python_time.time()
+	stats = new_stats()
+	if quiet:
+		options['output'] = False
+
+	if reduce_graph:
+		with timed_phase(stats, 'presolve', profiler):
+			graph, existence_for_node_time, edge_mapping, stats['reduction'] = reduce_instance(
+				graph, existence_for_node_time, source, destinations, detailed_output=not quiet, waiting=waiting)
+	with timed_phase(stats, 'build', profiler):
+		instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	if presolve:
+		with timed_phase(stats, 'presolve', profiler):
+			instance, stats['presolve'] = presolve_instance(instance, source, destinations, detailed_output=not quiet,
+															waiting=waiting)
+	with timed_phase(stats, 'build', profiler):
+		formulation = build_instance_formulation(instance, source, destinations, waiting)
+	formulation_size_stats(stats, formulation)
+	if use_heuristic:
+		with timed_phase(stats, 'heuristic', profiler):
+			options['start'] = heuristic_start(formulation, source, destinations)
+
+	if not quiet:
+		print('-----------------------------------------------------------------------')
+	with timed_phase(stats, 'solve', profiler):
+		result = solve_formulation(formulation, backend, stats=stats, **options)
+	with timed_phase(stats, 'extraction', profiler):
+		subgraph = formulation_subgraph(formulation, result)
+		if reduce_graph:
+			subgraph = expand_subgraph(subgraph, edge_mapping)
+	stats['status'] = result.status
+	stats['objective'] = result.objective
+
+	if result.status in (OPTIMAL, FEASIBLE) and not quiet:
+		print('-----------------------------------------------------------------------')
+		if result.status == OPTIMAL:
+			print('Solved sDCP instance. Optimal Solution costs ' + str(result.objective))
+		else:
+			print('Stopped before proving optimality. Best Solution costs ' + str(result.objective))
+		if detailed_output:
+			print('Edges in minimal subgraph:')
+			print_edges_in_graph(subgraph)
+
+	end_time = python_time.time()
+	stats['total_time'] = end_time - start_time
+	if not quiet:
+		days, hours, minutes, seconds = execution_time(start_time, end_time)
+		print('sDCP solving took %s days, %s hours, %s minutes, %s seconds' % (days, hours, minutes, seconds))
+
+	# Return solution iff found
+	if time_output:
+		return end_time - start_time
+	subgraph = subgraph if result.status in (OPTIMAL, FEASIBLE) else None
+	if return_stats:
+		return subgraph, stats
+	return subgraph
+
+def solve_formulation(formulation, backend='highs', **options):
+	"""
+	Solves a formulation with the backend registered under the given name.
+
+	:param formulation: a Formulation
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param options: backend options (threads, time_limit, output, start, stats, mip_gap)
+	:return: a SolveResult
+	"""
+	if backend not in BACKENDS:
+		raise ValueError('Unknown backend %s, expected one of %s' % (backend, sorted(BACKENDS)))
+	return BACKENDS[backend](formulation, **options)
+
+def formulation_subgraph(formulation, result):
+	"""
+	Recovers the chosen subgraph from the solution of a formulation.
+
+	:param formulation: a Formulation
+	:param result: a SolveResult
+	:return: a directed graph with attribute 'weight' on the chosen edges (empty if no feasible solution was found)
+	"""
+	subgraph = networkx.DiGraph()
+	if result.values is None:
+		return subgraph
+
+	instance = formulation.instance
+	edge_values = result.values[edge_variable_slice(formulation)]
+	chosen = numpy.nonzero(edge_values > 0.5)[0]
+	subgraph.add_weighted_edges_from(zip(instance.nodes[instance.tails[chosen]].tolist(),
+										 instance.nodes[instance.heads[chosen]].tolist(),
+										 instance.weights[chosen].tolist()))
+	return subgraph
+
+def build_gurobi_model(formulation, variable_names=False):
+	"""
+	Loads a formulation into a Gurobi model through the matrix API.
+
+	:param formulation: a Formulation
+	:param variable_names: flag which when True names variables edge_time_u_v_t_t', edge_u_v and wait_v_t
+	:return: the Gurobi model and the MVar of all its variables
+	"""
+	if gurobipy is None:
+		raise ImportError('The gurobi backend requires gurobipy')
+	GRB = gurobipy.GRB
+
+	num_arcs = len(formulation.arc_edges)
+	num_edges = formulation.instance.num_edges
+	num_waiting = len(formulation.waiting_nodes)
+	flow_vtype = GRB.BINARY if formulation.capacity == 1 else GRB.INTEGER
+	vtypes = [flow_vtype] * num_arcs + [GRB.BINARY] * num_edges + [flow_vtype] * num_waiting
+
+	names = None
+	if variable_names:
+		edges = formulation.instance.edge_list()
+		names = ['edge_time_%s_%s_%s_%s' % (edges[e][0], edges[e][1], t, t_prime)
+				 for e, t, t_prime in zip(formulation.arc_edges, formulation.arc_times, formulation.arc_next_times)]
+		names += ['edge_%s_%s' % (u, v) for u, v in edges]
+		nodes = formulation.instance.nodes
+		names += ['wait_%s_%s' % (nodes[v], t) for v, t in zip(formulation.waiting_nodes, formulation.waiting_times)]
+
+	model = gurobipy.Model('temporal_connectivity')
+	variables = model.addMVar(num_arcs + num_edges + num_waiting, lb=0, ub=formulation.upper_bounds, obj=formulation.objective,
+							  vtype=vtypes, name=names)
+	model.ModelSense = GRB.MINIMIZE
+
+	# CONSTRAINTS
+	# Edge decision constraints (an edge is chosen if it is chosen at any time)
+	model.addMConstr(formulation.inequality_matrix, variables, GRB.LESS_EQUAL, formulation.inequality_rhs)
+	# Flow conservation constraints (existence is enforced by only creating active edge-time variables)
+	model.addMConstr(formulation.equality_matrix, variables, GRB.EQUAL, formulation.equality_rhs)
+	model.update()
+	return model, variables
+
+def solve_with_gurobi(formulation, threads=None, time_limit=None, output=True, start=None, stats=None, mip_gap=None):
+	"""
+	Solves a formulation with Gurobi.
+
+	:param formulation: a Formulation
+	:param threads: number of solver threads (Gurobi default if None)
+	:param time_limit: time limit in seconds (no limit if None)
+	:param output: flag which when False silences the solver log
+	:param start: a feasible solution vector, used as MIP start and to cut off worse solutions (ignored if None)
+	:param stats: a stats record in which the solver statistics are recorded (ignored if None)
+	:param mip_gap: relative gap at which the solve stops (solver default if None)
+	:return: a SolveResult
+	"""
+	model, variables = build_gurobi_model(formulation)
+	set_gurobi_options(model, threads, time_limit, output, mip_gap)
+	if start is not None:
+		variables.Start = start
+		model.Params.Cutoff = start_cutoff(formulation, start)
+	model.optimize(first_incumbent_callback(stats) if stats is not None else None)
+	if stats is not None:
+		gurobi_model_stats(stats, model)
+
+	result = gurobi_result(model)
+	if start is not None and model.Status == gurobipy.GRB.CUTOFF:
+		# Nothing is cheaper than the start, which was rejected only because of the cutoff tolerance
+		return SolveResult(OPTIMAL, float(formulation.objective.dot(start)), start, result.solve_time)
+	return result
+
+def set_gurobi_options(model, threads=None, time_limit=None, output=True, mip_gap=None):
+	"""
+	Applies the backend options to a Gurobi model.
+	"""
+	model.Params.OutputFlag = int(output)
+	if threads is not None:
+		model.Params.Threads = threads
+	if time_limit is not None:
+		model.Params.TimeLimit = time_limit
+	if mip_gap is not None:
+		model.Params.MIPGap = mip_gap
+
+def gurobi_result(model):
+	"""
+	Reads the SolveResult of an optimized Gurobi model.
+	"""
+	status = gurobi_status(model)
+	if model.SolCount > 0:
+		if status != OPTIMAL:
+			status = FEASIBLE
+		return SolveResult(status, model.ObjVal, numpy.array(model.getAttr('X', model.getVars())), model.Runtime)
+	return SolveResult(status, None, None, model.Runtime)
+
+def gurobi_status(model):
+	"""
+	:return: the status constant of an optimized Gurobi model
+	"""
+	GRB = gurobipy.GRB
+	return {GRB.OPTIMAL: OPTIMAL, GRB.INFEASIBLE: INFEASIBLE, GRB.TIME_LIMIT: TIME_LIMIT}.get(model.Status, OTHER)
+
+def solve_with_highs(formulation, threads=None, time_limit=None, output=True, start=None, stats=None, mip_gap=None):
+	"""
+	Solves a formulation with HiGHS through scipy.optimize.milp (scipy >= 1.9), without a license server.
+
+	:param formulation: a Formulation
+	:param threads: ignored, scipy runs HiGHS single-threaded
+	:param time_limit: time limit in seconds (no limit if None)
+	:param output: flag which when False silences the solver log
+	:param start: a feasible solution vector, returned when HiGHS finds nothing better (ignored if None). milp takes
+				  neither a MIP start nor a cutoff, so the start is only a fallback incumbent with this backend.
+	:param stats: a stats record in which the solver statistics are recorded (ignored if None)
+	:param mip_gap: relative gap at which the solve stops (solver default if None)
+	:return: a SolveResult
+	"""
+	try:
+		from scipy.optimize import milp, LinearConstraint, Bounds
+	except ImportError:
+		raise ImportError('The highs backend requires scipy >= 1.9')
+
+	constraints = [
+		LinearConstraint(formulation.inequality_matrix, -numpy.inf, formulation.inequality_rhs),
+		LinearConstraint(formulation.equality_matrix, formulation.equality_rhs, formulation.equality_rhs),
+	]
+	options = {'disp': output}
+	if time_limit is not None:
+		options['time_limit'] = time_limit
+	if mip_gap is not None:
+		options['mip_rel_gap'] = mip_gap
+
+	start_time = python_time.time()
+	if len(formulation.objective) == 0:
+		# milp rejects a problem without variables, left when the presolve or a reduction removed every edge
+		if formulation.equality_rhs.any():
+			return SolveResult(INFEASIBLE, None, None, python_time.time() - start_time)
+		return SolveResult(OPTIMAL, 0.0, numpy.zeros(0), python_time.time() - start_time)
+	result = milp(formulation.objective, constraints=constraints, integrality=numpy.ones(len(formulation.objective)),
+				  bounds=Bounds(0, formulation.upper_bounds), options=options)
+	solve_time = python_time.time() - start_time
+	if stats is not None:
+		stats['bound'] = getattr(result, 'mip_dual_bound', None)
+		stats['mip_gap'] = getattr(result, 'mip_gap', None)
+		stats['node_count'] = getattr(result, 'mip_node_count', None)
+		if start is not None:
+			stats['first_incumbent_time'] = 0.0
+
+	status = {0: OPTIMAL, 1: TIME_LIMIT, 2: INFEASIBLE}.get(result.status, OTHER)
+	if start is not None:
+		start_objective = float(formulation.objective.dot(start))
+		if result.x is None or result.fun > start_objective:
+			# The start is the incumbent, and it is optimal if HiGHS proved that nothing is cheaper
+			bound = getattr(result, 'mip_dual_bound', None)
+			proved = status == OPTIMAL or (status != INFEASIBLE and bound is not None and
+										   bound >= start_objective - 1e-6 * max(1.0, abs(start_objective)))
+			return SolveResult(OPTIMAL if proved else FEASIBLE, start_objective, start, solve_time)
+	if result.x is not None:
+		return SolveResult(status if status == OPTIMAL else FEASIBLE, result.fun, result.x, solve_time)
+	return SolveResult(status, None, None, solve_time)
+
+def start_cutoff(formulation, start):
+	"""
+	Returns the objective value above which solutions are no better than the start, with a small tolerance so that
+	the start itself is not cut off.
+	"""
+	start_objective = formulation.objective.dot(start)
+	return start_objective + 1e-6 * max(1.0, abs(start_objective))
+
+BACKENDS = {
+	'gurobi': solve_with_gurobi,
+	'highs': solve_with_highs,
+}
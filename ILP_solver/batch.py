@@ -0,0 +1,205 @@
+"""
+This file solves many demands over one temporal graph with a pool of worker processes, streaming back the results
+as they finish.
+
+- The instance is saved once in the memory-mapped directory format (see graph_tools/instance_io.py), so all workers
+  share one copy of it through the page cache instead of each receiving a pickled copy.
+- Demands are handed out grouped by source, and every worker caches the forward reachability of its last sources,
+  so the presolve search from (source, 0) is shared by all demands of a source.
+- Every worker runs the solver with a fixed number of threads, and by default there are cpu_count // threads
+  workers, which uses every core without oversubscribing them. The workers are spawned rather than forked, with the
+  thread limits of numerical libraries in their environment, so that numpy and scipy are imported with them (a
+  script calling solve_batch must therefore guard its main code with if __name__ == '__main__').
+- With a SolutionCache (see ILP_solver/solution_cache.py), demands solved before by any worker or run are answered
+  from the cache, and new optimal results are added to it.
+"""
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time as python_time
+from ILP_solver.formulation import build_instance_formulation
+from ILP_solver.backends import OPTIMAL, INFEASIBLE, solve_formulation, formulation_subgraph
+from ILP_solver.heuristic import heuristic_start
+from ILP_solver.instrumentation import new_stats, timed_phase, formulation_size_stats
+from ILP_solver.presolve import presolve_instance, forward_reachability
+from ILP_solver.solution_cache import instance_digest, cacheable_result
+from graph_tools.instance_io import save_instance, load_instance
+from graph_tools.temporal_instance import TemporalInstance
+
+# index is the position of the demand in the list passed to solve_batch, subgraph is None if no feasible solution
+# was found, and stats is a stats record (see ILP_solver/instrumentation.py)
+BatchResult = namedtuple('BatchResult', ['index', 'source', 'destinations', 'status', 'objective', 'subgraph', 'stats'])
+
+# Number of sources whose forward reachability every worker keeps
+FORWARD_CACHE_SIZE = 16
+
+# Thread pools of numerical libraries, limited in every worker along with the solver
+THREAD_ENVIRONMENT_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+# Per-process state of a worker, set by init_worker
+worker_state = {}
+
+
+def solve_batch(instance, demands=None, processes=None, threads=1, backend='highs', presolve=True,
+				use_heuristic=True, chunksize=1, waiting=False, cache=None, **options):
+	"""
+	Solves every demand over the same instance in parallel. This is a generator: results are yielded in order of
+	completion, not in the order of the demands, while the remaining demands are still being solved.
+
+	:param instance: a TemporalInstance, or the path of an instance saved by save_instance (the directory format is
+					 memory-mapped by the workers, a TemporalInstance is saved to a temporary directory first)
+	:param demands: a list of demands (source, destinations), where destinations is a list of nodes (the demands saved
+					with the instance if None)
+	:param processes: number of worker processes (cpu_count // threads if None)
+	:param threads: number of solver threads of every worker
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param presolve: flag which when True runs the temporal reachability presolve before every solve
+	:param use_heuristic: flag which when True passes the heuristic subgraph to the backend as a MIP start and cutoff
+	:param chunksize: number of demands sent to a worker at a time
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param cache: a SolutionCache shared by the workers (no caching if None)
+	:param options: other backend options (time_limit)
+	:return: an iterator of BatchResult
+	"""
+	temporary_directory = None
+	if isinstance(instance, TemporalInstance):
+		temporary_directory = tempfile.mkdtemp(prefix='tcp_batch_')
+		instance_path = os.path.join(temporary_directory, 'instance')
+		save_instance(instance_path, instance)
+	else:
+		instance_path = instance
+	if demands is None:
+		_, demands, _ = load_instance(instance_path)
+	if processes is None:
+		processes = max(1, multiprocessing.cpu_count() // threads)
+
+	with thread_environment(threads):
+		pool = multiprocessing.get_context('spawn').Pool(processes, initializer=init_worker,
+														 initargs=(instance_path, threads, backend, presolve,
+																   use_heuristic, waiting, cache, options))
+	try:
+		for result in pool.imap_unordered(solve_demand, batch_tasks(demands), chunksize):
+			yield result
+		pool.close()
+	finally:
+		# Also reached when the caller stops iterating early
+		pool.terminate()
+		pool.join()
+		if temporary_directory is not None:
+			shutil.rmtree(temporary_directory, ignore_errors=True)
+
+def batch_tasks(demands):
+	"""
+	Lists one task (index, source, destinations) per demand, with the demands of a source next to each other.
+	"""
+	tasks_for_source = OrderedDict()
+	for index, (source, destinations) in enumerate(demands):
+		tasks_for_source.setdefault(source, []).append((index, source, list(destinations)))
+	return [task for tasks in tasks_for_source.values() for task in tasks]
+
+@contextmanager
+def thread_environment(threads):
+	"""
+	Sets the thread limits of numerical libraries in the environment inside a with block, for the processes spawned in
+	it. They have no effect on the libraries already imported by this process.
+	"""
+	previous = dict((variable, os.environ.get(variable)) for variable in THREAD_ENVIRONMENT_VARIABLES)
+	for variable in THREAD_ENVIRONMENT_VARIABLES:
+		os.environ[variable] = str(threads)
+	try:
+		yield
+	finally:
+		for variable, value in previous.items():
+			if value is None:
+				del os.environ[variable]
+			else:
+				os.environ[variable] = value
+
+def init_worker(instance_path, threads, backend, presolve, use_heuristic, waiting, cache, options):
+	"""
+	Memory-maps the instance of a worker process and keeps the solve settings, the solver threads included.
+	"""
+	instance, _, _ = load_instance(instance_path, mmap=True)
+	worker_state.clear()
+	worker_state.update({
+		'instance': instance,
+		'forward': OrderedDict(),
+		'backend': backend,
+		'presolve': presolve,
+		'use_heuristic': use_heuristic,
+		'waiting': waiting,
+		'cache': cache,
+		'instance_key': instance_digest(instance) if cache is not None else None,
+		'options': dict(options, threads=threads, output=False),
+	})
+
+def solve_demand(task):
+	"""
+	Presolves, builds and solves one demand in a worker process.
+
+	:param task: a task (index, source, destinations)
+	:return: a BatchResult
+	"""
+	index, source, destinations = task
+	start_time = python_time.time()
+	stats = new_stats()
+
+	cache = worker_state['cache']
+	if cache is not None:
+		key = cache.key(worker_state['instance_key'], source, destinations, worker_state['waiting'])
+		entry = cache.get(key)
+		if entry is not None:
+			subgraph, objective, stats = entry
+			stats['cache'] = 'hit'
+			stats['total_time'] = python_time.time() - start_time
+			return BatchResult(index, source, destinations, stats['status'], objective, subgraph, stats)
+		stats['cache'] = 'miss'
+
+	instance = worker_state['instance']
+	if worker_state['presolve']:
+		with timed_phase(stats, 'presolve'):
+			instance, stats['presolve'] = presolve_instance(instance, source, destinations, detailed_output=False,
+															forward=cached_forward_reachability(source),
+															waiting=worker_state['waiting'])
+		if not stats['presolve']['feasible']:
+			stats['status'] = INFEASIBLE
+			stats['total_time'] = python_time.time() - start_time
+			if cache is not None:
+				cache.put(key, None, None, stats)
+			return BatchResult(index, source, destinations, INFEASIBLE, None, None, stats)
+
+	with timed_phase(stats, 'build'):
+		formulation = build_instance_formulation(instance, source, destinations, worker_state['waiting'])
+	formulation_size_stats(stats, formulation)
+	options = dict(worker_state['options'])
+	if worker_state['use_heuristic']:
+		with timed_phase(stats, 'heuristic'):
+			options['start'] = heuristic_start(formulation, source, destinations)
+	with timed_phase(stats, 'solve'):
+		result = solve_formulation(formulation, worker_state['backend'], stats=stats, **options)
+	with timed_phase(stats, 'extraction'):
+		subgraph = formulation_subgraph(formulation, result) if result.values is not None else None
+
+	stats['status'] = result.status
+	stats['objective'] = result.objective
+	stats['total_time'] = python_time.time() - start_time
+	if cache is not None and cacheable_result(result.status, worker_state['options'].get('mip_gap')):
+		cache.put(key, subgraph if result.status == OPTIMAL else None, result.objective, stats)
+	return BatchResult(index, source, destinations, result.status, result.objective, subgraph, stats)
+
+def cached_forward_reachability(source):
+	"""
+	Returns the forward reachability of a source on the worker's instance, from the worker's cache if possible.
+	"""
+	cache = worker_state['forward']
+	if source in cache:
+		forward = cache.pop(source)
+	else:
+		forward = forward_reachability(worker_state['instance'], source, worker_state['waiting'])
+		if len(cache) >= FORWARD_CACHE_SIZE:
+			cache.popitem(last=False)
+	cache[source] = forward
+	return forward
@@ -0,0 +1,268 @@
+"""
+This file implements a bound-only mode for TCP and mTCP instances, for screening demands without solving the MIP:
+it returns whether the demand is feasible and a lower bound on its optimal cost, together with the cost of the
+heuristic subgraph (see ILP_solver/heuristic.py) as an upper bound.
+
+- feasibility is exact: a demand is feasible iff every destination is reachable from (source, 0) at the last time,
+  which the temporal reachability presolve (see ILP_solver/presolve.py) decides without a model
+- method='lp' solves the LP relaxation of the sparse formulation (see ILP_solver/formulation.py) with HiGHS
+- method='lagrangian' dualizes the edge linking constraints d_{uvtt'} - capacity * d_{uv} <= 0 with multipliers
+  l_{uvtt'} >= 0. For fixed multipliers the relaxation splits into a shortest path per destination in the
+  time-expanded graph, with arc costs l, and a choice of every edge whose reduced weight
+  w_{uv} - capacity * sum_{t, t'} l_{uvtt'} is negative. The multipliers are improved by subgradient steps, and every
+  step gives a valid lower bound. No model is built, so an iteration takes time near-linear in the number of arcs.
+
+Both bounds are combined with the static shortest path bound: every subgraph satisfying the demand contains a static
+source -> destination path for every destination, over the edges the presolve keeps.
+"""
+from collections import namedtuple
+import time as python_time
+import numpy
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+from ILP_solver.formulation import build_instance_formulation, time_expanded_arcs, waiting_arcs
+from ILP_solver.heuristic import heuristic_instance
+from ILP_solver.presolve import presolve_instance
+from ILP_solver.rolling_horizon import static_distances
+from graph_tools.temporal_instance import TemporalInstance
+
+# feasible is the feasibility verdict, lower_bound and upper_bound bound the optimal cost (None if the demand is
+# infeasible, or if the LP relaxation hit its time limit), time is the wall-clock time taken, in seconds
+BoundResult = namedtuple('BoundResult', ['feasible', 'lower_bound', 'upper_bound', 'method', 'time'])
+
+BOUND_METHODS = ['lp', 'lagrangian']
+
+# Number of subgradient steps without improvement after which the step size is halved
+STEP_PATIENCE = 10
+
+
+def lower_bound_TCP_instance(graph, existence_for_node_time, connectivity_demand, method='lagrangian',
+							 detailed_output=True, **options):
+	"""
+	Given a simple TCP problem instance, decides whether the demand is feasible and bounds its optimal cost, without
+	solving the MIP.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param method: 'lp' or 'lagrangian'
+	:param detailed_output: flag which when True will print the verdict and the bounds
+	:param options: the options of lower_bound_instance
+	:return: a BoundResult
+	"""
+	source, destination = connectivity_demand
+	return lower_bound_mTCP_instance(graph, existence_for_node_time, source, [destination], method, detailed_output,
+									 **options)
+
+def lower_bound_mTCP_instance(graph, existence_for_node_time, source, destinations, method='lagrangian',
+							  detailed_output=True, **options):
+	"""
+	Given a multi-destination TCP problem instance, decides whether the demand is feasible and bounds its optimal
+	cost, without solving the MIP.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param method: 'lp' or 'lagrangian'
+	:param detailed_output: flag which when True will print the verdict and the bounds
+	:param options: the options of lower_bound_instance
+	:return: a BoundResult
+	"""
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	result = lower_bound_instance(instance, source, destinations, method, **options)
+	if detailed_output:
+		print('-----------------------------------------------------------------------')
+		if not result.feasible:
+			print('sDCP instance is infeasible')
+		else:
+			print('sDCP instance is feasible. Optimal Solution costs between %s and %s (%s bound, %.3f s)'
+				  % (result.lower_bound, result.upper_bound, result.method, result.time))
+	return result
+
+def lower_bound_instance(instance, source, destinations, method='lagrangian', waiting=False, iterations=200,
+						 time_limit=None, output=False):
+	"""
+	Same as lower_bound_mTCP_instance, on a TemporalInstance.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param method: 'lp' or 'lagrangian'
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param iterations: maximum number of subgradient steps of the lagrangian method
+	:param time_limit: time limit in seconds of the LP relaxation or of the subgradient steps (no limit if None)
+	:param output: flag which when True prints the LP solver log
+	:return: a BoundResult
+	"""
+	if method not in BOUND_METHODS:
+		raise ValueError('Unknown bound method %s, expected one of %s' % (method, BOUND_METHODS))
+	start_time = python_time.time()
+	instance, presolve_stats = presolve_instance(instance, source, destinations, detailed_output=False,
+												 waiting=waiting)
+	if not presolve_stats['feasible']:
+		return BoundResult(False, None, None, method, python_time.time() - start_time)
+
+	_, upper_bound = heuristic_instance(instance, source, destinations, waiting)
+	if method == 'lp':
+		lower_bound = lp_relaxation_bound(build_instance_formulation(instance, source, destinations, waiting),
+										  time_limit, output)
+	else:
+		lower_bound = lagrangian_bound(instance, source, destinations, upper_bound, iterations, time_limit, waiting)
+	if lower_bound is not None:
+		lower_bound = min(max(lower_bound, static_bound(instance, source, destinations)), upper_bound)
+	return BoundResult(True, lower_bound, upper_bound, method, python_time.time() - start_time)
+
+def lp_relaxation_bound(formulation, time_limit=None, output=False):
+	"""
+	Solves the LP relaxation of a formulation with HiGHS through scipy.optimize.linprog.
+
+	:param formulation: a Formulation
+	:param time_limit: time limit in seconds (no limit if None)
+	:param output: flag which when True prints the solver log
+	:return: the optimal value of the relaxation, or None if it was not solved to optimality
+	"""
+	from scipy.optimize import linprog
+
+	if len(formulation.objective) == 0:
+		return 0.0
+	options = {'disp': output}
+	if time_limit is not None:
+		options['time_limit'] = time_limit
+	result = linprog(formulation.objective, A_ub=formulation.inequality_matrix, b_ub=formulation.inequality_rhs,
+					 A_eq=formulation.equality_matrix, b_eq=formulation.equality_rhs,
+					 bounds=numpy.column_stack((numpy.zeros(len(formulation.upper_bounds)), formulation.upper_bounds)),
+					 method='highs', options=options)
+	return float(result.fun) if result.status == 0 else None
+
+def static_bound(instance, source, destinations):
+	"""
+	:return: the largest static shortest path distance from the source to a destination, ignoring time
+	"""
+	source_index = instance.node_index[source]
+	edge_mask = numpy.ones(instance.num_edges, dtype=bool)
+	return max(float(static_distances(instance, edge_mask, instance.node_index[destination])[source_index])
+			   for destination in destinations)
+
+def lagrangian_bound(instance, source, destinations, upper_bound, iterations=200, time_limit=None, waiting=False):
+	"""
+	Computes the lagrangian bound of the edge linking constraints with Polyak subgradient steps towards the upper
+	bound.
+
+	:param instance: a TemporalInstance on which the demand is feasible
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param upper_bound: the cost of a feasible subgraph
+	:param iterations: maximum number of subgradient steps
+	:param time_limit: time limit in seconds (no limit if None)
+	:param waiting: flag which when True lets flow wait at active nodes for free
+	:return: the best lower bound found
+	"""
+	start_time = python_time.time()
+	existence = instance.existence_matrix()
+	num_times = instance.num_times
+	tails, heads, weights = instance.tails, instance.heads, instance.weights
+	capacity = len(destinations)
+
+	arc_edges, arc_times, arc_next_times = time_expanded_arcs(tails, heads, existence)
+	arc_tail_states = tails[arc_edges] * num_times + arc_times
+	arc_head_states = heads[arc_edges] * num_times + arc_next_times
+	if waiting:
+		waiting_nodes, waiting_times = waiting_arcs(existence)
+	else:
+		waiting_nodes, waiting_times = numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+	waiting_states = waiting_nodes * num_times + waiting_times
+
+	source_state = instance.node_index[source] * num_times
+	destination_states = numpy.array([instance.node_index[destination] * num_times + num_times - 1
+									  for destination in destinations], dtype=numpy.int64)
+	state_graph = TimeExpandedGraph(instance.num_nodes * num_times, arc_tail_states, arc_head_states, waiting_states)
+
+	# Start from multipliers which spread every weight over the arcs of its edge, so that no reduced weight is negative
+	arcs_per_edge = numpy.bincount(arc_edges, minlength=instance.num_edges)
+	multipliers = weights[arc_edges] / (capacity * arcs_per_edge[arc_edges])
+	best = 0.0
+	step_scale = 2.0
+	stalled = 0
+	for _ in range(iterations):
+		arc_flows, path_cost = state_graph.shortest_path_flows(multipliers, source_state, destination_states)
+		reduced_weights = weights - capacity * numpy.bincount(arc_edges, weights=multipliers,
+															   minlength=instance.num_edges)
+		chosen = reduced_weights < 0
+		value = path_cost + reduced_weights[chosen].sum()
+
+		if value > best + 1e-9:
+			best = value
+			stalled = 0
+		else:
+			stalled += 1
+			if stalled >= STEP_PATIENCE:
+				step_scale /= 2
+				stalled = 0
+		if best >= upper_bound - 1e-6 * max(1.0, abs(upper_bound)) or step_scale < 1e-4:
+			break
+		if time_limit is not None and python_time.time() - start_time > time_limit:
+			break
+
+		subgradient = arc_flows - capacity * chosen[arc_edges]
+		norm = float(subgradient.dot(subgradient))
+		if norm == 0:
+			# The relaxed solution satisfies the linking constraints with complementary slackness, so it is optimal
+			break
+		multipliers = numpy.maximum(0.0, multipliers + step_scale * (upper_bound - value) / norm * subgradient)
+	return float(best)
+
+class TimeExpandedGraph(object):
+	"""
+	The time-expanded graph over node-time states, as a sparse matrix whose arc costs can be changed without
+	rebuilding it. Waiting arcs cost nothing, so they replace the self-loop arcs (v, t) -> (v, t+1) joining the same
+	states, which would otherwise be parallel arcs.
+	"""
+
+	def __init__(self, num_states, arc_tail_states, arc_head_states, waiting_states):
+		"""
+		:param num_states: number of node-time states
+		:param arc_tail_states: array of the tail states of the edge-time arcs
+		:param arc_head_states: array of the head states of the edge-time arcs
+		:param waiting_states: array of the tail states of the waiting arcs
+		"""
+		self.num_states = num_states
+		self.num_arcs = len(arc_tail_states)
+		self.num_waiting = len(waiting_states)
+		tail_states = numpy.concatenate((waiting_states, arc_tail_states))
+		head_states = numpy.concatenate((waiting_states + 1, arc_head_states))
+		arcs = numpy.concatenate((self.num_arcs + numpy.arange(len(waiting_states)), numpy.arange(self.num_arcs)))
+		_, first = numpy.unique(tail_states * num_states + head_states, return_index=True)
+
+		# The matrix is built once with the arc of every entry as data, and its data replaced by the arc costs
+		self.adjacency = sparse.csr_matrix((arcs[first] + 1.0, (tail_states[first], head_states[first])),
+										   shape=(num_states, num_states))
+		self.adjacency.sort_indices()
+		self.entry_arcs = self.adjacency.data.astype(numpy.int64) - 1
+		self.indptr, self.indices = self.adjacency.indptr, self.adjacency.indices
+
+	def shortest_path_flows(self, arc_costs, source_state, destination_states):
+		"""
+		Routes one unit from the source state to every destination state along a shortest path.
+
+		:param arc_costs: array of the costs of the edge-time arcs
+		:param source_state: the source state
+		:param destination_states: array of the destination states
+		:return: the number of units on every edge-time arc, and the total cost of the paths
+		"""
+		costs = numpy.concatenate((arc_costs, numpy.zeros(self.num_waiting)))
+		self.adjacency.data = costs[self.entry_arcs]
+		distances, predecessors = dijkstra(self.adjacency, directed=True, indices=source_state,
+										   return_predecessors=True)
+
+		arc_flows = numpy.zeros(self.num_arcs)
+		for destination_state in destination_states.tolist():
+			state = destination_state
+			while state != source_state:
+				previous = predecessors[state]
+				row = self.indices[self.indptr[previous]:self.indptr[previous + 1]]
+				arc = self.entry_arcs[self.indptr[previous] + numpy.searchsorted(row, state)]
+				if arc < self.num_arcs:
+					arc_flows[arc] += 1
+				state = previous
+		return arc_flows, float(distances[destination_states].sum())
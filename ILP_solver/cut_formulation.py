@@ -0,0 +1,512 @@
+"""
+This file implements an exact formulation of TCP and mTCP instances over the edge variables only, with connectivity
+cuts generated lazily instead of flow variables.
+
+A subgraph satisfies the demand iff, for every destination, the time-expanded graph restricted to the arcs of its
+edges (plus the waiting arcs) has a path from (source, 0) to (destination, max_time). So the problem is
+
+	minimize sum_e w_e * d_e  s.t.  sum_{e in E(C)} d_e >= 1 for every destination and every cut C, d_e in {0, 1}
+
+where a cut C is a set of node-time states containing (source, 0) but not (destination, max_time), and E(C) is the set
+of edges with an arc leaving C. An edge counts once however many of its arcs leave C, which makes these cuts at least
+as tight as the per-destination flow linking edge_time_k <= edge of a multi-commodity model, and much tighter than the
+aggregated linking edge_time <= len(destinations) * edge of ILP_solver/formulation.py.
+
+There are exponentially many cuts, so the model starts from the cuts around the source and the destinations, and
+further cuts are separated:
+
+- at integer solutions, from the states reachable from the source (and reaching an unconnected destination) along the
+  chosen edges, which makes the formulation exact
+- at fractional solutions, from a minimum cut of a maximum flow in the time-expanded graph with arc capacities d_e
+
+With Gurobi, integer cuts are added as lazy constraints and fractional cuts as user cuts at the root, from a callback.
+scipy.optimize.milp has no callbacks, so with HiGHS the cuts of fractional LP solutions are added in rounds at the
+root, then the MIP is solved again with the cuts of its last solution until that solution connects every destination.
+With both, a solution that misses destinations is repaired into a feasible one by connecting them greedily, with its
+edges free (see ConnectivitySeparator.repair).
+"""
+import time as python_time
+import networkx
+import numpy
+from scipy import sparse
+from scipy.sparse.csgraph import breadth_first_order
+from ILP_solver.backends import OPTIMAL, FEASIBLE, INFEASIBLE, TIME_LIMIT, OTHER, SolveResult, set_gurobi_options, \
+	gurobi_status
+from ILP_solver.formulation import time_expanded_arcs, waiting_arcs
+from ILP_solver.heuristic import temporal_path_union
+from ILP_solver.instrumentation import new_stats, timed_phase, gurobi_model_stats
+from ILP_solver.presolve import presolve_instance, reachable_states
+from graph_tools.temporal_instance import TemporalInstance
+from utils import execution_time, print_edges_in_graph
+
+try:
+	import gurobipy
+except ImportError:
+	gurobipy = None
+
+# Maximum number of rounds of fractional cuts at the root of the HiGHS backend, which also stops once the LP bound
+# has improved by less than ROOT_STALL (relative) over the last STALL_ROUNDS rounds
+ROOT_ROUNDS = 200
+ROOT_STALL = 1e-3
+STALL_ROUNDS = 20
+
+# Edge values are scaled to integers for scipy.sparse.csgraph.maximum_flow, which only takes integer capacities
+CAPACITY_SCALE = 10 ** 6
+
+# A cut is violated if its edge values sum to less than 1 - CUT_TOLERANCE
+CUT_TOLERANCE = 1e-6
+
+
+def solve_cut_TCP_instance(graph, existence_for_node_time, connectivity_demand, backend='highs', detailed_output=True,
+						   time_output=False, **options):
+	"""
+	Given a simple TCP problem instance, returns a minimum weight subgraph that satisfies the demand, using the
+	connectivity cut formulation and the chosen backend.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param backend: 'gurobi' or 'highs'
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
+	:param options: use_heuristic, presolve, waiting, return_stats, quiet, profiler (see solve_cut_instance) and
+					backend options (threads, time_limit, output, mip_gap)
+	:return: a optimal subgraph containing the path if the solution is Optimal, the best subgraph found if the solve
+			 stopped before proving optimality (status 'feasible'), else None
+	"""
+	source, destination = connectivity_demand
+	return solve_cut_instance(graph, existence_for_node_time, source, [destination], backend, detailed_output,
+							  time_output, **options)
+
+def solve_cut_mTCP_instance(graph, existence_for_node_time, source, destinations, backend='highs',
+							detailed_output=True, time_output=False, **options):
+	"""
+	Given a multi-destination TCP problem instance, returns a minimum weight subgraph that satisfies the demand, using
+	the connectivity cut formulation and the chosen backend.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param backend: 'gurobi' or 'highs'
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param time_output: flag which when True will return the time taken to obtain result rather than the optimal subgraph
+	:param options: use_heuristic, presolve, waiting, return_stats, quiet, profiler (see solve_cut_instance) and
+					backend options (threads, time_limit, output, mip_gap)
+	:return: a optimal subgraph containing the path(s) if the solution is Optimal, the best subgraph found if the solve
+			 stopped before proving optimality (status 'feasible'), else None
+	"""
+	return solve_cut_instance(graph, existence_for_node_time, source, destinations, backend, detailed_output,
+							  time_output, **options)
+
+def solve_cut_instance(graph, existence_for_node_time, source, destinations, backend='highs', detailed_output=True,
+					   time_output=False, use_heuristic=True, presolve=True, waiting=False, return_stats=False,
+					   quiet=False, profiler=None, **options):
+	"""
+	Shared solver of solve_cut_TCP_instance and solve_cut_mTCP_instance.
+
+	:param use_heuristic: flag which when True passes the heuristic subgraph (see ILP_solver/heuristic.py) to the
+						  backend as a MIP start and cutoff
+	:param presolve: flag which when True runs the temporal reachability presolve before building the model
+	:param waiting: flag which when True lets paths wait at active nodes for free (see ILP_solver/formulation.py)
+	:param return_stats: flag which when True also returns a stats record (see ILP_solver/instrumentation.py)
+	:param quiet: flag which when True prints nothing, the solver log included
+	:param profiler: a function profiler(phase, seconds, stats) called at the end of every phase (ignored if None)
+	:return: the optimal (or best found) subgraph, or None, followed by the stats record if return_stats
+	"""
+	if backend not in CUT_BACKENDS:
+		raise ValueError('Unknown backend %s, expected one of %s' % (backend, sorted(CUT_BACKENDS)))
+	start_time = python_time.time()
+	stats = new_stats()
+	if quiet:
+		options['output'] = False
+
+	with timed_phase(stats, 'build', profiler):
+		instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	if presolve:
+		with timed_phase(stats, 'presolve', profiler):
+			instance, stats['presolve'] = presolve_instance(instance, source, destinations, detailed_output=not quiet,
+															waiting=waiting)
+	with timed_phase(stats, 'build', profiler):
+		separator = ConnectivitySeparator(instance, source, destinations, waiting)
+	if use_heuristic:
+		with timed_phase(stats, 'heuristic', profiler):
+			options['start'] = separator.repair(numpy.zeros(instance.num_edges))
+
+	if not quiet:
+		print('-----------------------------------------------------------------------')
+	with timed_phase(stats, 'solve', profiler):
+		result = CUT_BACKENDS[backend](separator, stats=stats, **options)
+	with timed_phase(stats, 'extraction', profiler):
+		subgraph = edge_subgraph(instance, result.values)
+	stats['status'] = result.status
+	stats['objective'] = result.objective
+
+	if result.status in (OPTIMAL, FEASIBLE) and not quiet:
+		print('-----------------------------------------------------------------------')
+		if result.status == OPTIMAL:
+			print('Solved sDCP instance. Optimal Solution costs ' + str(result.objective))
+		else:
+			print('Stopped before proving optimality. Best Solution costs ' + str(result.objective))
+		print('%s connectivity cuts were added' % stats['cuts'])
+		if detailed_output:
+			print('Edges in minimal subgraph:')
+			print_edges_in_graph(subgraph)
+
+	end_time = python_time.time()
+	stats['total_time'] = end_time - start_time
+	if not quiet:
+		days, hours, minutes, seconds = execution_time(start_time, end_time)
+		print('sDCP solving took %s days, %s hours, %s minutes, %s seconds' % (days, hours, minutes, seconds))
+
+	# Return solution iff found
+	if time_output:
+		return end_time - start_time
+	subgraph = subgraph if result.status in (OPTIMAL, FEASIBLE) else None
+	if return_stats:
+		return subgraph, stats
+	return subgraph
+
+def edge_subgraph(instance, edge_values):
+	"""
+	:return: a directed graph with attribute 'weight' on the chosen edges (empty if edge_values is None)
+	"""
+	subgraph = networkx.DiGraph()
+	if edge_values is None:
+		return subgraph
+	chosen = numpy.nonzero(edge_values > 0.5)[0]
+	subgraph.add_weighted_edges_from(zip(instance.nodes[instance.tails[chosen]].tolist(),
+										 instance.nodes[instance.heads[chosen]].tolist(),
+										 instance.weights[chosen].tolist()))
+	return subgraph
+
+class ConnectivitySeparator(object):
+	"""
+	Finds the connectivity cuts violated by a vector of edge values, on the time-expanded graph of an instance. Every cut
+	is returned as the array of the edges with an arc leaving it.
+	"""
+
+	def __init__(self, instance, source, destinations, waiting=False):
+		"""
+		:param instance: a TemporalInstance
+		:param source: the source node
+		:param destinations: a list of destination nodes
+		:param waiting: flag which when True lets paths wait at active nodes for free
+		"""
+		existence = instance.existence_matrix()
+		num_times = instance.num_times
+		self.instance = instance
+		self.source = source
+		self.destinations = list(destinations)
+		self.weights = instance.weights
+		self.num_edges = instance.num_edges
+		self.num_states = instance.num_nodes * num_times
+
+		self.arc_edges, self.arc_times, self.arc_next_times = time_expanded_arcs(instance.tails, instance.heads,
+																				 existence)
+		self.waiting_nodes, self.waiting_times = waiting_arcs(existence) if waiting else (None, None)
+		self.num_arcs = len(self.arc_edges)
+		# The waiting arcs come after the edge arcs
+		self.tail_states = instance.tails[self.arc_edges] * num_times + self.arc_times
+		self.head_states = instance.heads[self.arc_edges] * num_times + self.arc_next_times
+		if waiting:
+			waiting_states = self.waiting_nodes * num_times + self.waiting_times
+			self.tail_states = numpy.concatenate((self.tail_states, waiting_states))
+			self.head_states = numpy.concatenate((self.head_states, waiting_states + 1))
+
+		self.source_state = instance.node_index[source] * num_times
+		destination_states = set(instance.node_index[destination] * num_times + num_times - 1
+								 for destination in destinations)
+		self.destination_states = sorted(destination_states - set([self.source_state]))
+
+	def repair(self, edge_values):
+		"""
+		Completes a vector of edge values into a subgraph satisfying the demand, with the greedy heuristic (see
+		temporal_path_union in ILP_solver/heuristic.py) where the chosen edges are free. Chosen edges on none of its
+		paths are dropped. With no edge chosen, this is the heuristic subgraph.
+
+		:param edge_values: a vector over the edges, an edge is chosen if its value is above 0.5
+		:return: a 0/1 array over the edges, or None if the demand cannot be satisfied
+		"""
+		instance = self.instance
+		free_instance = TemporalInstance(instance.nodes, instance.indptr, instance.indices,
+										 numpy.where(edge_values > 0.5, 0.0, instance.weights), instance.existence,
+										 instance.num_times, instance.packed)
+		arc_flows = temporal_path_union(free_instance, self.arc_edges, self.arc_times, self.arc_next_times,
+										self.source, self.destinations, self.waiting_nodes, self.waiting_times)
+		if arc_flows is None:
+			return None
+		values = numpy.zeros(self.num_edges)
+		values[self.arc_edges[arc_flows[:self.num_arcs] > 0]] = 1
+		return values
+
+	def initial_cuts(self):
+		"""
+		:return: the cuts around the states the source reaches and the destinations are reached from by waiting only
+		"""
+		return self.integer_cuts(numpy.zeros(self.num_edges))
+
+	def integer_cuts(self, edge_values):
+		"""
+		Finds the cuts violated by a 0/1 vector: the states reachable from the source along the chosen edges, and for
+		every unconnected destination, the complement of the states reaching it.
+
+		:param edge_values: a vector over the edges, an edge is chosen if its value is above 0.5
+		:return: a list of cuts, empty iff the chosen edges connect every destination
+		"""
+		chosen = numpy.concatenate((edge_values[self.arc_edges] > 0.5,
+									numpy.ones(len(self.tail_states) - self.num_arcs, dtype=bool)))
+		tail_states, head_states = self.tail_states[chosen], self.head_states[chosen]
+		forward = reachable_states(tail_states, head_states, self.num_states, [self.source_state])
+
+		cuts = []
+		for destination_state in self.destination_states:
+			if forward[destination_state]:
+				continue
+			if not cuts:
+				cuts.append(self.cut_edges(forward))
+			backward = reachable_states(head_states, tail_states, self.num_states, [destination_state])
+			cuts.append(self.cut_edges(~backward))
+		return cuts
+
+	def fractional_cuts(self, edge_values):
+		"""
+		Finds the cuts violated by a fractional vector: for every destination, the states reachable from the source in
+		the residual graph of a maximum flow, where the arcs of an edge have its value as capacity and waiting arcs a
+		whole unit.
+
+		:param edge_values: a vector over the edges with values in [0, 1]
+		:return: a list of violated cuts
+		"""
+		try:
+			from scipy.sparse.csgraph import maximum_flow
+		except ImportError:
+			raise ImportError('Fractional connectivity cuts require scipy >= 1.4')
+
+		# A super source (num_states) feeds one unit to the source, so flows stay within int32, and waiting arcs can
+		# carry a whole unit
+		num_moves = len(self.tail_states)
+		capacities = numpy.concatenate((numpy.round(CAPACITY_SCALE * numpy.clip(edge_values[self.arc_edges], 0, 1)),
+										numpy.full(num_moves - self.num_arcs + 1, CAPACITY_SCALE)))
+		capacity_matrix = sparse.csr_matrix((capacities.astype(numpy.int32),
+											 (numpy.append(self.tail_states, self.num_states),
+											  numpy.append(self.head_states, self.source_state))),
+											shape=(self.num_states + 1, self.num_states + 1))
+		capacity_matrix.eliminate_zeros()
+
+		cuts = []
+		for destination_state in self.destination_states:
+			result = maximum_flow(capacity_matrix, self.num_states, destination_state)
+			if result.flow_value >= (1 - CUT_TOLERANCE) * CAPACITY_SCALE:
+				continue
+			# scipy < 1.8 names the flow residual
+			flow = result.flow if hasattr(result, 'flow') else result.residual
+			residual = (capacity_matrix - flow).tocsr()
+			residual.data = (residual.data > 0).astype(numpy.float64)
+			residual.eliminate_zeros()
+			# Both the source side and the complement of the sink side of the residual graph are minimum cuts, and the
+			# source sides of different destinations are often the same
+			source_side = numpy.zeros(self.num_states + 1, dtype=bool)
+			source_side[breadth_first_order(residual, self.num_states, directed=True, return_predecessors=False)] = True
+			sink_side = numpy.zeros(self.num_states + 1, dtype=bool)
+			sink_side[breadth_first_order(residual.T.tocsr(), destination_state, directed=True,
+										  return_predecessors=False)] = True
+			for inside in [source_side[:self.num_states], ~sink_side[:self.num_states]]:
+				cut = self.cut_edges(inside)
+				if edge_values[cut].sum() < 1 - CUT_TOLERANCE and not any(numpy.array_equal(cut, other)
+																		   for other in cuts):
+					cuts.append(cut)
+		return cuts
+
+	def cut_edges(self, inside):
+		"""
+		:param inside: a boolean array over states, True for the states of the cut
+		:return: the array of the edges with an arc leaving the cut
+		"""
+		tails, heads = self.tail_states[:self.num_arcs], self.head_states[:self.num_arcs]
+		return numpy.unique(self.arc_edges[inside[tails] & ~inside[heads]])
+
+def cut_matrix(cuts, num_edges):
+	"""
+	:return: a CSR matrix with a row of ones over the edges of every cut
+	"""
+	rows = numpy.concatenate([numpy.full(len(cut), i, dtype=numpy.int64) for i, cut in enumerate(cuts)])
+	columns = numpy.concatenate(cuts)
+	return sparse.csr_matrix((numpy.ones(len(columns)), (rows, columns)), shape=(len(cuts), num_edges))
+
+def solve_cuts_with_highs(separator, threads=None, time_limit=None, output=True, start=None, stats=None, mip_gap=None,
+						  root_rounds=ROOT_ROUNDS):
+	"""
+	Solves the connectivity cut formulation with HiGHS through scipy.optimize.milp (scipy >= 1.9), adding cuts in
+	rounds between solves.
+
+	:param separator: a ConnectivitySeparator
+	:param threads: ignored, scipy runs HiGHS single-threaded
+	:param time_limit: time limit in seconds (no limit if None)
+	:param output: flag which when False silences the solver log
+	:param start: a feasible 0/1 vector over the edges, returned when no better solution is found (ignored if None)
+	:param stats: a stats record in which the solver statistics are recorded (ignored if None)
+	:param mip_gap: relative gap at which every MIP solve stops (solver default if None)
+	:param root_rounds: maximum number of rounds of fractional cuts before the first MIP solve
+	:return: a SolveResult over the edge variables
+	"""
+	try:
+		from scipy.optimize import milp, linprog, LinearConstraint, Bounds
+	except ImportError:
+		raise ImportError('The highs backend requires scipy >= 1.9')
+
+	start_time = python_time.time()
+	weights, num_edges = separator.weights, separator.num_edges
+	cuts = separator.initial_cuts()
+	if any(len(cut) == 0 for cut in cuts):
+		return SolveResult(INFEASIBLE, None, None, python_time.time() - start_time)
+	if not separator.destination_states:
+		return SolveResult(OPTIMAL, 0.0, numpy.zeros(num_edges), python_time.time() - start_time)
+
+	def remaining_time():
+		return None if time_limit is None else max(0.0, time_limit - (python_time.time() - start_time))
+
+	# Cutting planes on the LP relaxation
+	lp_bounds = []
+	for _ in range(root_rounds):
+		options = {'disp': output}
+		if remaining_time() is not None:
+			options['time_limit'] = remaining_time()
+		relaxation = linprog(weights, A_ub=-cut_matrix(cuts, num_edges), b_ub=-numpy.ones(len(cuts)),
+							 bounds=(0, 1), method='highs', options=options)
+		if relaxation.status != 0:
+			break
+		lp_bounds.append(relaxation.fun)
+		if len(lp_bounds) > STALL_ROUNDS and \
+				lp_bounds[-1] - lp_bounds[-1 - STALL_ROUNDS] < ROOT_STALL * max(1.0, abs(lp_bounds[-1])):
+			break
+		new_cuts = separator.fractional_cuts(relaxation.x)
+		if not new_cuts:
+			break
+		cuts.extend(new_cuts)
+
+	# Row generation on the MIP: every solve is a relaxation, so a solution violating no cut is optimal. A solution
+	# violating cuts is repaired into an incumbent, which is optimal if it costs no more than the relaxation.
+	status, bound, node_count = TIME_LIMIT, lp_bounds[-1] if lp_bounds else None, 0
+	incumbent = start
+	while remaining_time() is None or remaining_time() > 0:
+		options = {'disp': output}
+		if remaining_time() is not None:
+			options['time_limit'] = remaining_time()
+		if mip_gap is not None:
+			options['mip_rel_gap'] = mip_gap
+		result = milp(weights, constraints=[LinearConstraint(cut_matrix(cuts, num_edges), 1, numpy.inf)],
+					  integrality=numpy.ones(num_edges), bounds=Bounds(0, 1), options=options)
+		node_count += getattr(result, 'mip_node_count', 0) or 0
+		if result.x is None:
+			status = {1: TIME_LIMIT, 2: INFEASIBLE}.get(result.status, OTHER)
+			break
+		bound = result.fun if getattr(result, 'mip_dual_bound', None) is None else result.mip_dual_bound
+
+		values = numpy.round(result.x)
+		new_cuts = separator.integer_cuts(values)
+		# The repair fails when a destination cannot be reached at all, which the cuts prove in later solves
+		candidate = values if not new_cuts else separator.repair(values)
+		if candidate is not None and (incumbent is None or weights.dot(candidate) < weights.dot(incumbent)):
+			incumbent = candidate
+		if result.status != 0:
+			status = {1: TIME_LIMIT}.get(result.status, OTHER)
+			break
+		if incumbent is not None:
+			gap = weights.dot(incumbent) - bound
+			if gap <= 1e-9 * max(1.0, abs(bound)) + (mip_gap or 0.0) * abs(weights.dot(incumbent)):
+				status = OPTIMAL
+				break
+		cuts.extend(new_cuts)
+
+	solve_time = python_time.time() - start_time
+	if stats is not None:
+		stats['cuts'] = len(cuts)
+		stats['bound'] = bound
+		stats['node_count'] = node_count
+		stats['num_variables'] = num_edges
+		stats['num_constraints'] = len(cuts)
+		stats['num_nonzeros'] = sum(len(cut) for cut in cuts)
+	if incumbent is None:
+		return SolveResult(status, None, None, solve_time)
+	return SolveResult(status if status == OPTIMAL else FEASIBLE, float(weights.dot(incumbent)), incumbent, solve_time)
+
+def solve_cuts_with_gurobi(separator, threads=None, time_limit=None, output=True, start=None, stats=None,
+						   mip_gap=None):
+	"""
+	Solves the connectivity cut formulation with Gurobi, separating integer cuts as lazy constraints and fractional
+	cuts as user cuts at the root node.
+
+	:param separator: a ConnectivitySeparator
+	:param threads: number of solver threads (Gurobi default if None)
+	:param time_limit: time limit in seconds (no limit if None)
+	:param output: flag which when False silences the solver log
+	:param start: a feasible 0/1 vector over the edges, used as MIP start and to cut off worse solutions (ignored if
+				  None)
+	:param stats: a stats record in which the solver statistics are recorded (ignored if None)
+	:param mip_gap: relative gap at which the solve stops (solver default if None)
+	:return: a SolveResult over the edge variables
+	"""
+	if gurobipy is None:
+		raise ImportError('The gurobi backend requires gurobipy')
+	GRB = gurobipy.GRB
+
+	model = gurobipy.Model('temporal_connectivity_cuts')
+	edge_variables = [model.addVar(vtype=GRB.BINARY, obj=weight) for weight in separator.weights.tolist()]
+	model.ModelSense = GRB.MINIMIZE
+	model.update()
+	cuts = separator.initial_cuts()
+	for cut in cuts:
+		model.addConstr(gurobipy.quicksum(edge_variables[e] for e in cut.tolist()) >= 1)
+
+	set_gurobi_options(model, threads, time_limit, output, mip_gap)
+	model.Params.LazyConstraints = 1
+	model.Params.PreCrush = 1
+	if start is not None:
+		for variable, value in zip(edge_variables, start.tolist()):
+			variable.Start = value
+		start_objective = float(separator.weights.dot(start))
+		model.Params.Cutoff = start_objective + 1e-6 * max(1.0, abs(start_objective))
+
+	# Repaired solutions wait for the next MIPNODE callback, the only one where a solution can be handed to Gurobi
+	repaired = []
+
+	def callback(model, where):
+		if where == GRB.Callback.MIPSOL:
+			values = numpy.array(model.cbGetSolution(edge_variables))
+			new_cuts = separator.integer_cuts(values)
+			for cut in new_cuts:
+				model.cbLazy(gurobipy.quicksum(edge_variables[e] for e in cut.tolist()) >= 1)
+				cuts.append(cut)
+			candidate = separator.repair(values) if new_cuts else None
+			if candidate is not None:
+				repaired.append(candidate)
+		elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+			if repaired:
+				model.cbSetSolution(edge_variables, repaired.pop().tolist())
+				model.cbUseSolution()
+				del repaired[:]
+			if model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0:
+				values = numpy.array(model.cbGetNodeRel(edge_variables))
+				for cut in separator.fractional_cuts(values):
+					model.cbCut(gurobipy.quicksum(edge_variables[e] for e in cut.tolist()) >= 1)
+					cuts.append(cut)
+
+	model.optimize(callback)
+	if stats is not None:
+		gurobi_model_stats(stats, model)
+		stats['cuts'] = len(cuts)
+
+	status = gurobi_status(model)
+	if start is not None and model.Status == GRB.CUTOFF:
+		# Nothing is cheaper than the start, which was rejected only because of the cutoff tolerance
+		return SolveResult(OPTIMAL, start_objective, start, model.Runtime)
+	if model.SolCount > 0:
+		return SolveResult(status if status == OPTIMAL else FEASIBLE, model.ObjVal,
+						   numpy.array(model.getAttr('X', edge_variables)), model.Runtime)
+	return SolveResult(status, None, None, model.Runtime)
+
+CUT_BACKENDS = {
+	'gurobi': solve_cuts_with_gurobi,
+	'highs': solve_cuts_with_highs,
+}
@@ -0,0 +1,207 @@
+"""
+This file implements a decomposition mode for mTCP instances with many destinations, which trades a small optimality
+gap for a running time near-linear in the number of destinations. The single-commodity formulation (see
+ILP_solver/formulation.py) links every edge-time variable to its edge variable through edge_time <= |D| * edge, whose
+LP relaxation gets weaker as |D| grows, so exact solves stop scaling past a few dozen destinations.
+
+1. Candidate paths: for every destination independently, a few temporal shortest paths from (source, 0) to
+   (destination, max_time) are computed in the time-expanded graph, each one after making the edges of the previous
+   ones more expensive, so that they differ. Destinations are handed out to a pool of worker processes.
+2. Shared-edge tree: the candidate edges of all destinations are combined into one tree of temporal paths with the
+   greedy heuristic (see temporal_path_union in ILP_solver/heuristic.py), where edges already in the tree are free.
+3. Restricted master: the formulation is built over the candidate edges only and solved with the tree as MIP start
+   (and fallback incumbent), which picks the cheapest combination of candidate paths, edge reuse included.
+
+The result is feasible for the whole instance, and optimal if the optimal subgraph only uses candidate edges. With
+master=False, the tree is returned without solving any MIP.
+"""
+from collections import namedtuple
+import multiprocessing
+import time as python_time
+import numpy
+from ILP_solver.backends import INFEASIBLE, SolveResult, solve_formulation, formulation_subgraph
+from ILP_solver.bounds import TimeExpandedGraph
+from ILP_solver.formulation import build_instance_formulation, time_expanded_arcs, waiting_arcs
+from ILP_solver.heuristic import heuristic_start
+from ILP_solver.presolve import presolve_instance
+from graph_tools.temporal_instance import TemporalInstance
+from utils import print_edges_in_graph
+
+# subgraph is the chosen subgraph (None if the demand is infeasible), objective its cost, tree_objective the cost of
+# the shared-edge tree, master_status the status of the restricted master MIP (OPTIMAL means optimal over the
+# candidate edges, None if no master was solved), candidate_edges the number of candidate edges and time the
+# wall-clock time taken, in seconds
+DecompositionResult = namedtuple('DecompositionResult', ['subgraph', 'objective', 'tree_objective', 'master_status',
+														 'candidate_edges', 'time'])
+
+# Per-process state of a worker, set by init_worker
+worker_state = {}
+
+
+def solve_decomposition_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=True,
+									  quiet=False, **options):
+	"""
+	Given a multi-destination TCP problem instance, returns a cheap subgraph that satisfies the demand, found by
+	decomposing the demand by destination.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param detailed_output: flag which when True will print the edges in the subgraph
+	:param quiet: flag which when True prints nothing, the solver log included
+	:param options: the options of decomposition_instance
+	:return: a DecompositionResult
+	"""
+	if quiet:
+		options['output'] = False
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	result = decomposition_instance(instance, source, destinations, **options)
+	if quiet:
+		return result
+
+	print('-----------------------------------------------------------------------')
+	if result.subgraph is None:
+		print('sDCP instance is infeasible')
+		return result
+	print('Decomposed solution of sDCP instance costs %s (shared-edge tree %s, %s candidate edges, %.3f s)'
+		  % (result.objective, result.tree_objective, result.candidate_edges, result.time))
+	if detailed_output:
+		print('Edges in decomposed subgraph:')
+		print_edges_in_graph(result.subgraph)
+	return result
+
+def decomposition_instance(instance, source, destinations, candidates=5, penalty=1.0, processes=None, master=True,
+						   backend='highs', waiting=False, threads=None, time_limit=None, mip_gap=None, output=False):
+	"""
+	Same as solve_decomposition_mTCP_instance, on a TemporalInstance.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param candidates: number of candidate paths of every destination
+	:param penalty: relative increase of the weight of the edges of a candidate path before the next one is computed
+	:param processes: number of worker processes computing the candidate paths (cpu_count if None, 1 computes them in
+					  this process)
+	:param master: flag which when True solves the restricted master MIP, and when False returns the tree
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param threads: number of solver threads (solver default if None)
+	:param time_limit: time limit in seconds of the restricted master (no limit if None)
+	:param mip_gap: relative gap at which the restricted master stops (solver default if None)
+	:param output: flag which when True prints the solver log
+	:return: a DecompositionResult
+	"""
+	start_time = python_time.time()
+	instance, presolve_stats = presolve_instance(instance, source, destinations, detailed_output=False,
+												 waiting=waiting)
+	if not presolve_stats['feasible']:
+		return DecompositionResult(None, None, None, INFEASIBLE, 0, python_time.time() - start_time)
+
+	candidate_mask = candidate_edges(instance, source, destinations, candidates, penalty, processes, waiting)
+	restricted, _ = presolve_instance(instance.subinstance(candidate_mask), source, destinations,
+									  detailed_output=False, waiting=waiting)
+	formulation = build_instance_formulation(restricted, source, destinations, waiting)
+	tree = heuristic_start(formulation, source, destinations)
+	tree_objective = float(formulation.objective.dot(tree))
+
+	result = SolveResult(None, tree_objective, tree, 0.0)
+	if master:
+		result = solve_formulation(formulation, backend, threads=threads, time_limit=time_limit, output=output,
+								   start=tree, mip_gap=mip_gap)
+		if result.values is None:
+			# Gurobi found nothing within the time limit, the tree is still feasible
+			result = SolveResult(result.status, tree_objective, tree, result.solve_time)
+	return DecompositionResult(formulation_subgraph(formulation, result), result.objective, tree_objective,
+							   result.status, int(candidate_mask.sum()), python_time.time() - start_time)
+
+def candidate_edges(instance, source, destinations, candidates=5, penalty=1.0, processes=None, waiting=False):
+	"""
+	Computes the candidate paths of every destination in parallel.
+
+	:param instance: a TemporalInstance on which every destination is reachable
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param candidates: number of candidate paths of every destination
+	:param penalty: relative increase of the weight of the edges of a candidate path before the next one is computed
+	:param processes: number of worker processes (cpu_count if None, 1 computes the paths in this process)
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:return: a boolean array over the edges of the instance, True for the edges of a candidate path
+	"""
+	destination_indices = sorted(set(instance.node_index[destination] for destination in destinations))
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	processes = max(1, min(processes, len(destination_indices)))
+	initargs = (instance, source, candidates, penalty, waiting)
+
+	if processes == 1:
+		init_worker(*initargs)
+		try:
+			edge_lists = [destination_candidate_edges(index) for index in destination_indices]
+		finally:
+			worker_state.clear()
+	else:
+		pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=initargs)
+		try:
+			# A few chunks per worker, so that the workers finish at about the same time
+			edge_lists = pool.map(destination_candidate_edges, destination_indices,
+								  max(1, len(destination_indices) // (4 * processes)))
+			pool.close()
+		finally:
+			pool.terminate()
+			pool.join()
+
+	mask = numpy.zeros(instance.num_edges, dtype=bool)
+	for edges in edge_lists:
+		mask[edges] = True
+	return mask
+
+def init_worker(instance, source, candidates, penalty, waiting):
+	"""
+	Builds the time-expanded graph of the instance once per worker process.
+	"""
+	existence = instance.existence_matrix()
+	num_times = instance.num_times
+	arc_edges, arc_times, arc_next_times = time_expanded_arcs(instance.tails, instance.heads, existence)
+	if waiting:
+		waiting_nodes, waiting_times = waiting_arcs(existence)
+		waiting_states = waiting_nodes * num_times + waiting_times
+	else:
+		waiting_states = numpy.zeros(0, dtype=numpy.int64)
+
+	worker_state.clear()
+	worker_state.update({
+		'graph': TimeExpandedGraph(instance.num_nodes * num_times, instance.tails[arc_edges] * num_times + arc_times,
+								   instance.heads[arc_edges] * num_times + arc_next_times, waiting_states),
+		'arc_edges': arc_edges,
+		'arc_weights': instance.weights[arc_edges],
+		'num_edges': instance.num_edges,
+		'num_times': num_times,
+		'source_state': instance.node_index[source] * num_times,
+		'candidates': candidates,
+		'penalty': penalty,
+	})
+
+def destination_candidate_edges(destination_index):
+	"""
+	Computes the candidate paths of one destination in a worker process.
+
+	:param destination_index: the position of the destination node
+	:return: the array of the edges of its candidate paths
+	"""
+	arc_edges = worker_state['arc_edges']
+	arc_costs = worker_state['arc_weights'].copy()
+	destination_states = numpy.array([destination_index * worker_state['num_times'] + worker_state['num_times'] - 1])
+	chosen = numpy.zeros(worker_state['num_edges'], dtype=bool)
+
+	for _ in range(worker_state['candidates']):
+		arc_flows, cost = worker_state['graph'].shortest_path_flows(arc_costs, worker_state['source_state'],
+																	destination_states)
+		used = numpy.zeros(worker_state['num_edges'], dtype=bool)
+		used[arc_edges[arc_flows > 0]] = True
+		if numpy.isinf(cost) or not (used & ~chosen).any():
+			# The next paths would only repeat edges already chosen
+			break
+		chosen |= used
+		arc_costs[used[arc_edges]] *= 1 + worker_state['penalty']
+	return numpy.nonzero(chosen)[0]
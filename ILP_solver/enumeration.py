@@ -0,0 +1,168 @@
+"""
+This file enumerates the k best distinct subgraphs of a TCP/mTCP instance in one search, instead of re-solving the
+model from scratch after every add_optimal_solution_constraint.
+
+Two subgraphs are distinct if they have different edge sets, and, as with add_optimal_solution_constraint, a subgraph
+containing a previously found one is not a new solution.
+"""
+import numpy
+from scipy import sparse
+from ILP_solver.formulation import build_instance_formulation, edge_variable_slice
+from ILP_solver.backends import OPTIMAL, SolveResult, build_gurobi_model, set_gurobi_options, solve_with_highs, formulation_subgraph
+
+try:
+	import gurobipy
+except ImportError:
+	gurobipy = None
+
+# Number of pool solutions kept per requested solution, since many pool solutions only differ in their edge-time
+# variables and share the same subgraph
+POOL_SOLUTIONS_PER_SUBGRAPH = 10
+
+
+def enumerate_solutions(instance, source, destinations, k, gap=0.0, backend='gurobi', waiting=False, **options):
+	"""
+	Returns up to k distinct subgraphs of minimum weight satisfying the demand, in order of weight, whose weight is
+	within a relative gap of the optimum, together with how often every vertex and edge is used by them.
+
+	With the gurobi backend the solutions are collected from the solution pool, and no-good cuts are only added
+	(to the same, warm model) when the pool did not contain enough distinct subgraphs. With the highs backend
+	solutions are found one at a time with no-good cuts.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param k: the number of subgraphs to return
+	:param gap: relative gap to the optimum within which subgraphs are returned
+	:param backend: 'gurobi' or 'highs'
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param options: backend options (threads, time_limit, output)
+	:return: a list of (weight, subgraph), vertex_usage_count (dictionary node -> count), and
+			 edge_usage_count (dictionary (u, v) -> count)
+	"""
+	formulation = build_instance_formulation(instance, source, destinations, waiting)
+	if backend == 'gurobi':
+		edge_sets = enumerate_with_gurobi(formulation, k, gap, **options)
+	elif backend == 'highs':
+		edge_sets = enumerate_with_highs(formulation, k, gap, **options)
+	else:
+		raise ValueError('Unknown backend %s, expected gurobi or highs' % backend)
+
+	solutions = []
+	vertex_usage_count = {}
+	edge_usage_count = {}
+	edges = instance.edge_list()
+	for weight, edge_set in edge_sets:
+		subgraph = edge_set_subgraph(formulation, edge_set)
+		solutions.append((weight, subgraph))
+		for vertex in subgraph.nodes_iter():
+			vertex_usage_count[vertex] = vertex_usage_count.get(vertex, 0) + 1
+		for e in edge_set:
+			edge_usage_count[edges[e]] = edge_usage_count.get(edges[e], 0) + 1
+	return solutions, vertex_usage_count, edge_usage_count
+
+def enumerate_with_gurobi(formulation, k, gap, **options):
+	"""
+	Collects up to k distinct edge sets from Gurobi solution pools.
+
+	:return: a list of (weight, edge set), where an edge set is a frozenset of edge positions
+	"""
+	model, variables = build_gurobi_model(formulation)
+	set_gurobi_options(model, **options)
+	model.Params.PoolSearchMode = 2
+	model.Params.PoolSolutions = POOL_SOLUTIONS_PER_SUBGRAPH * k
+	model.Params.PoolGap = gap
+
+	edge_variables = model.getVars()[edge_variable_slice(formulation)]
+	weights = formulation.instance.weights
+
+	edge_sets = []
+	cut_edge_sets = set()
+	while len(edge_sets) < k:
+		model.optimize()
+		if model.SolCount == 0:
+			break
+		if not edge_sets:
+			# Keep later rounds within the gap of the true optimum
+			model.Params.Cutoff = (1 + gap) * model.ObjVal + 1e-9
+
+		found = 0
+		for solution_number in range(model.SolCount):
+			model.Params.SolutionNumber = solution_number
+			values = numpy.array(model.getAttr('Xn', edge_variables))
+			edge_set = frozenset(numpy.nonzero(values > 0.5)[0].tolist())
+			if add_edge_set(edge_sets, edge_set, weights):
+				found += 1
+		if found == 0:
+			break
+
+		# Exclude everything found so far, and search again from the same model
+		for weight, edge_set in edge_sets:
+			if edge_set not in cut_edge_sets:
+				model.addConstr(gurobipy.quicksum(edge_variables[e] for e in edge_set) <= max(0, len(edge_set) - 1))
+				cut_edge_sets.add(edge_set)
+
+	return sorted(edge_sets, key=lambda weight_edge_set: weight_edge_set[0])[:k]
+
+def enumerate_with_highs(formulation, k, gap, **options):
+	"""
+	Finds up to k distinct edge sets with HiGHS, adding one no-good cut per solution.
+
+	:return: a list of (weight, edge set), where an edge set is a frozenset of edge positions
+	"""
+	weights = formulation.instance.weights
+
+	edge_sets = []
+	best = None
+	while len(edge_sets) < k:
+		result = solve_with_highs(formulation, **options)
+		if result.status != OPTIMAL:
+			break
+		if best is None:
+			best = result.objective
+		elif result.objective > (1 + gap) * best + 1e-9:
+			break
+
+		edge_set = frozenset(numpy.nonzero(result.values[edge_variable_slice(formulation)] > 0.5)[0].tolist())
+		add_edge_set(edge_sets, edge_set, weights)
+		formulation = add_no_good_cut(formulation, edge_set)
+
+	return edge_sets
+
+def add_edge_set(edge_sets, edge_set, weights):
+	"""
+	Adds an edge set to the list of found edge sets, unless it contains one of them (or is contained in one of them,
+	in which case it replaces it).
+
+	:return: True if the edge set was added
+	"""
+	for i, (weight, found_edge_set) in enumerate(edge_sets):
+		if found_edge_set <= edge_set:
+			return False
+		if edge_set < found_edge_set:
+			edge_sets[i] = (float(weights[list(edge_set)].sum()), edge_set)
+			return True
+	edge_sets.append((float(weights[list(edge_set)].sum()), edge_set))
+	return True
+
+def add_no_good_cut(formulation, edge_set):
+	"""
+	Returns the formulation with the constraint sum_{e in edge_set} d_e <= |edge_set| - 1 added, which excludes the
+	edge set and all of its supersets.
+	"""
+	num_arcs = len(formulation.arc_edges)
+	columns = num_arcs + numpy.array(sorted(edge_set), dtype=numpy.int64)
+	cut = sparse.csr_matrix((numpy.ones(len(columns)), (numpy.zeros(len(columns), dtype=numpy.int64), columns)),
+							shape=(1, formulation.inequality_matrix.shape[1]))
+	return formulation._replace(
+		inequality_matrix=sparse.vstack((formulation.inequality_matrix, cut)).tocsr(),
+		inequality_rhs=numpy.append(formulation.inequality_rhs, max(0, len(edge_set) - 1)),
+	)
+
+def edge_set_subgraph(formulation, edge_set):
+	"""
+	:return: the subgraph made of the edges at the given positions
+	"""
+	values = numpy.zeros(len(formulation.objective))
+	values[len(formulation.arc_edges) + numpy.array(sorted(edge_set), dtype=numpy.int64)] = 1
+	return formulation_subgraph(formulation, SolveResult(OPTIMAL, None, values, None))
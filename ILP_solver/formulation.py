@@ -0,0 +1,209 @@
+"""
+This file builds the sparse time-expanded formulation of TCP and mTCP instances.
+
+Only edge-time variables d_{uvtt'} with t' in {t, t+1} whose endpoints are both active are created,
+and all constraints are assembled in bulk as scipy.sparse matrices over the variable vector
+[edge-time variables | edge variables | waiting variables].
+
+Waiting variables are only created with waiting=True: they model waiting at an active node as an implicit, free arc
+(v, t) -> (v, t+1), instead of the self-loop edges of weight 0.001 added by the graph generators
+(see remove_waiting_self_loops in graph_tools/graph_generator.py).
+"""
+from collections import namedtuple
+import numpy
+from scipy import sparse
+from graph_tools.temporal_instance import TemporalInstance
+
+# A TCP/mTCP instance as a solver-independent mixed integer program:
+#     minimize objective * x  s.t.  inequality_matrix * x <= inequality_rhs,  equality_matrix * x == equality_rhs,
+#     0 <= x <= upper_bounds,  x integer
+# where x = [edge-time variables (one per arc) | edge variables (one per edge) | waiting variables (one per waiting arc
+# (waiting_nodes, waiting_times) -> (waiting_nodes, waiting_times + 1), none without waiting)].
+Formulation = namedtuple('Formulation', ['objective', 'inequality_matrix', 'inequality_rhs', 'equality_matrix',
+										 'equality_rhs', 'upper_bounds', 'instance', 'arc_edges', 'arc_times',
+										 'arc_next_times', 'capacity', 'waiting_nodes', 'waiting_times'])
+
+
+def build_TCP_formulation(graph, existence_for_node_time, connectivity_demand, waiting=False):
+	"""
+	Builds the sparse formulation of a TCP instance.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param waiting: flag which when True lets flow wait at active nodes for free
+	:return: a Formulation
+	"""
+	source, destination = connectivity_demand
+	return build_formulation(graph, existence_for_node_time, source, [destination], waiting)
+
+
+def build_mTCP_formulation(graph, existence_for_node_time, source, destinations, waiting=False):
+	"""
+	Builds the sparse formulation of an mTCP instance.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param waiting: flag which when True lets flow wait at active nodes for free
+	:return: a Formulation
+	"""
+	return build_formulation(graph, existence_for_node_time, source, destinations, waiting)
+
+
+def build_formulation(graph, existence_for_node_time, source, destinations, waiting=False):
+	"""
+	Shared builder of build_TCP_formulation and build_mTCP_formulation.
+
+	:return: a Formulation
+	"""
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	return build_instance_formulation(instance, source, destinations, waiting)
+
+
+def build_instance_formulation(instance, source, destinations, waiting=False):
+	"""
+	Builds the sparse formulation of the demand from source to destinations on a TemporalInstance.
+	Edge-time and waiting variables range over [0, len(destinations)], so they are binary for a single destination.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param waiting: flag which when True lets flow wait at active nodes for free
+	:return: a Formulation
+	"""
+	tails, heads = instance.tails, instance.heads
+	num_edges, num_times = instance.num_edges, instance.num_times
+	capacity = len(destinations)
+	existence = instance.existence_matrix()
+
+	arc_edges, arc_times, arc_next_times = time_expanded_arcs(tails, heads, existence)
+	if waiting:
+		waiting_nodes, waiting_times = waiting_arcs(existence)
+	else:
+		waiting_nodes, waiting_times = numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+	supply_states, supply_values = node_supply(instance.node_index, num_times, source, destinations)
+	flow_matrix, flow_rhs, _ = flow_conservation_constraints(tails, heads, num_edges, arc_edges, arc_times,
+															 arc_next_times, num_times, supply_states, supply_values,
+															 waiting_nodes, waiting_times)
+	linking_matrix, linking_rhs = edge_linking_constraints(num_edges, arc_edges, capacity, len(waiting_nodes))
+
+	num_arcs, num_waiting = len(arc_edges), len(waiting_nodes)
+	objective = numpy.concatenate((numpy.zeros(num_arcs), instance.weights, numpy.zeros(num_waiting)))
+	upper_bounds = numpy.concatenate((capacity * numpy.ones(num_arcs), numpy.ones(num_edges),
+									  capacity * numpy.ones(num_waiting)))
+
+	return Formulation(objective, linking_matrix, linking_rhs, flow_matrix, flow_rhs, upper_bounds, instance,
+					   arc_edges, arc_times, arc_next_times, capacity, waiting_nodes, waiting_times)
+
+
+def time_expanded_arcs(tails, heads, existence):
+	"""
+	Enumerates the feasible edge-time pairs of the time-expanded graph.
+
+	An edge (u, v) yields an arc (u, t) -> (v, t') for t' in {t, t+1} iff u is active at t and v is active at t'.
+
+	:param tails: array of edge tails (node positions)
+	:param heads: array of edge heads (node positions)
+	:param existence: boolean array of shape |V| x |T|
+	:return: arc_edges, arc_times, arc_next_times (arrays over arcs)
+	"""
+	tail_existence = existence[tails]
+	head_existence = existence[heads]
+
+	same_edges, same_times = numpy.nonzero(tail_existence & head_existence)
+	next_edges, next_times = numpy.nonzero(tail_existence[:, :-1] & head_existence[:, 1:])
+
+	arc_edges = numpy.concatenate((same_edges, next_edges))
+	arc_times = numpy.concatenate((same_times, next_times))
+	arc_next_times = numpy.concatenate((same_times, next_times + 1))
+	return arc_edges, arc_times, arc_next_times
+
+
+def waiting_arcs(existence):
+	"""
+	Enumerates the waiting arcs (v, t) -> (v, t+1) of the time-expanded graph, one for every node active at t and t+1.
+
+	:param existence: boolean array of shape |V| x |T|
+	:return: waiting_nodes, waiting_times (arrays over waiting arcs)
+	"""
+	return numpy.nonzero(existence[:, :-1] & existence[:, 1:])
+
+
+def node_supply(node_index, num_times, source, destinations):
+	"""
+	Returns the sourceflow of the (mTCP) demand as a sparse vector over node-time states (node * |T| + t).
+
+	:param node_index: dictionary from node to position
+	:param num_times: |T|
+	:param source: the source node, which emits len(destinations) units at time 0
+	:param destinations: the destination nodes, which each absorb 1 unit at the last time
+	:return: supply_states, supply_values (arrays)
+	"""
+	supply = {node_index[source] * num_times: len(destinations)}
+	for destination in destinations:
+		state = node_index[destination] * num_times + num_times - 1
+		supply[state] = supply.get(state, 0) - 1
+	supply_states = numpy.array(sorted(supply), dtype=numpy.int64)
+	supply_values = numpy.array([supply[state] for state in supply_states], dtype=numpy.float64)
+	return supply_states, supply_values
+
+
+def flow_conservation_constraints(tails, heads, num_edges, arc_edges, arc_times, arc_next_times,
+								  num_times, supply_states, supply_values, waiting_nodes=(), waiting_times=()):
+	"""
+	Builds the flow conservation constraints (outflow - inflow = sourceflow) for every node-time state
+	touched by an arc or carrying supply. Empty rows of inactive states are left out.
+
+	:return: a CSR matrix over [edge-time variables | edge variables | waiting variables], the right hand side, and
+			 the node-time state of every row
+	"""
+	num_arcs, num_waiting = len(arc_edges), len(waiting_nodes)
+	waiting_states = numpy.asarray(waiting_nodes, dtype=numpy.int64) * num_times + numpy.asarray(waiting_times,
+																								 dtype=numpy.int64)
+	tail_states = numpy.concatenate((tails[arc_edges] * num_times + arc_times, waiting_states))
+	head_states = numpy.concatenate((heads[arc_edges] * num_times + arc_next_times, waiting_states + 1))
+
+	row_states, inverse = numpy.unique(numpy.concatenate((tail_states, head_states, supply_states)),
+									   return_inverse=True)
+	# Waiting variables come after the edge variables
+	positions = numpy.concatenate((numpy.arange(num_arcs), num_arcs + num_edges + numpy.arange(num_waiting)))
+	num_moves = num_arcs + num_waiting
+	rows = inverse[:2 * num_moves]
+	columns = numpy.concatenate((positions, positions))
+	values = numpy.concatenate((numpy.ones(num_moves), -numpy.ones(num_moves)))
+
+	matrix = sparse.coo_matrix((values, (rows, columns)),
+							   shape=(len(row_states), num_arcs + num_edges + num_waiting)).tocsr()
+	matrix.eliminate_zeros()
+
+	rhs = numpy.zeros(len(row_states))
+	rhs[inverse[2 * num_moves:]] = supply_values
+	return matrix, rhs, row_states
+
+
+def edge_linking_constraints(num_edges, arc_edges, capacity=1, num_waiting=0):
+	"""
+	Builds the edge decision constraints d_{uvtt'} - capacity * d_{uv} <= 0
+	(an edge is chosen if it is chosen at any time).
+
+	:return: a CSR matrix over [edge-time variables | edge variables | waiting variables] and the right hand side
+	"""
+	num_arcs = len(arc_edges)
+	arc_positions = numpy.arange(num_arcs)
+	rows = numpy.concatenate((arc_positions, arc_positions))
+	columns = numpy.concatenate((arc_positions, num_arcs + arc_edges))
+	values = numpy.concatenate((numpy.ones(num_arcs), -capacity * numpy.ones(num_arcs)))
+
+	matrix = sparse.coo_matrix((values, (rows, columns)), shape=(num_arcs, num_arcs + num_edges + num_waiting)).tocsr()
+	return matrix, numpy.zeros(num_arcs)
+
+
+def edge_variable_slice(formulation):
+	"""
+	:param formulation: a Formulation
+	:return: the slice of the edge variables in the variable vector
+	"""
+	num_arcs = len(formulation.arc_edges)
+	return slice(num_arcs, num_arcs + formulation.instance.num_edges)
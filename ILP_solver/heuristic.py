@@ -0,0 +1,192 @@
+"""
+This file implements a fast combinatorial heuristic for TCP and mTCP instances: a temporal shortest path (Dijkstra over
+the time-expanded graph) for TCP, extended to mTCP by greedily adding the cheapest path from the current subgraph to
+the nearest destination still unconnected, with the edges already chosen costing nothing.
+
+Its subgraph is feasible, so its cost is an upper bound on the optimum. It can be used on its own as a fast mode, or fed
+to the ILP as a MIP start and cutoff (see add_heuristic_start, and the start option of the backends). With waiting=True,
+paths can also wait at active nodes for free (see ILP_solver/formulation.py).
+"""
+import networkx
+import numpy
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+from ILP_solver.formulation import time_expanded_arcs, waiting_arcs
+from graph_tools.temporal_instance import TemporalInstance
+from utils import print_edges_in_graph
+
+def heuristic_TCP_instance(graph, existence_for_node_time, connectivity_demand, detailed_output=True, waiting=False):
+	"""
+	Given a simple TCP problem instance, returns a cheap subgraph that satisfies the demand, without solving the ILP.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param detailed_output: flag which when True will print the edges in the subgraph
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:return: a subgraph containing the path and its cost, or None, None if the demand cannot be satisfied
+	"""
+	source, destination = connectivity_demand
+	return heuristic_mTCP_instance(graph, existence_for_node_time, source, [destination], detailed_output, waiting)
+
+def heuristic_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=True,
+							waiting=False):
+	"""
+	Given a multi-destination TCP problem instance, returns a cheap subgraph that satisfies the demand, without
+	solving the ILP.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param detailed_output: flag which when True will print the edges in the subgraph
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:return: a subgraph containing the paths and its cost, or None, None if the demand cannot be satisfied
+	"""
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	subgraph, cost = heuristic_instance(instance, source, destinations, waiting)
+
+	if subgraph is not None:
+		print('-----------------------------------------------------------------------')
+		print('Heuristic solution of sDCP instance costs ' + str(cost))
+		if detailed_output:
+			print('Edges in heuristic subgraph:')
+			print_edges_in_graph(subgraph)
+	return subgraph, cost
+
+def heuristic_instance(instance, source, destinations, waiting=False):
+	"""
+	Same as heuristic_mTCP_instance, on a TemporalInstance.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:return: a subgraph containing the paths and its cost, or None, None if the demand cannot be satisfied
+	"""
+	existence = instance.existence_matrix()
+	arc_edges, arc_times, arc_next_times = time_expanded_arcs(instance.tails, instance.heads, existence)
+	waiting_nodes, waiting_times = waiting_arcs(existence) if waiting else (None, None)
+	arc_flows = temporal_path_union(instance, arc_edges, arc_times, arc_next_times, source, destinations,
+									waiting_nodes, waiting_times)
+	if arc_flows is None:
+		return None, None
+
+	chosen = numpy.unique(arc_edges[arc_flows[:len(arc_edges)] > 0])
+	subgraph = networkx.DiGraph()
+	subgraph.add_nodes_from([source] + list(destinations))
+	subgraph.add_weighted_edges_from(zip(instance.nodes[instance.tails[chosen]].tolist(),
+										 instance.nodes[instance.heads[chosen]].tolist(),
+										 instance.weights[chosen].tolist()))
+	return subgraph, float(instance.weights[chosen].sum())
+
+def heuristic_start(formulation, source, destinations):
+	"""
+	Returns the heuristic solution of a formulation as a vector over its variables, to be used as a MIP start.
+	Only edge-time and waiting variables with a positive upper bound are used, so this also works on the formulation of
+	a TCPModelTemplate.
+
+	:param formulation: a Formulation
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:return: the solution vector over the formulation's variables, or None if the demand cannot be satisfied
+	"""
+	num_arcs = len(formulation.arc_edges)
+	waiting_offset = num_arcs + formulation.instance.num_edges
+	usable = numpy.nonzero(formulation.upper_bounds[:num_arcs] > 0)[0]
+	usable_waiting = numpy.nonzero(formulation.upper_bounds[waiting_offset:] > 0)[0]
+	arc_flows = temporal_path_union(formulation.instance, formulation.arc_edges[usable], formulation.arc_times[usable],
+									formulation.arc_next_times[usable], source, destinations,
+									formulation.waiting_nodes[usable_waiting], formulation.waiting_times[usable_waiting])
+	if arc_flows is None:
+		return None
+
+	values = numpy.zeros(len(formulation.objective))
+	values[usable] = arc_flows[:len(usable)]
+	values[waiting_offset + usable_waiting] = arc_flows[len(usable):]
+	values[num_arcs + formulation.arc_edges[usable[arc_flows[:len(usable)] > 0]]] = 1
+	return values
+
+def temporal_path_union(instance, arc_edges, arc_times, arc_next_times, source, destinations, waiting_nodes=None,
+						waiting_times=None):
+	"""
+	Routes one unit of flow from (source, 0) to (destination, max_time) for every destination along a tree of
+	temporal paths, built greedily: each round runs Dijkstra from every node-time state of the tree, where arcs of
+	edges already in the tree and waiting arcs cost 0 and all others cost their edge weight, and adds the path to the
+	nearest unconnected destination. With a single destination this is one temporal shortest path.
+
+	:param instance: a TemporalInstance
+	:param arc_edges: array of the edge of every arc
+	:param arc_times: array of the time of every arc
+	:param arc_next_times: array of the next time of every arc
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param waiting_nodes: array of the node of every waiting arc (no waiting if None)
+	:param waiting_times: array of the time of every waiting arc
+	:return: the flow on every arc (an integer array over the arcs followed by the waiting arcs), or None if a
+			 destination cannot be reached
+	"""
+	num_times = instance.num_times
+	num_states = instance.num_nodes * num_times
+	num_arcs = len(arc_edges)
+	tail_states = instance.tails[arc_edges] * num_times + arc_times
+	head_states = instance.heads[arc_edges] * num_times + arc_next_times
+	if waiting_nodes is not None:
+		waiting_states = waiting_nodes * num_times + waiting_times
+		tail_states = numpy.concatenate((tail_states, waiting_states))
+		head_states = numpy.concatenate((head_states, waiting_states + 1))
+
+	# CSR adjacency over node-time states, sorted by (tail, head) so that arcs can be found back from state pairs,
+	# plus a super start state (num_states) pointing at every state of the tree. Zero weights are kept as explicit
+	# entries, which scipy.sparse.csgraph treats as arcs.
+	order = numpy.lexsort((head_states, tail_states))
+	indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(tail_states, minlength=num_states))))
+	indices = head_states[order]
+
+	source_state = instance.node_index[source] * num_times
+	destination_states = [instance.node_index[destination] * num_times + num_times - 1 for destination in destinations]
+
+	in_tree = numpy.zeros(num_states, dtype=bool)
+	parent_arc = numpy.full(num_states, -1, dtype=numpy.int64)
+	chosen_edges = numpy.zeros(instance.num_edges, dtype=bool)
+	in_tree[source_state] = True
+
+	unconnected = set(destination_states) - set([source_state])
+	while unconnected:
+		arc_weights = numpy.zeros(len(tail_states))
+		arc_weights[:num_arcs] = numpy.where(chosen_edges[arc_edges], 0.0, instance.weights[arc_edges])
+		sorted_weights = arc_weights[order]
+		tree_states = numpy.nonzero(in_tree)[0]
+		adjacency = sparse.csr_matrix((numpy.concatenate((sorted_weights, numpy.zeros(len(tree_states)))),
+									   numpy.concatenate((indices, tree_states)),
+									   numpy.append(indptr, indptr[-1] + len(tree_states))),
+									  shape=(num_states + 1, num_states + 1))
+		distances, predecessors = dijkstra(adjacency, directed=True, indices=num_states, return_predecessors=True)
+
+		nearest = min(unconnected, key=lambda state: distances[state])
+		if numpy.isinf(distances[nearest]):
+			return None
+
+		# Add the path back to the tree
+		state = nearest
+		while predecessors[state] != num_states:
+			tail_state = predecessors[state]
+			row = slice(indptr[tail_state], indptr[tail_state + 1])
+			# A self-loop edge and a waiting arc can join the same states, take the cheapest
+			first = row.start + numpy.searchsorted(indices[row], state)
+			last = row.start + numpy.searchsorted(indices[row], state, side='right')
+			arc = order[first + numpy.argmin(sorted_weights[first:last])]
+			in_tree[state] = True
+			parent_arc[state] = arc
+			if arc < num_arcs:
+				chosen_edges[arc_edges[arc]] = True
+			state = tail_state
+		unconnected = set(state for state in unconnected if not in_tree[state])
+
+	# Every destination receives one unit along its tree path
+	arc_flows = numpy.zeros(len(tail_states), dtype=numpy.int64)
+	for state in destination_states:
+		while parent_arc[state] >= 0:
+			arc_flows[parent_arc[state]] += 1
+			state = tail_states[parent_arc[state]]
+	return arc_flows
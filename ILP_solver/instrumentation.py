@@ -0,0 +1,107 @@
+"""
+This file implements the statistics record that the solve functions return with return_stats=True, so that the time
+spent in every phase can be measured without parsing their printed output.
+
+A stats record is a dictionary with the keys of STATS_FIELDS (None when a value does not apply or is unknown):
+
+	status, objective        status and objective value of the solution
+	bound, mip_gap           best bound and relative gap reported by the solver
+	node_count               number of branch and bound nodes explored
+	num_variables, num_constraints, num_nonzeros
+	                         size of the model given to the solver
+	presolve                 the presolve statistics (see ILP_solver/presolve.py), if a presolve was run
+	reduction                the structural reduction statistics (see graph_tools/reduction.py), if it was run
+	cache                    'hit' or 'miss' if the solution cache was queried (see ILP_solver/solution_cache.py)
+	cuts                     number of connectivity cuts in the model (see ILP_solver/cut_formulation.py)
+	presolve_time, build_time, heuristic_time, solve_time, extraction_time, total_time
+	                         wall-clock time of every phase, in seconds
+	first_incumbent_time     solver time at which the first feasible solution was known, in seconds
+"""
+from contextlib import contextmanager
+import time as python_time
+
+try:
+	import gurobipy
+except ImportError:
+	gurobipy = None
+
+STATS_FIELDS = ['status', 'objective', 'bound', 'mip_gap', 'node_count', 'num_variables', 'num_constraints',
+				'num_nonzeros', 'presolve', 'reduction', 'cache', 'cuts', 'presolve_time', 'build_time', 'heuristic_time', 'solve_time',
+				'first_incumbent_time', 'extraction_time', 'total_time']
+
+
+def new_stats():
+	"""
+	:return: a stats record with every field set to None
+	"""
+	return dict((field, None) for field in STATS_FIELDS)
+
+@contextmanager
+def timed_phase(stats, phase, profiler=None):
+	"""
+	Adds the wall-clock time of the enclosed phase to stats[phase + '_time'], then calls the profiler.
+
+	:param stats: a stats record
+	:param phase: name of the phase (presolve, build, heuristic, solve, extraction)
+	:param profiler: a function profiler(phase, seconds, stats) called at the end of every phase (ignored if None)
+	"""
+	start_time = python_time.time()
+	yield
+	seconds = python_time.time() - start_time
+	stats[phase + '_time'] = (stats.get(phase + '_time') or 0.0) + seconds
+	if profiler is not None:
+		profiler(phase, seconds, stats)
+
+def formulation_size_stats(stats, formulation):
+	"""
+	Records the size of a Formulation in a stats record.
+	"""
+	stats['num_variables'] = len(formulation.objective)
+	stats['num_constraints'] = formulation.inequality_matrix.shape[0] + formulation.equality_matrix.shape[0]
+	stats['num_nonzeros'] = formulation.inequality_matrix.nnz + formulation.equality_matrix.nnz
+
+def gurobi_model_stats(stats, model):
+	"""
+	Records the size, bound, gap and node count of an optimized Gurobi model in a stats record.
+	"""
+	stats['num_variables'] = model.NumVars
+	stats['num_constraints'] = model.NumConstrs
+	stats['num_nonzeros'] = model.NumNZs
+	if model.IsMIP:
+		stats['node_count'] = model.NodeCount
+		stats['bound'] = model.ObjBound
+		if model.SolCount > 0:
+			stats['mip_gap'] = model.MIPGap
+
+def first_incumbent_callback(stats):
+	"""
+	Returns a Gurobi callback that records the runtime at which the first feasible solution was found
+	(in stats['first_incumbent_time']).
+
+	:param stats: a stats record
+	:return: a callback to pass to model.optimize
+	"""
+	GRB = gurobipy.GRB
+
+	def callback(model, where):
+		if stats['first_incumbent_time'] is not None:
+			return
+		if where == GRB.Callback.MIPSOL or (where == GRB.Callback.MIP and model.cbGet(GRB.Callback.MIP_SOLCNT) > 0):
+			stats['first_incumbent_time'] = model.cbGet(GRB.Callback.RUNTIME)
+	return callback
+
+def print_stats(stats):
+	"""
+	Prints a stats record.
+
+	:param stats: a stats record
+	"""
+	print('-----------------------------------------------------------------------')
+	print('Solve statistics:')
+	for field in STATS_FIELDS:
+		if field in ('presolve', 'reduction') or stats.get(field) is None:
+			continue
+		if field.endswith('_time'):
+			print('    %s: %.3f s' % (field, stats[field]))
+		else:
+			print('    %s: %s' % (field, stats[field]))
@@ -0,0 +1,151 @@
+"""
+This file implements a reusable TCP/mTCP model that is built once per graph topology and updated in place when the
+existence function or the demand changes, instead of being rebuilt by generate_TCP_model for every query.
+"""
+import numpy
+from ILP_solver.formulation import Formulation, time_expanded_arcs, waiting_arcs, node_supply, flow_conservation_constraints, edge_linking_constraints
+from ILP_solver.backends import build_gurobi_model, set_gurobi_options, gurobi_result, solve_with_highs, formulation_subgraph
+
+
+class TCPModelTemplate(object):
+	"""
+	A TCP/mTCP model over a fixed topology and horizon. It holds one edge-time variable per edge and (t, t') with
+	t' in {t, t+1}, and one flow conservation row per node-time state, so that
+
+	- update_existence only changes the upper bounds of edge-time (and waiting) variables (0 when an endpoint is
+	  inactive)
+	- update_demand only changes the right hand sides of flow conservation rows
+
+	With the gurobi backend the model is kept in memory between solves and every solve is warm-started from the
+	previous incumbent. With the highs backend the updated formulation is re-solved from scratch (scipy.optimize.milp
+	has no warm start), which still skips the model construction.
+	"""
+
+	def __init__(self, instance, num_destinations=1, backend='gurobi', waiting=False, **options):
+		"""
+		:param instance: a TemporalInstance giving the topology, the weights and the initial existence function
+		:param num_destinations: the largest number of destinations of the demands to be solved
+		:param backend: 'gurobi' or 'highs'
+		:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+		:param options: backend options (threads, time_limit, output)
+		"""
+		if backend not in ('gurobi', 'highs'):
+			raise ValueError('Unknown backend %s, expected gurobi or highs' % backend)
+		self.instance = instance
+		self.capacity = num_destinations
+		self.backend = backend
+		self.options = options
+
+		tails, heads = instance.tails, instance.heads
+		num_nodes, num_edges, num_times = instance.num_nodes, instance.num_edges, instance.num_times
+		num_states = num_nodes * num_times
+
+		# Every edge-time pair, whatever the existence (existence is applied through the upper bounds)
+		all_active = numpy.ones((num_nodes, num_times), dtype=bool)
+		arc_edges, arc_times, arc_next_times = time_expanded_arcs(tails, heads, all_active)
+		if waiting:
+			waiting_nodes, waiting_times = waiting_arcs(all_active)
+		else:
+			waiting_nodes, waiting_times = numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+		num_arcs, num_waiting = len(arc_edges), len(waiting_nodes)
+
+		# Tail and head states of every variable whose bound depends on the existence (edge-time, then waiting)
+		waiting_states = waiting_nodes * num_times + waiting_times
+		self.arc_tail_states = numpy.concatenate((tails[arc_edges] * num_times + arc_times, waiting_states))
+		self.arc_head_states = numpy.concatenate((heads[arc_edges] * num_times + arc_next_times, waiting_states + 1))
+		self.arc_positions = numpy.concatenate((numpy.arange(num_arcs),
+												num_arcs + num_edges + numpy.arange(num_waiting)))
+
+		# One flow conservation row per node-time state, row i being state i
+		flow_matrix, flow_rhs, _ = flow_conservation_constraints(tails, heads, num_edges, arc_edges, arc_times,
+																 arc_next_times, num_times,
+																 numpy.arange(num_states), numpy.zeros(num_states),
+																 waiting_nodes, waiting_times)
+		linking_matrix, linking_rhs = edge_linking_constraints(num_edges, arc_edges, self.capacity, num_waiting)
+
+		objective = numpy.concatenate((numpy.zeros(num_arcs), instance.weights, numpy.zeros(num_waiting)))
+		upper_bounds = numpy.concatenate((numpy.zeros(num_arcs), numpy.ones(num_edges), numpy.zeros(num_waiting)))
+		self.formulation = Formulation(objective, linking_matrix, linking_rhs, flow_matrix, flow_rhs, upper_bounds,
+									   instance, arc_edges, arc_times, arc_next_times, self.capacity, waiting_nodes,
+									   waiting_times)
+
+		self.model = None
+		self.incumbent = None
+		if backend == 'gurobi':
+			self.model, _ = build_gurobi_model(self.formulation)
+			set_gurobi_options(self.model, **options)
+			model_variables = self.model.getVars()
+			self.arc_variables = [model_variables[i] for i in self.arc_positions]
+			self.all_variables = model_variables
+			self.flow_constraints = self.model.getConstrs()[num_arcs:]
+
+		self.update_existence(instance.existence_matrix())
+
+	def update_existence(self, existence):
+		"""
+		Sets a new existence function, changing only the bounds of the edge-time variables it affects.
+
+		:param existence: a boolean array of shape |V| x |T|, or a dictionary from (node, time) to existence {True, False}
+		"""
+		if isinstance(existence, dict):
+			existence_matrix = numpy.zeros((self.instance.num_nodes, self.instance.num_times), dtype=bool)
+			for (node, t), exists in existence.items():
+				if exists:
+					existence_matrix[self.instance.node_index[node], t] = True
+			existence = existence_matrix
+
+		active = existence.ravel()
+		arc_bounds = self.capacity * (active[self.arc_tail_states] & active[self.arc_head_states])
+
+		changed = numpy.nonzero(self.formulation.upper_bounds[self.arc_positions] != arc_bounds)[0]
+		self.formulation.upper_bounds[self.arc_positions[changed]] = arc_bounds[changed]
+		if self.model is not None and len(changed):
+			self.model.setAttr('UB', [self.arc_variables[i] for i in changed], arc_bounds[changed].tolist())
+
+	def update_demand(self, source, destinations):
+		"""
+		Sets a new demand, changing only the right hand sides of the flow conservation rows it affects.
+
+		:param source: the source node
+		:param destinations: a list of at most num_destinations destination nodes
+		"""
+		if len(destinations) > self.capacity:
+			raise ValueError('The template was built for at most %s destinations, got %s'
+							 % (self.capacity, len(destinations)))
+
+		supply_states, supply_values = node_supply(self.instance.node_index, self.instance.num_times, source, destinations)
+		rhs = numpy.zeros(len(self.formulation.equality_rhs))
+		rhs[supply_states] = supply_values
+
+		changed = numpy.nonzero(self.formulation.equality_rhs != rhs)[0]
+		self.formulation.equality_rhs[changed] = rhs[changed]
+		if self.model is not None and len(changed):
+			self.model.setAttr('RHS', [self.flow_constraints[i] for i in changed], rhs[changed].tolist())
+
+	def solve(self):
+		"""
+		Solves the model for the current existence function and demand.
+
+		:return: a SolveResult
+		"""
+		if not self.formulation.equality_rhs.any():
+			raise ValueError('No demand is set, call update_demand before solve')
+
+		if self.model is None:
+			result = solve_with_highs(self.formulation, **self.options)
+		else:
+			if self.incumbent is not None:
+				self.model.setAttr('Start', self.all_variables, self.incumbent.tolist())
+			self.model.optimize()
+			result = gurobi_result(self.model)
+
+		if result.values is not None:
+			self.incumbent = result.values
+		return result
+
+	def subgraph(self, result):
+		"""
+		:param result: a SolveResult of this template
+		:return: the chosen subgraph, a directed graph with attribute 'weight' on all edges
+		"""
+		return formulation_subgraph(self.formulation, result)
@@ -0,0 +1,229 @@
+"""
+This file implements a temporal reachability presolve for TCP and mTCP instances.
+
+A node-time pair (v, t) can only carry flow if it is reachable from (source, 0) and can reach (destination, max_time)
+in the time-expanded graph, so every other node-time pair and every edge without such an edge-time pair is dropped
+before the ILP is built. With waiting=True, flow can also wait at an active node from t to t+1 (see
+ILP_solver/formulation.py).
+"""
+import networkx
+import numpy
+from scipy import sparse
+from scipy.sparse.csgraph import breadth_first_order
+from ILP_solver.formulation import time_expanded_arcs, waiting_arcs
+from graph_tools.temporal_instance import TemporalInstance
+
+
+def presolve_TCP_instance(graph, existence_for_node_time, connectivity_demand, detailed_output=True, waiting=False):
+	"""
+	Prunes a TCP instance to the node-time pairs and edges that can lie on a source -> destination path.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param detailed_output: flag which when True will print how much of the instance was removed
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: the reduced graph, the reduced existence_for_node_time, and a dictionary of presolve statistics
+	"""
+	source, destination = connectivity_demand
+	return temporal_reachability_presolve(graph, existence_for_node_time, source, [destination], detailed_output,
+										  waiting)
+
+def presolve_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=True,
+						   waiting=False):
+	"""
+	Prunes an mTCP instance to the node-time pairs and edges that can lie on a source -> destination path
+	for some destination.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param detailed_output: flag which when True will print how much of the instance was removed
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: the reduced graph, the reduced existence_for_node_time, and a dictionary of presolve statistics
+	"""
+	return temporal_reachability_presolve(graph, existence_for_node_time, source, destinations, detailed_output,
+										  waiting)
+
+def temporal_reachability_presolve(graph, existence_for_node_time, source, destinations, detailed_output=True,
+								   waiting=False):
+	"""
+	Runs a forward search from (source, 0) and a backward search from (destination, max_time) over the
+	time-expanded graph and keeps only the node-time pairs found by both.
+
+	The reduced instance keeps every time in existence_for_node_time (pruned pairs are set to 0), always keeps
+	the source and the destinations in the graph, and can be passed to generate_TCP_model/generate_mTCP_model and
+	retreive_and_print_subgraph unchanged.
+
+	:return: the reduced graph, the reduced existence_for_node_time, and a dictionary of presolve statistics
+	"""
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	useful_existence, edge_mask, presolve_stats = temporal_reachability(instance, source, destinations,
+																		waiting=waiting)
+
+	# Rebuild the instance around the useful node-time pairs and edges
+	edges = instance.edge_list()
+	reduced_graph = networkx.DiGraph()
+	reduced_graph.add_node(source)
+	reduced_graph.add_nodes_from(destinations)
+	for e in numpy.nonzero(edge_mask)[0]:
+		u, v = edges[e]
+		reduced_graph.add_edge(u, v, **graph[u][v])
+
+	reduced_existence = {}
+	for node in reduced_graph.nodes_iter():
+		for t in range(instance.num_times):
+			reduced_existence[node, t] = int(useful_existence[instance.node_index[node], t])
+
+	if detailed_output:
+		print_presolve_stats(presolve_stats)
+
+	return reduced_graph, reduced_existence, presolve_stats
+
+def presolve_instance(instance, source, destinations, detailed_output=True, forward=None, waiting=False):
+	"""
+	Same as temporal_reachability_presolve, on a TemporalInstance.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param detailed_output: flag which when True will print how much of the instance was removed
+	:param forward: the node-time states reachable from (source, 0), as returned by forward_reachability
+					(computed if None)
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: the reduced TemporalInstance (over the same nodes), and a dictionary of presolve statistics
+	"""
+	useful_existence, edge_mask, presolve_stats = temporal_reachability(instance, source, destinations, forward,
+																		waiting)
+	if detailed_output:
+		print_presolve_stats(presolve_stats)
+	return instance.subinstance(edge_mask, useful_existence), presolve_stats
+
+def temporal_reachability(instance, source, destinations, forward=None, waiting=False):
+	"""
+	Finds the node-time pairs and edges of a TemporalInstance that can lie on a source -> destination path.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param forward: the node-time states reachable from (source, 0), as returned by forward_reachability
+					(computed if None, and then computed with the same waiting flag)
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: useful_existence (boolean array of shape |V| x |T|), edge_mask (boolean array over edges),
+			 and a dictionary of presolve statistics
+	"""
+	existence = instance.existence_matrix()
+	tails, heads = instance.tails, instance.heads
+	num_times = instance.num_times
+	num_states = instance.num_nodes * num_times
+	source_index = instance.node_index[source]
+	destination_indices = [instance.node_index[destination] for destination in destinations]
+
+	arc_edges, tail_states, head_states = state_arcs(instance, existence, waiting)
+	num_arcs = len(arc_edges)
+
+	source_states = [source_index * num_times] if existence[source_index, 0] else []
+	destination_states = [destination * num_times + num_times - 1 for destination in destination_indices
+						  if existence[destination, num_times - 1]]
+
+	if forward is None:
+		forward = reachable_states(tail_states, head_states, num_states, source_states)
+	backward = reachable_states(head_states, tail_states, num_states, destination_states)
+	useful_states = forward & backward
+	useful_arcs = useful_states[tail_states[:num_arcs]] & useful_states[head_states[:num_arcs]]
+
+	useful_existence = useful_states.reshape(instance.num_nodes, num_times)
+	edge_mask = numpy.zeros(instance.num_edges, dtype=bool)
+	edge_mask[arc_edges[useful_arcs]] = True
+
+	kept_nodes = numpy.zeros(instance.num_nodes, dtype=bool)
+	kept_nodes[tails[edge_mask]] = True
+	kept_nodes[heads[edge_mask]] = True
+	kept_nodes[[source_index] + destination_indices] = True
+
+	presolve_stats = {
+		'feasible': all(useful_existence[destination, num_times - 1] for destination in destination_indices),
+		'nodes': (instance.num_nodes, int(kept_nodes.sum())),
+		'edges': (instance.num_edges, int(edge_mask.sum())),
+		'node_times': (int(existence.sum()), int(useful_existence.sum())),
+		'edge_times': (num_arcs, int(useful_arcs.sum())),
+	}
+	return useful_existence, edge_mask, presolve_stats
+
+def forward_reachability(instance, source, waiting=False):
+	"""
+	Finds the node-time states reachable from (source, 0). It does not depend on the destinations, so it can be
+	computed once and passed to temporal_reachability/presolve_instance for every demand of the same source.
+
+	:param instance: a TemporalInstance
+	:param source: the source node
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: a boolean array over node-time states (node * |T| + t)
+	"""
+	existence = instance.existence_matrix()
+	num_times = instance.num_times
+	source_index = instance.node_index[source]
+
+	_, tail_states, head_states = state_arcs(instance, existence, waiting)
+	source_states = [source_index * num_times] if existence[source_index, 0] else []
+	return reachable_states(tail_states, head_states, instance.num_nodes * num_times, source_states)
+
+def state_arcs(instance, existence, waiting=False):
+	"""
+	Lists the arcs of the time-expanded graph between node-time states (node * |T| + t).
+
+	:param instance: a TemporalInstance
+	:param existence: the existence matrix of the instance
+	:param waiting: flag which when True also lists the waiting arcs (v, t) -> (v, t+1), after the edge arcs
+	:return: arc_edges (array over the edge arcs), tail_states and head_states (arrays over all arcs)
+	"""
+	tails, heads = instance.tails, instance.heads
+	num_times = instance.num_times
+	arc_edges, arc_times, arc_next_times = time_expanded_arcs(tails, heads, existence)
+	tail_states = tails[arc_edges] * num_times + arc_times
+	head_states = heads[arc_edges] * num_times + arc_next_times
+	if waiting:
+		waiting_nodes, waiting_times = waiting_arcs(existence)
+		waiting_states = waiting_nodes * num_times + waiting_times
+		tail_states = numpy.concatenate((tail_states, waiting_states))
+		head_states = numpy.concatenate((head_states, waiting_states + 1))
+	return arc_edges, tail_states, head_states
+
+def reachable_states(tail_states, head_states, num_states, start_states):
+	"""
+	Returns which node-time states are reachable from any of the start states along the arcs tail -> head.
+
+	:param tail_states: array of arc tail states
+	:param head_states: array of arc head states
+	:param num_states: number of node-time states
+	:param start_states: list of states to search from
+	:return: a boolean array over states
+	"""
+	reachable = numpy.zeros(num_states, dtype=bool)
+	if not start_states:
+		return reachable
+
+	# A super start state (num_states) points at every start state, so one breadth first search covers them all
+	rows = numpy.concatenate((tail_states, numpy.full(len(start_states), num_states, dtype=numpy.int64)))
+	columns = numpy.concatenate((head_states, numpy.array(start_states, dtype=numpy.int64)))
+	adjacency = sparse.csr_matrix((numpy.ones(len(rows)), (rows, columns)), shape=(num_states + 1, num_states + 1))
+
+	order = breadth_first_order(adjacency, num_states, directed=True, return_predecessors=False)
+	reachable[order[order < num_states]] = True
+	return reachable
+
+def print_presolve_stats(presolve_stats):
+	"""
+	Prints how much of the instance the presolve removed.
+
+	:param presolve_stats: a dictionary of presolve statistics as returned by temporal_reachability_presolve
+	"""
+	print('-----------------------------------------------------------------------')
+	print('Temporal reachability presolve (before -> after):')
+	for key in ['nodes', 'edges', 'node_times', 'edge_times']:
+		before, after = presolve_stats[key]
+		removed = 100.0 * (before - after) / before if before else 0.0
+		print('    %s: %s -> %s (%.1f%% removed)' % (key, before, after, removed))
+	if not presolve_stats['feasible']:
+		print('    a destination cannot be reached from the source, the instance is infeasible')
@@ -0,0 +1,293 @@
+"""
+This file implements a rolling-horizon solve mode for TCP and mTCP instances with long time horizons.
+
+[0, max_time] is split into overlapping windows of window_length time steps, and every window is solved with the
+sparse formulation (see ILP_solver/formulation.py) over a small instance made of
+
+- the node-time states of the window that are reachable from (source, 0) and can reach (destination, max_time)
+- a super source, connected at no cost to the frontier: the state where the path committed so far enters the window
+- a super sink, connected from every state at the end of the window at the cost of the static shortest path from
+  there to the destination (an estimate of the cost still to pay)
+
+where the edges already paid for cost nothing. The part of the window's path before the start of the next window is
+committed, and the next window continues from the state the path reaches at that time. For mTCP the destinations are
+connected one after the other, each reusing the edges paid for by the previous ones at no cost. With waiting=True,
+paths can also wait at active nodes for free (see ILP_solver/formulation.py).
+
+Only one window is held as a model at a time, so memory does not grow with the horizon, at the price of optimality:
+the cost of the stitched subgraph is returned together with a lower bound on the optimum (the longest static shortest
+path from the source to a destination over the edges that can be used in time).
+"""
+import networkx
+import numpy
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+from ILP_solver.formulation import build_instance_formulation
+from ILP_solver.backends import solve_formulation
+from ILP_solver.heuristic import heuristic_start
+from ILP_solver.presolve import temporal_reachability, reachable_states
+from graph_tools.temporal_instance import TemporalInstance
+from utils import print_edges_in_graph
+
+
+def solve_rolling_horizon_TCP_instance(graph, existence_for_node_time, connectivity_demand, window_length=10,
+									   overlap=5, backend='highs', detailed_output=True, waiting=False, quiet=False,
+									   **options):
+	"""
+	Given a simple TCP problem instance, returns a subgraph that satisfies the demand, solving one time window at a
+	time.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param window_length: number of time steps of a window
+	:param overlap: number of time steps shared by consecutive windows (at least 1)
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the subgraph
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:param quiet: flag which when True prints nothing, the solver log included
+	:param options: backend options for every window (threads, time_limit, output)
+	:return: the subgraph, its cost and a lower bound on the optimal cost (None, None, None if infeasible)
+	"""
+	source, destination = connectivity_demand
+	return solve_rolling_horizon_mTCP_instance(graph, existence_for_node_time, source, [destination], window_length,
+											   overlap, backend, detailed_output, waiting, quiet, **options)
+
+def solve_rolling_horizon_mTCP_instance(graph, existence_for_node_time, source, destinations, window_length=10,
+										overlap=5, backend='highs', detailed_output=True, waiting=False, quiet=False,
+										**options):
+	"""
+	Given a multi-destination TCP problem instance, returns a subgraph that satisfies the demand, solving one time
+	window at a time.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param window_length: number of time steps of a window
+	:param overlap: number of time steps shared by consecutive windows (at least 1)
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the subgraph
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:param quiet: flag which when True prints nothing, the solver log included
+	:param options: backend options for every window (threads, time_limit, output)
+	:return: the subgraph, its cost and a lower bound on the optimal cost (None, None, None if infeasible)
+	"""
+	if quiet:
+		options['output'] = False
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	subgraph, cost, lower_bound = rolling_horizon_instance(instance, source, destinations, window_length, overlap,
+														   backend, waiting, **options)
+	if quiet:
+		return subgraph, cost, lower_bound
+
+	print('-----------------------------------------------------------------------')
+	if subgraph is None:
+		print('Rolling horizon found no solution of the sDCP instance')
+	else:
+		print('Rolling horizon solution of sDCP instance costs %s (lower bound %s)' % (cost, lower_bound))
+		if detailed_output:
+			print('Edges in subgraph:')
+			print_edges_in_graph(subgraph)
+	return subgraph, cost, lower_bound
+
+def rolling_horizon_instance(instance, source, destinations, window_length=10, overlap=5, backend='highs',
+							 waiting=False, **options):
+	"""
+	Same as solve_rolling_horizon_mTCP_instance, on a TemporalInstance. The solver log is off unless output=True
+	is passed.
+
+	:return: the subgraph, its cost and a lower bound on the optimal cost (None, None, None if infeasible)
+	"""
+	if not 1 <= overlap < window_length:
+		raise ValueError('overlap must be at least 1 and less than window_length')
+	options.setdefault('output', False)
+
+	source_index = instance.node_index[source]
+	forward = time_sliced_reachability(instance, source_index, waiting=waiting)
+	paid_edges = numpy.zeros(instance.num_edges, dtype=bool)
+	lower_bound = 0.0
+
+	for destination in destinations:
+		destination_index = instance.node_index[destination]
+		coreachable = time_sliced_reachability(instance, destination_index, backward=True, waiting=waiting)
+		useful = forward & coreachable
+		if not useful[destination_index, instance.num_times - 1]:
+			return None, None, None
+
+		# Static distances to the destination over the edges that can be used in time
+		cost_to_go = static_distances(instance, usable_edges(instance, useful), destination_index)
+		lower_bound = max(lower_bound, float(cost_to_go[source_index]))
+
+		if not rolling_horizon_path(instance, source_index, destination_index, useful, cost_to_go, paid_edges,
+									window_length, overlap, backend, options, waiting):
+			return None, None, None
+
+	chosen = numpy.nonzero(paid_edges)[0]
+	subgraph = networkx.DiGraph()
+	subgraph.add_nodes_from([source] + list(destinations))
+	subgraph.add_weighted_edges_from(zip(instance.nodes[instance.tails[chosen]].tolist(),
+										 instance.nodes[instance.heads[chosen]].tolist(),
+										 instance.weights[chosen].tolist()))
+	return subgraph, float(instance.weights[chosen].sum()), lower_bound
+
+def rolling_horizon_path(instance, source_index, destination_index, useful, cost_to_go, paid_edges, window_length,
+						 overlap, backend, options, waiting=False):
+	"""
+	Routes a path from (source, 0) to (destination, max_time) window by window, marking its edges in paid_edges.
+
+	:param useful: boolean array of shape |V| x |T| of the states reachable from the source and reaching the destination
+	:param cost_to_go: array of the static distance from every node to the destination
+	:param paid_edges: boolean array over edges, True for edges already paid for (updated in place)
+	:return: True if the path was found
+	"""
+	num_times = instance.num_times
+	start = 0
+	frontier = numpy.array([source_index])
+	while True:
+		end = min(start + window_length - 1, num_times - 1)
+		last = end == num_times - 1
+		next_start = end + 1 if last else start + window_length - overlap
+
+		window, window_edges = window_instance(instance, start, end, frontier, useful, cost_to_go, paid_edges,
+											   destination_index if last else None)
+		super_source, super_sink = instance.num_nodes, instance.num_nodes + 1
+		useful_existence, edge_mask, _ = temporal_reachability(window, super_source, [super_sink], waiting=waiting)
+		window = window.subinstance(edge_mask, useful_existence)
+		window_edges = window_edges[edge_mask]
+
+		formulation = build_instance_formulation(window, super_source, [super_sink], waiting)
+		result = solve_formulation(formulation, backend, start=heuristic_start(formulation, super_source, [super_sink]),
+								   **options)
+		if result.values is None:
+			return False
+
+		# Map the arcs of the path back to edges and times of the instance (window time 0 is the super source's)
+		used = result.values[:len(formulation.arc_edges)] > 0.5
+		edges = window_edges[formulation.arc_edges[used]]
+		times = formulation.arc_times[used] - 1 + start
+		next_times = formulation.arc_next_times[used] - 1 + start
+		real = edges >= 0
+
+		committed = real & (times < next_start)
+		paid_edges[edges[committed]] = True
+		if last:
+			return True
+
+		crossing = committed & (next_times == next_start)
+		# A path waiting from next_start - 1 to next_start crosses at its node (window time t + 1 is time start + t)
+		waiting_used = result.values[len(formulation.objective) - len(formulation.waiting_nodes):] > 0.5
+		waiting_crossing = formulation.waiting_times[waiting_used] + start == next_start
+		frontier = numpy.unique(numpy.concatenate((instance.heads[edges[crossing]],
+												   formulation.waiting_nodes[waiting_used][waiting_crossing])))
+		start = next_start
+
+def window_instance(instance, start, end, frontier, useful, cost_to_go, paid_edges, destination_index=None):
+	"""
+	Builds the instance of the window [start, end], over the nodes of the instance (by position) plus a super source
+	(position |V|, active at window time 0 only) and a super sink (position |V| + 1, active at the last window time
+	only). Window time t + 1 is time start + t of the instance.
+
+	:param frontier: array of the nodes the super source connects to at time start
+	:param destination_index: the destination, the only node connected to the super sink in the last window
+							  (every node is connected to it, at its cost to go, if None)
+	:return: the window's TemporalInstance, and the instance edge of every window edge (-1 for super source and super
+			 sink edges)
+	"""
+	num_nodes = instance.num_nodes
+	super_source, super_sink = num_nodes, num_nodes + 1
+	if destination_index is None:
+		sink_nodes = numpy.nonzero(useful[:, end])[0]
+		sink_weights = cost_to_go[sink_nodes]
+	else:
+		sink_nodes = numpy.array([destination_index])
+		sink_weights = numpy.zeros(1)
+
+	tails = numpy.concatenate((instance.tails, numpy.full(len(frontier), super_source), sink_nodes))
+	heads = numpy.concatenate((instance.heads, frontier, numpy.full(len(sink_nodes), super_sink)))
+	weights = numpy.concatenate((numpy.where(paid_edges, 0.0, instance.weights), numpy.zeros(len(frontier)),
+								 sink_weights))
+	edges = numpy.concatenate((numpy.arange(instance.num_edges), -numpy.ones(len(frontier) + len(sink_nodes),
+																			  dtype=numpy.int64)))
+
+	existence = numpy.zeros((num_nodes + 2, end - start + 3), dtype=bool)
+	existence[:num_nodes, 1:-1] = useful[:, start:end + 1]
+	existence[super_source, 0] = True
+	existence[super_sink, -1] = True
+
+	order = numpy.lexsort((heads, tails))
+	indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(tails, minlength=num_nodes + 2))))
+	window = TemporalInstance(numpy.arange(num_nodes + 2), indptr, heads[order], weights[order], existence)
+	return window, edges[order]
+
+def time_sliced_reachability(instance, start_index, backward=False, waiting=False):
+	"""
+	Finds the node-time states reachable from (start, 0), or from which (start, max_time) is reachable if backward,
+	one time step at a time, so that the time-expanded graph is never built as a whole.
+
+	:param instance: a TemporalInstance
+	:param start_index: position of the start node
+	:param backward: flag which when True searches backward in time from (start, max_time)
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: a boolean array of shape |V| x |T|
+	"""
+	existence = instance.existence_matrix()
+	tails, heads = instance.tails, instance.heads
+	if backward:
+		tails, heads = heads, tails
+	times = range(instance.num_times - 1, -1, -1) if backward else range(instance.num_times)
+
+	reachable = numpy.zeros((instance.num_nodes, instance.num_times), dtype=bool)
+	previous = None
+	for t in times:
+		previous_reachable = reachable[:, previous] if previous is not None else None
+		reachable[:, t] = reachability_step(tails, heads, instance.num_nodes, existence[:, t], previous_reachable,
+											start_index, waiting)
+		previous = t
+	return reachable
+
+def reachability_step(tails, heads, num_nodes, active, previous_reachable=None, start_index=None, waiting=False):
+	"""
+	Finds the nodes reachable at one time step, from the nodes reachable at the previous time step, or from the start
+	node if there is no previous time step.
+
+	:param tails: array of edge tails (node positions)
+	:param heads: array of edge heads (node positions)
+	:param num_nodes: |V|
+	:param active: boolean array over nodes of the activity at the time step
+	:param previous_reachable: boolean array over nodes reachable at the previous time step (None at the first one)
+	:param start_index: position of the start node, used at the first time step
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: a boolean array over nodes
+	"""
+	if previous_reachable is None:
+		start_states = [start_index] if active[start_index] else []
+	else:
+		# Arcs from the states found at the previous time step
+		start_states = numpy.unique(heads[previous_reachable[tails] & active[heads]]).tolist()
+		if waiting:
+			start_states = numpy.union1d(start_states, numpy.nonzero(previous_reachable & active)[0]).tolist()
+	same_time = active[tails] & active[heads]
+	return reachable_states(tails[same_time], heads[same_time], num_nodes, start_states)
+
+def usable_edges(instance, useful):
+	"""
+	:param useful: boolean array of shape |V| x |T| of the states that can lie on a source -> destination path
+	:return: a boolean array over edges, True for the edges with an edge-time pair between useful states
+	"""
+	tails, heads = instance.tails, instance.heads
+	usable = numpy.zeros(instance.num_edges, dtype=bool)
+	for t in range(instance.num_times):
+		usable |= useful[tails, t] & useful[heads, t]
+		if t + 1 < instance.num_times:
+			usable |= useful[tails, t] & useful[heads, t + 1]
+	return usable
+
+def static_distances(instance, edge_mask, destination_index):
+	"""
+	:return: the shortest path distance from every node to the destination over the edges in edge_mask, ignoring time
+	"""
+	reverse_adjacency = sparse.csr_matrix((instance.weights[edge_mask],
+										   (instance.heads[edge_mask], instance.tails[edge_mask])),
+										  shape=(instance.num_nodes, instance.num_nodes))
+	return dijkstra(reverse_adjacency, directed=True, indices=destination_index)
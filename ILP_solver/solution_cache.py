@@ -0,0 +1,288 @@
+"""
+This file implements an on-disk cache of solutions, so that a query solved once (by any process, before or after a
+restart) is answered again without building or solving a model.
+
+An entry is keyed by the SHA-256 digest of a canonical form of the query:
+
+- the instance: node labels, edges, weights and existence, in an order that does not depend on how the graph was built
+- the demand: the source and the sorted destinations
+- the formulation options (waiting)
+
+and is stored as a solution file (see save_solution in graph_tools/instance_io.py) named after the digest. Only
+optimal and infeasible results are cached, since they do not depend on the backend or its time limit. Solves with a
+positive mip_gap are not cached unless infeasible: their 'optimal' subgraphs are only optimal within the gap, and
+would be returned as exact optima to later queries.
+
+Entries are written under a temporary name and renamed, so concurrent readers never see a partial entry, and every
+hit touches the entry's modification time. When the cache grows over max_bytes, the least recently used entries are
+deleted, under a lock file that serializes writers and eviction between the processes of a host.
+"""
+import hashlib
+import json
+import os
+import time as python_time
+import numpy
+from ILP_solver.backends import OPTIMAL, INFEASIBLE, solve_sparse_instance
+from graph_tools.instance_io import save_solution, load_solution, to_json_label
+from graph_tools.temporal_instance import TemporalInstance
+from utils import print_edges_in_graph
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+# Version of the canonical form, changed whenever the key of a query or what is cached changes
+CACHE_KEY_VERSION = 1
+
+# Default size cap of a cache directory
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+LOCK_FILE_NAME = '.lock'
+ENTRY_SUFFIX = '.npz'
+
+
+class SolutionCache(object):
+	"""
+	A directory of cached solutions with a size cap and least recently used eviction. Any number of processes of the
+	same host can share a directory.
+	"""
+
+	def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+		"""
+		:param directory: the cache directory (created if missing)
+		:param max_bytes: the size cap of the entries, in bytes
+		"""
+		self.directory = directory
+		self.max_bytes = max_bytes
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				# Created by another process in the meantime
+				if not os.path.isdir(directory):
+					raise
+
+	def key(self, instance_key, source, destinations, waiting=False):
+		"""
+		:param instance_key: the digest of the instance, as returned by instance_digest
+		:param source: the source node
+		:param destinations: a list of destination nodes
+		:param waiting: the waiting option of the formulation
+		:return: the cache key of the query, a hexadecimal string
+		"""
+		query = {
+			'version': CACHE_KEY_VERSION,
+			'instance': instance_key,
+			'source': to_json_label(source),
+			'destinations': sorted(json.dumps(to_json_label(destination)) for destination in destinations),
+			'waiting': bool(waiting),
+		}
+		return hashlib.sha256(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+
+	def get(self, key):
+		"""
+		:param key: a cache key
+		:return: the cached subgraph (None if the query is infeasible), objective and stats record, or None on a miss
+		"""
+		path = self.entry_path(key)
+		try:
+			entry = load_solution(path)
+			os.utime(path, None)
+		except (IOError, OSError, ValueError, KeyError):
+			# Missing, or evicted by another process while being read
+			return None
+		return entry
+
+	def put(self, key, subgraph, objective, stats):
+		"""
+		Stores a solution, then evicts the least recently used entries if the cache is over its size cap.
+
+		:param key: a cache key
+		:param subgraph: the optimal subgraph (None if the query is infeasible)
+		:param objective: the optimal objective (None if the query is infeasible)
+		:param stats: a stats record (see ILP_solver/instrumentation.py)
+		"""
+		with CacheLock(self.directory):
+			save_solution(self.entry_path(key), subgraph, objective, json_stats(stats))
+			self.evict()
+
+	def evict(self):
+		"""
+		Deletes the least recently used entries until the cache fits in max_bytes. Must be called under the lock.
+		"""
+		entries = []
+		for file_name in os.listdir(self.directory):
+			if not file_name.endswith(ENTRY_SUFFIX):
+				continue
+			try:
+				status = os.stat(os.path.join(self.directory, file_name))
+			except OSError:
+				continue
+			entries.append((status.st_mtime, status.st_size, file_name))
+
+		total_bytes = sum(size for _, size, _ in entries)
+		for _, size, file_name in sorted(entries):
+			if total_bytes <= self.max_bytes:
+				break
+			try:
+				os.remove(os.path.join(self.directory, file_name))
+			except OSError:
+				pass
+			total_bytes -= size
+
+	def size(self):
+		"""
+		:return: the number of entries and their total size in bytes
+		"""
+		sizes = [os.path.getsize(os.path.join(self.directory, file_name)) for file_name in os.listdir(self.directory)
+				 if file_name.endswith(ENTRY_SUFFIX)]
+		return len(sizes), sum(sizes)
+
+	def clear(self):
+		"""
+		Deletes every entry.
+		"""
+		with CacheLock(self.directory):
+			for file_name in os.listdir(self.directory):
+				if file_name.endswith(ENTRY_SUFFIX):
+					os.remove(os.path.join(self.directory, file_name))
+
+	def entry_path(self, key):
+		return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+
+class CacheLock(object):
+	"""
+	An exclusive lock on a cache directory, held with flock on its lock file (a no-op where fcntl is unavailable).
+	"""
+
+	def __init__(self, directory):
+		self.path = os.path.join(directory, LOCK_FILE_NAME)
+		self.lock_file = None
+
+	def __enter__(self):
+		self.lock_file = open(self.path, 'a')
+		if fcntl is not None:
+			fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if fcntl is not None:
+			fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+		self.lock_file.close()
+		return False
+
+
+def solve_cached_TCP_instance(cache, graph, existence_for_node_time, connectivity_demand, backend='highs',
+							  detailed_output=True, **options):
+	"""
+	Same as solve_sparse_TCP_instance, answered from the cache when the same query was solved before.
+
+	:param cache: a SolutionCache
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param options: the options of solve_sparse_instance
+	:return: a optimal subgraph containing the path if the solution is Optimal, else None (followed by the stats
+			 record if return_stats)
+	"""
+	source, destination = connectivity_demand
+	return solve_cached_mTCP_instance(cache, graph, existence_for_node_time, source, [destination], backend,
+									  detailed_output, **options)
+
+def solve_cached_mTCP_instance(cache, graph, existence_for_node_time, source, destinations, backend='highs',
+							   detailed_output=True, return_stats=False, quiet=False, waiting=False, **options):
+	"""
+	Same as solve_sparse_mTCP_instance, answered from the cache when the same query was solved before. The stats
+	record of a hit is the one of the original solve, with cache set to 'hit' and total_time to the lookup time.
+
+	:param cache: a SolutionCache
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param detailed_output: flag which when True will print the edges in the optimal subgraph
+	:param options: the options of solve_sparse_instance
+	:return: a optimal subgraph containing the path(s) if the solution is Optimal, else None (followed by the stats
+			 record if return_stats)
+	"""
+	start_time = python_time.time()
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	key = cache.key(instance_digest(instance), source, destinations, waiting)
+
+	entry = cache.get(key)
+	if entry is not None:
+		subgraph, objective, stats = entry
+		stats['cache'] = 'hit'
+		stats['total_time'] = python_time.time() - start_time
+		if not quiet:
+			print('-----------------------------------------------------------------------')
+			if subgraph is None:
+				print('Cached sDCP instance is infeasible')
+			else:
+				print('Cached sDCP instance. Optimal Solution costs ' + str(objective))
+				if detailed_output:
+					print('Edges in minimal subgraph:')
+					print_edges_in_graph(subgraph)
+	else:
+		subgraph, stats = solve_sparse_instance(graph, existence_for_node_time, source, destinations, backend,
+												detailed_output, return_stats=True, quiet=quiet, waiting=waiting,
+												**options)
+		stats['cache'] = 'miss'
+		if cacheable_result(stats['status'], options.get('mip_gap')):
+			cache.put(key, subgraph, stats['objective'], stats)
+
+	if return_stats:
+		return subgraph, stats
+	return subgraph
+
+def cacheable_result(status, mip_gap=None):
+	"""
+	:param status: the status of a solve
+	:param mip_gap: the relative gap the solve was stopped at
+	:return: True if the result of the solve is exact, and can be answered to later queries from the cache
+	"""
+	return status == INFEASIBLE or (status == OPTIMAL and not mip_gap)
+
+def instance_digest(instance):
+	"""
+	Hashes a canonical form of an instance: nodes are sorted by label and edges by (tail, head), so that the digest
+	only depends on the graph, its weights and its existence function.
+
+	:param instance: a TemporalInstance
+	:return: a hexadecimal string
+	"""
+	labels = [to_json_label(node) for node in instance.nodes.tolist()]
+	if instance.nodes.dtype == object:
+		order = numpy.array(sorted(range(len(labels)), key=lambda i: json.dumps(labels[i])), dtype=numpy.int64)
+	else:
+		order = numpy.argsort(instance.nodes, kind='mergesort')
+	rank = numpy.empty(instance.num_nodes, dtype=numpy.int64)
+	rank[order] = numpy.arange(instance.num_nodes)
+
+	tails, heads = rank[instance.tails], rank[instance.heads]
+	edge_order = numpy.lexsort((heads, tails))
+
+	digest = hashlib.sha256()
+	digest.update(json.dumps([labels[i] for i in order.tolist()]).encode('utf-8'))
+	for array in (tails[edge_order], heads[edge_order], instance.weights[edge_order],
+				  instance.existence_matrix()[order]):
+		digest.update(numpy.ascontiguousarray(array).tobytes())
+	digest.update(str(instance.num_times).encode('utf-8'))
+	return digest.hexdigest()
+
+def json_stats(stats):
+	"""
+	:return: a copy of a stats record with numpy numbers and tuples converted to JSON values
+	"""
+	if isinstance(stats, dict):
+		return dict((key, json_stats(value)) for key, value in stats.items())
+	if isinstance(stats, (list, tuple)):
+		return [json_stats(value) for value in stats]
+	if isinstance(stats, numpy.generic):
+		return stats.item()
+	return stats
@@ -0,0 +1,537 @@
+"""
+This file implements a streaming solver for TCP and mTCP demands over a graph whose existence function arrives one
+time step at a time, as snapshots of the active nodes.
+
+Every snapshot extends the time-expanded graph by one time step. The solver keeps
+
+- the forward reachability frontier: the nodes reachable from (source, 0) at the latest time step, updated from the
+  previous frontier and the new snapshot only
+- a sliding window of the last window_length snapshots (all of them if window_length is None), the only part of the
+  existence function held in memory
+- the entry labels: for every node reachable from (source, 0) when entering the first time step of the window, the
+  cheapest known prefix path to it, as a set of edges and its cost. When a snapshot leaves the window, the labels are
+  advanced by one time step, so the prefix before the window is summarized without being stored.
+
+A demand is solved over the window only: a super source enters the window at the nodes of the entry labels, at the
+cost of their prefix, and the destinations are reached at the latest time step. extend() reuses the current best
+subgraph at no cost and adds the cheapest temporal paths it misses (see ILP_solver/heuristic.py), without a solver,
+and solve() solves the window with the sparse formulation. Without a window the entry is (source, 0) and solve() is
+exact, with a window the prefix is fixed to the entry labels' paths.
+
+The sparse formulation of the window is cached as an ExpandingFormulation: a new snapshot only appends the columns and
+rows of its time step, and solve() is warm-started with the previous solution, whose flow into the destinations is
+carried forward over the new time steps. The cache is rebuilt only when the window slides, since the entry labels
+change then.
+"""
+import heapq
+import networkx
+import numpy
+from collections import deque
+from ILP_solver.backends import solve_formulation
+from scipy import sparse
+from ILP_solver.formulation import Formulation, edge_linking_constraints
+from ILP_solver.heuristic import heuristic_start, temporal_path_union
+from ILP_solver.presolve import reachable_states
+from ILP_solver.rolling_horizon import reachability_step
+from graph_tools.temporal_instance import TemporalInstance
+
+
+class StreamingSolver(object):
+	"""
+	A TCP/mTCP demand over a fixed topology, whose existence function is given one snapshot at a time with
+	add_snapshot. After any snapshot, extend() and solve() return a subgraph connecting the source at time 0 to every
+	destination at the latest time step.
+	"""
+
+	def __init__(self, graph, source, destinations, window_length=None, backend='highs', waiting=False, **options):
+		"""
+		:param graph: a directed graph with attribute 'weight' on all edges, or a TemporalInstance giving the topology
+					  and the weights (its existence function is ignored)
+		:param source: the source node
+		:param destinations: a list of destination nodes
+		:param window_length: number of snapshots held in memory and solved over (all snapshots if None)
+		:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+		:param waiting: flag which when True lets paths wait at active nodes for free (see ILP_solver/formulation.py)
+		:param options: backend options (threads, time_limit, output), with the solver log off unless output=True
+		"""
+		if window_length is not None and window_length < 1:
+			raise ValueError('window_length must be at least 1')
+		if not isinstance(graph, TemporalInstance):
+			# Only the topology is used, the existence function comes from the snapshots
+			graph = TemporalInstance.from_networkx(graph, dict(((node, 0), 0) for node in graph.nodes_iter()))
+		options.setdefault('output', False)
+		self.instance = graph
+		self.source = source
+		self.destinations = list(destinations)
+		self.window_length = window_length
+		self.backend = backend
+		self.waiting = waiting
+		self.options = options
+
+		self.source_index = graph.node_index[source]
+		self.destination_indices = numpy.array([graph.node_index[destination] for destination in self.destinations],
+											   dtype=numpy.int64)
+		self.tails, self.heads = graph.tails, graph.heads
+
+		self.snapshots = deque()
+		self.num_times = 0
+		self.window_start = 0
+		self.reachable = numpy.zeros(graph.num_nodes, dtype=bool)
+		# Prefix labels at the first time step of the window (the source with an empty prefix at time 0)
+		self.entry_costs = numpy.full(graph.num_nodes, numpy.inf)
+		self.entry_costs[self.source_index] = 0.0
+		self.entry_paths = {self.source_index: frozenset()}
+		self.best_edges = None
+		self.best_cost = None
+		# The cached formulation of the window, and the last solution of it with the sizes it had then
+		self.expanding = None
+		self.previous_values = None
+		self.previous_sizes = None
+
+	def add_snapshot(self, active_nodes):
+		"""
+		Appends the activity of the next time step, updates the reachability frontier, and slides the window if it is
+		full.
+
+		:param active_nodes: the active nodes, as a collection of node labels or a boolean array over the positions of
+							 instance.nodes
+		"""
+		if isinstance(active_nodes, numpy.ndarray) and active_nodes.dtype == bool:
+			active = active_nodes.copy()
+		else:
+			active = numpy.zeros(self.instance.num_nodes, dtype=bool)
+			active[[self.instance.node_index[node] for node in active_nodes if node in self.instance.node_index]] = True
+
+		previous_reachable = self.reachable if self.num_times > 0 else None
+		self.reachable = reachability_step(self.tails, self.heads, self.instance.num_nodes, active, previous_reachable,
+										   self.source_index, self.waiting)
+		if self.num_times == 0 and not active[self.source_index]:
+			self.entry_costs[self.source_index] = numpy.inf
+			self.entry_paths = {}
+		self.snapshots.append(active)
+		self.num_times += 1
+
+		if self.window_length is not None and len(self.snapshots) > self.window_length:
+			leaving = self.snapshots.popleft()
+			self.entry_costs, self.entry_paths = advance_labels(self.instance, self.entry_costs, self.entry_paths,
+																leaving, self.snapshots[0], self.waiting)
+			self.window_start += 1
+			self.expanding = None
+			self.previous_values = None
+		elif self.expanding is not None:
+			self.expanding.append_time(numpy.append(active, False))
+
+	def is_connected(self):
+		"""
+		:return: True if every destination is reachable from (source, 0) at the latest time step
+		"""
+		return self.num_times > 0 and bool(self.reachable[self.destination_indices].all())
+
+	def reachable_nodes(self):
+		"""
+		:return: the list of nodes reachable from (source, 0) at the latest time step
+		"""
+		return self.instance.nodes[self.reachable].tolist()
+
+	def extend(self):
+		"""
+		Extends the current best subgraph to the latest time step: its edges are reused for free, and the cheapest
+		temporal paths are added where they do not connect the destinations any more.
+
+		:return: the subgraph and its cost, or None, None if the destinations are not reachable
+		"""
+		window = self.window_formulation()
+		if window is None:
+			return None, None
+		formulation, window_edges = window
+		values = self.extension_start(formulation, window_edges)
+		return self.update_best(formulation, window_edges, values)
+
+	def solve(self):
+		"""
+		Solves the demand over the window, warm-started with the previous solution carried forward to the latest time
+		step (or with the extension of the current best subgraph if there is none).
+
+		:return: the subgraph and its cost, or None, None if the destinations are not reachable
+		"""
+		window = self.window_formulation()
+		if window is None:
+			return None, None
+		formulation, window_edges = window
+		start = None
+		if self.previous_values is not None:
+			start = self.expanding.carried_start(formulation, self.previous_values, self.previous_sizes,
+												 self.destination_indices.tolist())
+		if start is None:
+			start = self.extension_start(formulation, window_edges)
+		result = solve_formulation(formulation, self.backend, start=start, **self.options)
+		return self.update_best(formulation, window_edges, result.values)
+
+	def window_formulation(self):
+		"""
+		Returns the formulation of the demand over the window, from the super source (position |V|, active at window
+		time 0 only) to the destinations at the latest time step. Window time t + 1 is time window_start + t. The
+		ExpandingFormulation is built from the snapshots of the window if there is none since the window last slid.
+
+		:return: the Formulation and the instance edge of every window edge (-1 for super source edges), or None if
+				 the destinations are not reachable
+		"""
+		if not self.is_connected():
+			return None
+		if self.expanding is None:
+			self.expanding = self.window_expanding_formulation()
+		formulation = self.expanding.formulation(self.destination_indices.tolist())
+		if formulation is None:
+			return None
+		return formulation, self.expanding.window_edges
+
+	def window_expanding_formulation(self):
+		"""
+		:return: the ExpandingFormulation of the window, with the super source edges entering the window at the nodes of
+				 the entry labels at the cost of their prefix
+		"""
+		instance = self.instance
+		num_nodes = instance.num_nodes
+		super_source = num_nodes
+		entry_nodes = numpy.nonzero(numpy.isfinite(self.entry_costs))[0]
+
+		tails = numpy.concatenate((self.tails, numpy.full(len(entry_nodes), super_source, dtype=numpy.int64)))
+		heads = numpy.concatenate((self.heads, entry_nodes))
+		weights = numpy.concatenate((instance.weights, self.entry_costs[entry_nodes]))
+		edges = numpy.concatenate((numpy.arange(instance.num_edges), -numpy.ones(len(entry_nodes), dtype=numpy.int64)))
+
+		order = numpy.lexsort((heads, tails))
+		indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(tails, minlength=num_nodes + 1))))
+		expanding = ExpandingFormulation(numpy.arange(num_nodes + 1), indptr, heads[order], weights[order],
+										 edges[order], super_source, self.waiting)
+		for active in self.snapshots:
+			expanding.append_time(numpy.append(active, False))
+		return expanding
+
+	def extension_start(self, formulation, window_edges):
+		"""
+		:return: the heuristic solution of the window formulation with the edges of the best subgraph costing nothing,
+				 as a vector over its variables (None if the destinations are not reachable)
+		"""
+		window = formulation.instance
+		if self.best_edges is not None:
+			free = (window_edges >= 0) & self.best_edges[numpy.maximum(window_edges, 0)]
+			window = TemporalInstance(window.nodes, window.indptr, window.indices,
+									  numpy.where(free, 0.0, window.weights), window.existence)
+		return heuristic_start(formulation._replace(instance=window), formulation.instance.num_nodes - 1,
+							   self.destination_indices.tolist())
+
+	def update_best(self, formulation, window_edges, values):
+		"""
+		Maps a solution of the window formulation back to the edges of the instance (the prefix paths of the entry
+		nodes included), and makes it the best subgraph.
+
+		:return: the subgraph and its cost, or None, None if there is no solution
+		"""
+		if values is None:
+			return None, None
+		self.previous_values = values
+		self.previous_sizes = self.expanding.sizes()
+		instance = self.instance
+		used_edges = window_edges[formulation.arc_edges[values[:len(formulation.arc_edges)] > 0.5]]
+
+		chosen = numpy.zeros(instance.num_edges, dtype=bool)
+		chosen[used_edges[used_edges >= 0]] = True
+		for entry_node in self.used_entry_nodes(formulation, values).tolist():
+			chosen[list(self.entry_paths[entry_node])] = True
+
+		self.best_edges = chosen
+		self.best_cost = float(instance.weights[chosen].sum())
+		chosen_edges = numpy.nonzero(chosen)[0]
+		subgraph = networkx.DiGraph()
+		subgraph.add_nodes_from([self.source] + self.destinations)
+		subgraph.add_weighted_edges_from(zip(instance.nodes[instance.tails[chosen_edges]].tolist(),
+											 instance.nodes[instance.heads[chosen_edges]].tolist(),
+											 instance.weights[chosen_edges].tolist()))
+		return subgraph, self.best_cost
+
+	def used_entry_nodes(self, formulation, values):
+		"""
+		:return: the array of the entry nodes whose super source edge carries flow in a solution of the window
+				 formulation
+		"""
+		window = formulation.instance
+		entry_edges = numpy.nonzero(window.tails == window.num_nodes - 1)[0]
+		edge_flow = numpy.zeros(window.num_edges)
+		numpy.add.at(edge_flow, formulation.arc_edges, values[:len(formulation.arc_edges)])
+		return window.heads[entry_edges[edge_flow[entry_edges] > 0.5]]
+
+	@property
+	def nbytes(self):
+		"""
+		Memory used by the window, the labels and the cached formulation, in bytes (the topology excluded).
+		"""
+		cached = self.expanding.nbytes if self.expanding is not None else 0
+		return sum(snapshot.nbytes for snapshot in self.snapshots) + self.reachable.nbytes + self.entry_costs.nbytes + \
+			8 * sum(len(path) for path in self.entry_paths.values()) + cached
+
+
+class ExpandingFormulation(object):
+	"""
+	The sparse formulation of a demand from a start node at time 0 over a time-expanded graph that grows one time step
+	at a time. append_time only enumerates the arcs and waiting arcs into the new time step and adds the flow
+	conservation rows of its states, and the arcs, waiting arcs and rows of earlier time steps keep their positions.
+	Only the states reachable from (start, 0) are expanded, and the arcs that cannot reach a destination are left out
+	through their upper bounds, as in TCPModelTemplate.
+	"""
+
+	def __init__(self, nodes, indptr, indices, weights, window_edges, start, waiting=False):
+		"""
+		:param nodes: array of node labels, the start node being active at time 0 only
+		:param indptr: CSR row pointer array of length |V| + 1
+		:param indices: CSR column array (edge heads) of length |E|
+		:param weights: array of edge weights of length |E|
+		:param window_edges: array over edges of any per-edge label kept for the caller (e.g. an instance edge)
+		:param start: position of the start node
+		:param waiting: flag which when True lets flow wait at active nodes for free
+		"""
+		self.nodes, self.indptr, self.indices, self.weights = nodes, indptr, indices, weights
+		self.window_edges = window_edges
+		self.start = start
+		self.waiting = waiting
+		num_nodes = len(nodes)
+		self.tails = numpy.repeat(numpy.arange(num_nodes), numpy.diff(indptr))
+		self.heads = indices
+
+		start_only = numpy.zeros(num_nodes, dtype=bool)
+		start_only[start] = True
+		self.existence_columns = [start_only]
+		self.reachable = start_only
+		# Flow conservation row of every state of the latest time step (-1 for unreachable states), (start, 0) being row 0
+		self.state_rows = numpy.where(start_only, 0, -1)
+		self.num_rows = 1
+
+		empty = numpy.zeros(0, dtype=numpy.int64)
+		self.arc_edges, self.arc_times, self.arc_next_times = empty, empty, empty
+		self.arc_tail_rows, self.arc_head_rows = empty, empty
+		self.waiting_nodes, self.waiting_times = empty, empty
+		self.waiting_tail_rows, self.waiting_head_rows = empty, empty
+
+	@property
+	def num_times(self):
+		"""
+		Number of time steps so far, time 0 included.
+		"""
+		return len(self.existence_columns)
+
+	def sizes(self):
+		"""
+		:return: the number of arcs, waiting arcs and time steps, which identify the formulation at this point
+		"""
+		return len(self.arc_edges), len(self.waiting_nodes), self.num_times
+
+	def append_time(self, active):
+		"""
+		Appends the next time step: the arcs from the reachable states of the previous time step into it, its
+		same-time arcs and waiting arcs, and the rows of its reachable states.
+
+		:param active: boolean array over nodes of the activity at the new time step
+		"""
+		time = self.num_times
+		tails, heads = self.tails, self.heads
+		previous, previous_rows = self.reachable, self.state_rows
+		reachable = reachability_step(tails, heads, len(self.nodes), active, previous, waiting=self.waiting)
+		rows = numpy.full(len(self.nodes), -1, dtype=numpy.int64)
+		reachable_nodes = numpy.nonzero(reachable)[0]
+		rows[reachable_nodes] = self.num_rows + numpy.arange(len(reachable_nodes))
+
+		next_edges = numpy.nonzero(previous[tails] & reachable[heads])[0]
+		same_edges = numpy.nonzero(reachable[tails] & reachable[heads])[0]
+		new_edges = numpy.concatenate((next_edges, same_edges))
+		self.arc_edges = numpy.concatenate((self.arc_edges, new_edges))
+		self.arc_times = numpy.concatenate((self.arc_times, numpy.full(len(next_edges), time - 1, dtype=numpy.int64),
+											numpy.full(len(same_edges), time, dtype=numpy.int64)))
+		self.arc_next_times = numpy.concatenate((self.arc_next_times, numpy.full(len(new_edges), time,
+																				 dtype=numpy.int64)))
+		self.arc_tail_rows = numpy.concatenate((self.arc_tail_rows, previous_rows[tails[next_edges]],
+												rows[tails[same_edges]]))
+		self.arc_head_rows = numpy.concatenate((self.arc_head_rows, rows[heads[new_edges]]))
+
+		if self.waiting:
+			waiting_nodes = numpy.nonzero(previous & reachable)[0]
+			self.waiting_nodes = numpy.concatenate((self.waiting_nodes, waiting_nodes))
+			self.waiting_times = numpy.concatenate((self.waiting_times,
+													numpy.full(len(waiting_nodes), time - 1, dtype=numpy.int64)))
+			self.waiting_tail_rows = numpy.concatenate((self.waiting_tail_rows, previous_rows[waiting_nodes]))
+			self.waiting_head_rows = numpy.concatenate((self.waiting_head_rows, rows[waiting_nodes]))
+
+		self.existence_columns.append(active)
+		self.reachable, self.state_rows = reachable, rows
+		self.num_rows += len(reachable_nodes)
+
+	def instance(self):
+		"""
+		:return: the TemporalInstance of the time steps so far
+		"""
+		return TemporalInstance(self.nodes, self.indptr, self.indices, self.weights, numpy.array(self.existence_columns).T)
+
+	def formulation(self, destinations):
+		"""
+		Assembles the formulation of the demand from (start, 0) to the destinations at the latest time step from the
+		cached arcs and rows. The upper bound of an arc (and of an edge without such arcs) is 0 if its head state cannot
+		reach a destination.
+
+		:param destinations: a list of destination positions
+		:return: a Formulation, or None if a destination is not reachable at the latest time step
+		"""
+		destination_rows = self.state_rows[destinations]
+		if (destination_rows < 0).any():
+			return None
+		num_edges = len(self.tails)
+		num_arcs, num_waiting = len(self.arc_edges), len(self.waiting_nodes)
+		capacity = len(destinations)
+
+		positions = numpy.concatenate((numpy.arange(num_arcs), num_arcs + num_edges + numpy.arange(num_waiting)))
+		num_moves = num_arcs + num_waiting
+		rows = numpy.concatenate((self.arc_tail_rows, self.waiting_tail_rows, self.arc_head_rows,
+								  self.waiting_head_rows))
+		values = numpy.concatenate((numpy.ones(num_moves), -numpy.ones(num_moves)))
+		flow_matrix = sparse.coo_matrix((values, (rows, numpy.concatenate((positions, positions)))),
+										shape=(self.num_rows, num_arcs + num_edges + num_waiting)).tocsr()
+		flow_matrix.eliminate_zeros()
+		flow_rhs = numpy.zeros(self.num_rows)
+		flow_rhs[0] = capacity
+		numpy.add.at(flow_rhs, destination_rows, -1)
+		linking_matrix, linking_rhs = edge_linking_constraints(num_edges, self.arc_edges, capacity, num_waiting)
+
+		# The rows that reach a destination row, searched backwards from the destinations
+		useful_rows = reachable_states(rows[num_moves:], rows[:num_moves], self.num_rows, destination_rows.tolist())
+		useful_arcs = useful_rows[self.arc_head_rows]
+		usable_edges = numpy.zeros(num_edges, dtype=bool)
+		usable_edges[self.arc_edges[useful_arcs]] = True
+
+		objective = numpy.concatenate((numpy.zeros(num_arcs), self.weights, numpy.zeros(num_waiting)))
+		upper_bounds = numpy.concatenate((capacity * useful_arcs, usable_edges,
+										  capacity * useful_rows[self.waiting_head_rows])).astype(numpy.float64)
+		return Formulation(objective, linking_matrix, linking_rhs, flow_matrix, flow_rhs, upper_bounds, self.instance(),
+						   self.arc_edges, self.arc_times, self.arc_next_times, capacity, self.waiting_nodes,
+						   self.waiting_times)
+
+	def carried_start(self, formulation, values, sizes, destinations):
+		"""
+		Carries a solution of this formulation at an earlier time step forward to the latest one: its arcs and waiting
+		arcs keep their flow, and the unit of every destination is routed from its state at the earlier last time step
+		to its state at the latest time step along a temporal shortest path, edges already used costing nothing.
+
+		:param formulation: the Formulation returned by formulation(destinations) at the latest time step
+		:param values: a solution vector of the formulation returned by formulation(destinations) at sizes
+		:param sizes: the sizes() of the formulation values is a solution of
+		:param destinations: a list of destination positions
+		:return: a solution vector over the variables of formulation, or None if a destination cannot be carried forward
+		"""
+		num_arcs, num_waiting, num_times = sizes
+		num_edges = len(self.tails)
+		waiting_offset = len(self.arc_edges) + num_edges
+		start = numpy.zeros(len(formulation.objective))
+		start[:num_arcs] = numpy.round(values[:num_arcs])
+		start[waiting_offset:waiting_offset + num_waiting] = numpy.round(values[num_arcs + num_edges:
+																				 num_arcs + num_edges + num_waiting])
+
+		if num_times < self.num_times:
+			# The time steps from the earlier last one, whose arcs are shifted to start at time 0
+			shift = num_times - 1
+			arcs = numpy.nonzero(self.arc_times >= shift)[0]
+			waiting_arcs = numpy.nonzero(self.waiting_times >= shift)[0]
+			used = numpy.zeros(num_edges, dtype=bool)
+			used[self.arc_edges[start[:len(self.arc_edges)] > 0.5]] = True
+			existence = numpy.array(self.existence_columns[shift:]).T
+			for destination in destinations:
+				suffix = TemporalInstance(self.nodes, self.indptr, self.indices, numpy.where(used, 0.0, self.weights),
+										  existence)
+				flows = temporal_path_union(suffix, self.arc_edges[arcs], self.arc_times[arcs] - shift,
+											self.arc_next_times[arcs] - shift, destination, [destination],
+											self.waiting_nodes[waiting_arcs], self.waiting_times[waiting_arcs] - shift)
+				if flows is None:
+					return None
+				start[arcs] += flows[:len(arcs)]
+				start[waiting_offset + waiting_arcs] += flows[len(arcs):]
+				used[self.arc_edges[arcs[flows[:len(arcs)] > 0]]] = True
+
+		start[len(self.arc_edges):waiting_offset] = 0
+		start[len(self.arc_edges) + self.arc_edges[start[:len(self.arc_edges)] > 0.5]] = 1
+		return start
+
+	@property
+	def nbytes(self):
+		"""
+		Memory used by the cached arcs, rows and existence columns, in bytes.
+		"""
+		return sum(array.nbytes for array in (self.arc_edges, self.arc_times, self.arc_next_times, self.arc_tail_rows,
+											  self.arc_head_rows, self.waiting_nodes, self.waiting_times,
+											  self.waiting_tail_rows, self.waiting_head_rows, self.state_rows)) + \
+			sum(column.nbytes for column in self.existence_columns)
+
+
+def advance_labels(instance, costs, paths, active, next_active, waiting=False):
+	"""
+	Advances prefix labels by one time step: the labels are first spread along the edges between nodes active at the
+	current time step, then along the edges into nodes active at the next time step (and along waiting arcs). An edge
+	already on a label's path is reused at no cost.
+
+	:param instance: a TemporalInstance giving the topology and the weights
+	:param costs: array over nodes of the label costs at the current time step (inf for unreachable nodes)
+	:param paths: dictionary from node position to the frozenset of edge positions of its label's path
+	:param active: boolean array over nodes of the activity at the current time step
+	:param next_active: boolean array over nodes of the activity at the next time step
+	:param waiting: flag which when True lets paths wait at active nodes
+	:return: the costs and paths of the labels at the next time step
+	"""
+	costs, paths = spread_labels(instance, costs.copy(), dict(paths), active)
+
+	next_costs = numpy.full(instance.num_nodes, numpy.inf)
+	next_paths = {}
+	if waiting:
+		waiting_nodes = numpy.nonzero(numpy.isfinite(costs) & active & next_active)[0]
+		next_costs[waiting_nodes] = costs[waiting_nodes]
+		for node in waiting_nodes.tolist():
+			next_paths[node] = paths[node]
+
+	tails, heads, weights = instance.tails, instance.heads, instance.weights
+	for e in numpy.nonzero(numpy.isfinite(costs[tails]) & next_active[heads])[0].tolist():
+		u, v = int(tails[e]), int(heads[e])
+		cost = costs[u] + (0.0 if e in paths[u] else weights[e])
+		if cost < next_costs[v]:
+			next_costs[v] = cost
+			next_paths[v] = paths[u] | frozenset([e])
+	return next_costs, next_paths
+
+def spread_labels(instance, costs, paths, active):
+	"""
+	Spreads prefix labels along the edges between active nodes within one time step, cheapest label first.
+
+	:return: the updated costs and paths
+	"""
+	indptr, indices, weights = instance.indptr, instance.indices, instance.weights
+	heap = [(costs[node], node) for node in numpy.nonzero(numpy.isfinite(costs) & active)[0].tolist()]
+	heapq.heapify(heap)
+	while heap:
+		cost, u = heapq.heappop(heap)
+		if cost > costs[u]:
+			continue
+		for e in range(indptr[u], indptr[u + 1]):
+			v = int(indices[e])
+			if not active[v]:
+				continue
+			next_cost = cost + (0.0 if e in paths[u] else weights[e])
+			if next_cost < costs[v]:
+				costs[v] = next_cost
+				paths[v] = paths[u] | frozenset([e])
+				heapq.heappush(heap, (next_cost, v))
+	return costs, paths
+
+def snapshots_from_existence(graph, existence_for_node_time):
+	"""
+	Replays an existence dictionary as a stream of snapshots, for instance to feed a StreamingSolver.
+
+	:param graph: a directed graph
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:return: a generator of the sets of nodes active at times 0, 1, ..., max time
+	"""
+	max_time = max(t for _, t in existence_for_node_time)
+	for t in range(max_time + 1):
+		yield set(node for node in graph.nodes_iter() if existence_for_node_time.get((node, t), 0))
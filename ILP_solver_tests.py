@@ -1,5 +1,17 @@
 from ILP_solver.ILP_solver import solve_TCP_instance, solve_multi_destination_TCP_instance, generate_TCP_model, generate_mTCP_model, add_optimal_solution_constraint
-from graph_tools.graph_generator import generate_graph, generate_scale_free_graph
+from ILP_solver.presolve import presolve_TCP_instance
+from graph_tools.reduction import reduce_TCP_instance
+from ILP_solver.enumeration import enumerate_solutions
+from ILP_solver.heuristic import heuristic_TCP_instance
+from ILP_solver.solution_cache import SolutionCache, solve_cached_TCP_instance
+from ILP_solver.anytime import anytime_TCP_instance
+from ILP_solver.streaming import StreamingSolver, snapshots_from_existence
+from ILP_solver.bounds import lower_bound_TCP_instance
+from ILP_solver.decomposition import solve_decomposition_mTCP_instance
+from ILP_solver.cut_formulation import solve_cut_TCP_instance, solve_cut_mTCP_instance
+from graph_tools.temporal_instance import TemporalInstance
+from graph_tools.graph_generator import generate_graph, generate_scale_free_graph, remove_waiting_self_loops
+from graph_tools.hand_built_instances import edge_reuse_TCP_instance, edge_reuse_mTCP_instance, alternative_paths_TCP_instance
 import time as python_time
 from utils import execution_time
 import networkx
@@ -8,27 +20,7 @@ def test_TCP_instance():
 	"""
 	Tests the TCP ILP solver on an instance of necessary edge reuse.
 	"""
-	graph = networkx.DiGraph()
-
-	graph.add_edge(2, 2, weight=0.001)
-	graph.add_edge(1, 2, weight=3)
-	graph.add_edge(2, 6, weight=6)
-	graph.add_edge(1, 3, weight=5)
-	graph.add_edge(3, 4, weight=1)
-	graph.add_edge(4, 5, weight=1)
-	graph.add_edge(5, 3, weight=1)
-	graph.add_edge(4, 6, weight=1)
-
-	existence_for_node_time = {
-		(1, 0): 1, (1, 1): 0, (1, 2): 0, (1, 3): 0, (1, 4): 0, (1, 5): 0, (1, 6): 0,
-		(2, 0): 0, (2, 1): 1, (2, 2): 1, (2, 3): 1, (2, 4): 1, (2, 5): 1, (2, 6): 0,
-		(3, 0): 0, (3, 1): 1, (3, 2): 1, (3, 3): 0, (3, 4): 1, (3, 5): 0, (3, 6): 0,
-		(4, 0): 0, (4, 1): 0, (4, 2): 1, (4, 3): 0, (4, 4): 0, (4, 5): 1, (4, 6): 0,
-		(5, 0): 0, (5, 1): 0, (5, 2): 1, (5, 3): 1, (5, 4): 0, (5, 5): 0, (5, 6): 0,
-		(6, 0): 0, (6, 1): 0, (6, 2): 0, (6, 3): 0, (6, 4): 0, (6, 5): 0, (6, 6): 1,
-	}
-
-	connectivity_demand = (1, 6)
+	graph, existence_for_node_time, connectivity_demand = edge_reuse_TCP_instance()
 	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
 	subgraph = solve_TCP_instance(model, graph, edge_variables)
 
@@ -37,46 +29,12 @@ def test_mTCP_instance():
 	"""
 	Tests the mTCP ILP solver on an instance of necessary edge reuse.
 	"""
-	graph = networkx.DiGraph()
-
-	graph.add_edge(2, 2, weight=0.001)
-	graph.add_edge(1, 2, weight=3)
-	graph.add_edge(2, 6, weight=6)
-	graph.add_edge(1, 3, weight=5)
-	graph.add_edge(3, 4, weight=1)
-	graph.add_edge(4, 5, weight=1)
-	graph.add_edge(5, 3, weight=1)
-	graph.add_edge(4, 6, weight=1)
-
-	existence_for_node_time = {
-		(1, 0): 1, (1, 1): 0, (1, 2): 0, (1, 3): 0, (1, 4): 0, (1, 5): 0, (1, 6): 0,
-		(2, 0): 0, (2, 1): 1, (2, 2): 1, (2, 3): 1, (2, 4): 1, (2, 5): 1, (2, 6): 1,
-		(3, 0): 0, (3, 1): 1, (3, 2): 1, (3, 3): 0, (3, 4): 1, (3, 5): 0, (3, 6): 0,
-		(4, 0): 0, (4, 1): 0, (4, 2): 1, (4, 3): 0, (4, 4): 0, (4, 5): 1, (4, 6): 0,
-		(5, 0): 0, (5, 1): 0, (5, 2): 1, (5, 3): 1, (5, 4): 0, (5, 5): 0, (5, 6): 1,
-		(6, 0): 0, (6, 1): 0, (6, 2): 0, (6, 3): 0, (6, 4): 0, (6, 5): 0, (6, 6): 1,
-	}
-	model, edge_variables = generate_mTCP_model(graph, existence_for_node_time, 1, [2, 5])
+	graph, existence_for_node_time, source, destinations = edge_reuse_mTCP_instance()
+	model, edge_variables = generate_mTCP_model(graph, existence_for_node_time, source, destinations)
 	subgraph = solve_multi_destination_TCP_instance(model, graph, edge_variables)
 
 def test_add_constr_instance():
-	graph = networkx.DiGraph()
-	graph.add_edge(1, 2, weight=1)
-	graph.add_edge(1, 3, weight=1)
-	graph.add_edge(1, 4, weight=1)
-	graph.add_edge(2, 5, weight=1)
-	graph.add_edge(3, 5, weight=1)
-	graph.add_edge(4, 5, weight=1)
-
-	existence_for_node_time = {
-		(1, 0): 1, (1, 1): 0, (1, 2): 0,
-		(2, 0): 0, (2, 1): 1, (2, 2): 0,
-		(3, 0): 0, (3, 1): 1, (3, 2): 0,
-		(4, 0): 0, (4, 1): 1, (4, 2): 0,
-		(5, 0): 0, (5, 1): 0, (5, 2): 1,
-	}
-
-	connectivity_demand = (1, 5)
+	graph, existence_for_node_time, connectivity_demand = alternative_paths_TCP_instance()
 	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
 
 	NUM_ITERATIONS = 3
@@ -94,12 +52,192 @@ def test_add_constr_instance():
 				vertex_usage_count[vertex] = 1
 	return vertex_usage_count[2] == vertex_usage_count[3] == vertex_usage_count[4]
 
+def test_enumerate_add_constr_instance():
+	"""
+	Tests that enumerate_solutions finds the same alternative optimal subgraphs as test_add_constr_instance.
+	"""
+	graph, existence_for_node_time, connectivity_demand = alternative_paths_TCP_instance()
+	instance = TemporalInstance.from_networkx(graph, existence_for_node_time)
+	solutions, vertex_usage_count, edge_usage_count = enumerate_solutions(instance, connectivity_demand[0], [connectivity_demand[1]], k=3)
+	return len(solutions) == 3 and vertex_usage_count[2] == vertex_usage_count[3] == vertex_usage_count[4] == 1
+
 def test_generated_TCP():
 	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=1)
 	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
 	subgraph = solve_TCP_instance(model, graph, edge_variables)
 	return subgraph
 
+def test_presolved_generated_TCP():
+	"""
+	Tests that the temporal reachability presolve does not change the optimal cost of a generated instance.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	reduced_graph, reduced_existence, presolve_stats = presolve_TCP_instance(graph, existence_for_node_time, connectivity_demand)
+	model, edge_variables = generate_TCP_model(reduced_graph, reduced_existence, connectivity_demand)
+	reduced_subgraph = solve_TCP_instance(model, reduced_graph, edge_variables, detailed_output=False)
+
+	if subgraph is None or reduced_subgraph is None:
+		return subgraph is None and reduced_subgraph is None
+	return abs(subgraph.size(weight='weight') - reduced_subgraph.size(weight='weight')) < 1e-6
+
+def test_reduced_generated_TCP():
+	"""
+	Tests that the structural reduction does not change the optimal cost of a generated instance, and that the
+	subgraph is expanded back to edges of the original graph.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.02, max_time=3, active_time_percent=.3)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	reduced_graph, reduced_existence, edge_mapping, reduction_stats = reduce_TCP_instance(graph, existence_for_node_time, connectivity_demand)
+	model, edge_variables = generate_TCP_model(reduced_graph, reduced_existence, connectivity_demand)
+	reduced_subgraph = solve_TCP_instance(model, reduced_graph, edge_variables, detailed_output=False, edge_mapping=edge_mapping)
+
+	if subgraph is None or reduced_subgraph is None:
+		return subgraph is None and reduced_subgraph is None
+	return abs(subgraph.size(weight='weight') - reduced_subgraph.size(weight='weight')) < 1e-6 and all(graph.has_edge(u, v) for u, v in reduced_subgraph.edges_iter())
+
+def test_heuristic_generated_TCP():
+	"""
+	Tests that the heuristic subgraph of a generated instance is never cheaper than the optimal subgraph.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+	heuristic_subgraph, heuristic_cost = heuristic_TCP_instance(graph, existence_for_node_time, connectivity_demand, detailed_output=False)
+
+	if subgraph is None or heuristic_subgraph is None:
+		return subgraph is None and heuristic_subgraph is None
+	return heuristic_cost >= subgraph.size(weight='weight') - 1e-6
+
+def test_cached_generated_TCP(cache_directory='tcp_solution_cache'):
+	"""
+	Tests that a repeated query is answered from the solution cache with the same optimal cost.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	cache = SolutionCache(cache_directory)
+	subgraph, stats = solve_cached_TCP_instance(cache, graph, existence_for_node_time, connectivity_demand, detailed_output=False, return_stats=True)
+	cached_subgraph, cached_stats = solve_cached_TCP_instance(cache, graph, existence_for_node_time, connectivity_demand, detailed_output=False, return_stats=True)
+
+	if cached_stats['cache'] != 'hit':
+		return False
+	if subgraph is None or cached_subgraph is None:
+		return subgraph is None and cached_subgraph is None
+	return abs(subgraph.size(weight='weight') - cached_subgraph.size(weight='weight')) < 1e-6
+
+def test_anytime_generated_TCP(time_budget=10):
+	"""
+	Tests that the anytime solver streams incumbents of non-increasing cost, no cheaper than the optimum and no cheaper
+	than their bounds.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	incumbents = list(anytime_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_budget))
+	if subgraph is None or not incumbents:
+		return subgraph is None and not incumbents
+	objectives = [incumbent.objective for incumbent in incumbents]
+	if any(later > earlier + 1e-6 for earlier, later in zip(objectives, objectives[1:])):
+		return False
+	if any(incumbent.bound is not None and incumbent.bound > incumbent.objective + 1e-6 for incumbent in incumbents):
+		return False
+	return objectives[-1] >= subgraph.size(weight='weight') - 1e-6
+
+def test_streaming_generated_TCP(window_length=2):
+	"""
+	Tests that the streaming solver, fed one snapshot at a time, finds the optimal cost of the whole instance without a
+	window, and a subgraph at least as expensive with a sliding window.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	source, destination = connectivity_demand
+	solver = StreamingSolver(graph, source, [destination])
+	windowed_solver = StreamingSolver(graph, source, [destination], window_length=window_length)
+	for active_nodes in snapshots_from_existence(graph, existence_for_node_time):
+		solver.add_snapshot(active_nodes)
+		windowed_solver.add_snapshot(active_nodes)
+	streamed_subgraph, cost = solver.solve()
+	windowed_subgraph, windowed_cost = windowed_solver.solve()
+
+	if subgraph is None or streamed_subgraph is None:
+		return subgraph is None and streamed_subgraph is None and windowed_subgraph is None
+	return abs(subgraph.size(weight='weight') - cost) < 1e-6 and windowed_cost >= cost - 1e-6
+
+def test_lower_bound_generated_TCP():
+	"""
+	Tests that the bound-only mode decides feasibility like the ILP, and that its bounds surround the optimal cost.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	for method in ['lp', 'lagrangian']:
+		result = lower_bound_TCP_instance(graph, existence_for_node_time, connectivity_demand, method=method)
+		if result.feasible != (subgraph is not None):
+			return False
+		if subgraph is not None:
+			cost = subgraph.size(weight='weight')
+			if not result.lower_bound - 1e-6 <= cost <= result.upper_bound + 1e-6:
+				return False
+	return True
+
+def test_decomposition_mTCP_instance():
+	"""
+	Tests that the decomposition mode finds the optimal subgraph of the mTCP instance of necessary edge reuse, whose
+	optimal subgraph only uses edges of the destinations' cheapest paths.
+	"""
+	graph, existence_for_node_time, source, destinations = edge_reuse_mTCP_instance()
+	model, edge_variables = generate_mTCP_model(graph, existence_for_node_time, source, destinations)
+	subgraph = solve_multi_destination_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	result = solve_decomposition_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=False, processes=1)
+	return abs(subgraph.size(weight='weight') - result.objective) < 1e-6 and abs(result.subgraph.size(weight='weight') - result.objective) < 1e-6
+
+def test_cut_formulation_generated_TCP():
+	"""
+	Tests that the connectivity cut formulation finds the optimal cost of the flow formulation, on a generated instance
+	and on the mTCP instance of necessary edge reuse.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+	cut_subgraph = solve_cut_TCP_instance(graph, existence_for_node_time, connectivity_demand, detailed_output=False)
+	if subgraph is None or cut_subgraph is None:
+		if not (subgraph is None and cut_subgraph is None):
+			return False
+	elif abs(subgraph.size(weight='weight') - cut_subgraph.size(weight='weight')) > 1e-6:
+		return False
+
+	graph, existence_for_node_time, source, destinations = edge_reuse_mTCP_instance()
+	model, edge_variables = generate_mTCP_model(graph, existence_for_node_time, source, destinations)
+	subgraph = solve_multi_destination_TCP_instance(model, graph, edge_variables, detailed_output=False)
+	cut_subgraph = solve_cut_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=False)
+	return abs(subgraph.size(weight='weight') - cut_subgraph.size(weight='weight')) < 1e-6
+
+def test_waiting_generated_TCP():
+	"""
+	Tests that waiting arcs give the same optimal cost as the self-loops of a generated instance, without the 0.001
+	paid for every self-loop.
+	"""
+	graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=100, edge_connectivity=.1, max_time=3, active_time_percent=.5)
+	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
+	subgraph = solve_TCP_instance(model, graph, edge_variables, detailed_output=False)
+
+	waiting_graph = remove_waiting_self_loops(graph)
+	model, edge_variables = generate_TCP_model(waiting_graph, existence_for_node_time, connectivity_demand, waiting=True)
+	waiting_subgraph = solve_TCP_instance(model, waiting_graph, edge_variables, detailed_output=False)
+
+	if subgraph is None or waiting_subgraph is None:
+		return subgraph is None and waiting_subgraph is None
+	self_loop_cost = sum(subgraph[v][v]['weight'] for v in subgraph.nodes_iter() if subgraph.has_edge(v, v))
+	return abs(subgraph.size(weight='weight') - self_loop_cost - waiting_subgraph.size(weight='weight')) < 1e-6
+
 def test_generated_sfTCP():
 	graph, existence_for_node_time, connectivity_demand = generate_scale_free_graph(num_nodes=1000, max_time=3, active_time_percent=1)
 	model, edge_variables = generate_TCP_model(graph, existence_for_node_time, connectivity_demand)
@@ -130,5 +268,16 @@ def test_generated_sfTCP():
 #test_TCP_instance()
 #test_mTCP_instance()
 #test_generated_TCP()
+#print(test_presolved_generated_TCP())
+#print(test_reduced_generated_TCP())
+#print(test_enumerate_add_constr_instance())
+#print(test_heuristic_generated_TCP())
+#print(test_waiting_generated_TCP())
+#print(test_cached_generated_TCP())
+#print(test_anytime_generated_TCP())
+#print(test_streaming_generated_TCP())
+#print(test_lower_bound_generated_TCP())
+#print(test_decomposition_mTCP_instance())
+#print(test_cut_formulation_generated_TCP())
 #graph, subgraph = test_generated_sfTCP()
-print test_add_constr_instance()
+print(test_add_constr_instance())
@@ -0,0 +1,142 @@
+"""
+This file runs parameter sweeps of the TCP solver in parallel and writes the measurements to CSV and JSON files,
+which varying_parameters_vs_time.py plots afterwards.
+
+Every point of a sweep varies one parameter of generate_graph_fast away from BASE_PARAMETERS and is run once per seed.
+Each run is a separate worker process, so that the peak memory it reports is its own.
+
+Example:
+	python benchmark_runner.py --parameters num_nodes active_time_percent --seeds 5 --processes 16 --output results
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import resource
+import time as python_time
+from graph_tools.graph_generator import generate_graph_fast
+from ILP_solver.formulation import build_instance_formulation
+from ILP_solver.backends import solve_formulation
+
+BASE_PARAMETERS = {
+	'num_nodes': 100,
+	'edge_connectivity': 0.1,
+	'active_time_percent': 1.0,
+	'max_time': 3,
+}
+
+SWEEPS = {
+	'num_nodes': [25 * i for i in range(1, 9)],
+	'edge_connectivity': [0.05 * i for i in range(1, 21)],
+	'active_time_percent': [0.05 * i for i in range(1, 21)],
+	'max_time': list(range(1, 11)),
+}
+
+RESULT_FIELDS = ['parameter', 'value', 'seed', 'num_nodes', 'edge_connectivity', 'active_time_percent', 'max_time',
+				 'backend', 'num_variables', 'num_constraints', 'num_nonzeros', 'build_time', 'solve_time', 'status',
+				 'objective', 'peak_memory_mb']
+
+
+def benchmark_tasks(parameters, seeds, backend, threads):
+	"""
+	Lists one task per (parameter, value, seed).
+
+	:param parameters: names of the parameters in SWEEPS to vary
+	:param seeds: number of seeds per point
+	:param backend: name of the solver backend
+	:param threads: number of solver threads per run
+	:return: a list of task dictionaries
+	"""
+	tasks = []
+	for parameter in parameters:
+		for value in SWEEPS[parameter]:
+			for seed in range(seeds):
+				instance_parameters = dict(BASE_PARAMETERS)
+				instance_parameters[parameter] = value
+				tasks.append({'parameter': parameter, 'value': value, 'seed': seed, 'backend': backend,
+							  'threads': threads, 'instance_parameters': instance_parameters})
+	return tasks
+
+def run_benchmark(task):
+	"""
+	Generates one instance, then builds and solves its model, timing both phases separately.
+
+	:param task: a task dictionary from benchmark_tasks
+	:return: a result dictionary with the RESULT_FIELDS
+	"""
+	instance, (source, destination) = generate_graph_fast(seed=task['seed'], as_arrays=True, **task['instance_parameters'])
+
+	start_time = python_time.time()
+	formulation = build_instance_formulation(instance, source, [destination])
+	build_time = python_time.time() - start_time
+
+	start_time = python_time.time()
+	result = solve_formulation(formulation, task['backend'], threads=task['threads'], output=False)
+	solve_time = python_time.time() - start_time
+
+	num_constraints = formulation.inequality_matrix.shape[0] + formulation.equality_matrix.shape[0]
+	num_nonzeros = formulation.inequality_matrix.nnz + formulation.equality_matrix.nnz
+
+	row = {
+		'parameter': task['parameter'],
+		'value': task['value'],
+		'seed': task['seed'],
+		'backend': task['backend'],
+		'num_variables': len(formulation.objective),
+		'num_constraints': num_constraints,
+		'num_nonzeros': num_nonzeros,
+		'build_time': build_time,
+		'solve_time': solve_time,
+		'status': result.status,
+		'objective': result.objective,
+		# ru_maxrss is in kilobytes on Linux
+		'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+	}
+	row.update(task['instance_parameters'])
+	return row
+
+def run_sweeps(parameters, seeds=3, processes=None, backend='highs', threads=1, output='benchmark_results'):
+	"""
+	Runs all sweeps over a process pool and writes output.csv and output.json.
+
+	:param parameters: names of the parameters in SWEEPS to vary
+	:param seeds: number of seeds per point
+	:param processes: number of worker processes (number of cores if None)
+	:param backend: name of the solver backend
+	:param threads: number of solver threads per run
+	:param output: path prefix of the result files
+	:return: the list of result dictionaries
+	"""
+	tasks = benchmark_tasks(parameters, seeds, backend, threads)
+	pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+	results = []
+	try:
+		for row in pool.imap_unordered(run_benchmark, tasks):
+			results.append(row)
+			print('%s/%s  %s=%s seed=%s  build %.3fs  solve %.3fs  %s' % (len(results), len(tasks), row['parameter'],
+																		  row['value'], row['seed'], row['build_time'],
+																		  row['solve_time'], row['status']))
+	finally:
+		pool.close()
+		pool.join()
+
+	results.sort(key=lambda row: (row['parameter'], row['value'], row['seed']))
+	with open(output + '.csv', 'w') as csv_file:
+		writer = csv.DictWriter(csv_file, fieldnames=RESULT_FIELDS)
+		writer.writeheader()
+		writer.writerows(results)
+	with open(output + '.json', 'w') as json_file:
+		json.dump(results, json_file, indent=1)
+	return results
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Run parallel parameter sweeps of the TCP solver.')
+	parser.add_argument('--parameters', nargs='+', default=sorted(SWEEPS), choices=sorted(SWEEPS))
+	parser.add_argument('--seeds', type=int, default=3, help='number of seeds per point')
+	parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: all cores)')
+	parser.add_argument('--backend', default='highs', choices=['gurobi', 'highs'])
+	parser.add_argument('--threads', type=int, default=1, help='number of solver threads per run')
+	parser.add_argument('--output', default='benchmark_results', help='path prefix of the .csv and .json results')
+	arguments = parser.parse_args()
+	run_sweeps(arguments.parameters, arguments.seeds, arguments.processes, arguments.backend, arguments.threads,
+			   arguments.output)
@@ -3,7 +3,14 @@ This file generates a random graph w/ a source destination pair
 """
 
 import networkx
+import numpy
 import random
+from scipy import sparse
+from scipy.sparse.csgraph import breadth_first_order
+from graph_tools.temporal_instance import TemporalInstance
+
+# Number of node pairs sampled at once by generate_graph_fast, bounding its memory use
+PAIRS_PER_CHUNK = 2 ** 22
 
 def generate_graph(num_nodes=100, edge_connectivity=1.0, active_time_percent=1.0, max_time=3, weight_distribution=(1.0,1.0)):
 	"""
@@ -45,8 +52,9 @@ def generate_graph(num_nodes=100, edge_connectivity=1.0, active_time_percent=1.0
 
 	return graph, existence_for_node_time, (source, destination)
 
-def generate_scale_free_graph(num_nodes=100, active_time_percent=1.0, max_time=3, weight_distribution=(1.0,1.0)):
-	graph = networkx.scale_free_graph(num_nodes)
+def generate_scale_free_graph(num_nodes=100, active_time_percent=1.0, max_time=3, weight_distribution=(1.0,1.0), seed=None):
+	# seed goes to networkx, which otherwise draws the topology from a fresh unseeded generator
+	graph = networkx.scale_free_graph(num_nodes, seed=seed)
 	graph = networkx.DiGraph(graph)
 
 	for edge in graph.edges():
@@ -57,7 +65,6 @@ def generate_scale_free_graph(num_nodes=100, active_time_percent=1.0, max_time=3
 
 	source, destination = random.sample(graph.nodes(), 2)
 	while not networkx.has_path(graph, source, destination):
-		print source, destination
 		source, destination = random.sample(graph.nodes(), 2)
 	existence_for_node_time = {(source,0):1, (destination,max_time):1}
 	for i in range(1, max_time+1):
@@ -72,9 +79,179 @@ def generate_scale_free_graph(num_nodes=100, active_time_percent=1.0, max_time=3
 				is_active = int(random.random() < active_time_percent)
 				existence_for_node_time[(node, i)] = is_active
 
-	print len(graph.edges())
 	return graph, existence_for_node_time, (source, destination)
 
+def generate_graph_fast(num_nodes=100, edge_connectivity=1.0, active_time_percent=1.0, max_time=3, weight_distribution=(1.0,1.0), seed=None, as_arrays=False):
+	"""
+	Vectorized version of generate_graph: edges, weights and existence are sampled in bulk from a seeded
+	numpy.random.Generator, with the same source/destination and self-loop conventions.
+
+	:param num_nodes: number of nodes in graph
+	:param edge_connectivity: the probability there exists an edge between two vertices edge_connectivity*100%
+	:param active_time_percent: the probability a vertex v is active at timepoint t active_time_percent*100%
+	:param weight_distribution: range for random weighst
+	:param seed: seed of the random generator (or a numpy.random.Generator)
+	:param as_arrays: flag which when True returns a TemporalInstance instead of networkx/dictionary
+	:return: graph, existence_for_node_time (dictionary: V x T -> 1/0), connectivity_demand (source, destination)
+			 or, if as_arrays, a TemporalInstance and connectivity_demand
+	"""
+	rng = numpy.random.default_rng(seed)
+	nodes = numpy.array(generate_nodes(num_nodes))
+	source_index, destination_index = rng.choice(num_nodes, 2, replace=False)
+
+	# Sample the edges row by row in chunks, so that memory stays bounded for large graphs
+	rows_per_chunk = max(1, PAIRS_PER_CHUNK // num_nodes)
+	tails, heads = [], []
+	for begin in range(0, num_nodes, rows_per_chunk):
+		end = min(num_nodes, begin + rows_per_chunk)
+		chunk = rng.random((end - begin, num_nodes)) < edge_connectivity
+		chunk[numpy.arange(end - begin), numpy.arange(begin, end)] = False
+		chunk[:, source_index] = False
+		if begin <= destination_index < end:
+			chunk[destination_index - begin, :] = False
+		chunk_tails, chunk_heads = numpy.nonzero(chunk)
+		tails.append(chunk_tails + begin)
+		heads.append(chunk_heads)
+	tails = numpy.concatenate(tails)
+	heads = numpy.concatenate(heads)
+	weights = rng.uniform(weight_distribution[0], weight_distribution[1], len(tails))
+
+	# Every node but the source and destination can wait through a self-loop
+	self_loops = numpy.setdiff1d(numpy.arange(num_nodes), [source_index, destination_index])
+	tails = numpy.concatenate((tails, self_loops))
+	heads = numpy.concatenate((heads, self_loops))
+	weights = numpy.concatenate((weights, numpy.full(len(self_loops), 0.001)))
+
+	existence = generate_existence_matrix(rng, num_nodes, max_time, active_time_percent, source_index, destination_index)
+	connectivity_demand = (nodes[source_index].item(), nodes[destination_index].item())
+
+	instance = TemporalInstance.from_arrays(nodes, tails, heads, weights, existence)
+	if as_arrays:
+		return instance, connectivity_demand
+	graph, existence_for_node_time = instance.to_networkx()
+	return graph, existence_for_node_time, connectivity_demand
+
+def generate_scale_free_graph_fast(num_nodes=100, active_time_percent=1.0, max_time=3, weight_distribution=(1.0,1.0), seed=None, as_arrays=False):
+	"""
+	Vectorized version of generate_scale_free_graph: the topology is sampled in linear time (see scale_free_edges),
+	weights and existence are sampled in bulk from a seeded numpy.random.Generator, and the source/destination pair
+	is drawn uniformly among the pairs joined by a path.
+
+	:param num_nodes: number of nodes in graph
+	:param active_time_percent: the probability a vertex v is active at timepoint t active_time_percent*100%
+	:param weight_distribution: range for random weighst
+	:param seed: seed of the random generator (or a numpy.random.Generator)
+	:param as_arrays: flag which when True returns a TemporalInstance instead of networkx/dictionary
+	:return: graph, existence_for_node_time (dictionary: V x T -> 1/0), connectivity_demand (source, destination)
+			 or, if as_arrays, a TemporalInstance and connectivity_demand
+	"""
+	rng = numpy.random.default_rng(seed)
+	nodes = numpy.arange(num_nodes)
+	tails, heads = scale_free_edges(rng, num_nodes)
+
+	weights = rng.uniform(weight_distribution[0], weight_distribution[1], len(tails))
+	weights[tails == heads] = 0.001
+
+	# Drawing a source with probability proportional to its number of descendants, then a destination among them,
+	# is the same as retrying uniform pairs until has_path holds, with every retry being one compiled search
+	adjacency = sparse.csr_matrix((numpy.ones(len(tails)), (tails, heads)), shape=(num_nodes, num_nodes))
+	while True:
+		source_index = rng.integers(num_nodes)
+		descendants = breadth_first_order(adjacency, source_index, directed=True, return_predecessors=False)[1:]
+		if rng.random() < len(descendants) / float(num_nodes - 1):
+			destination_index = rng.choice(descendants)
+			break
+
+	existence = generate_existence_matrix(rng, num_nodes, max_time, active_time_percent, source_index, destination_index)
+	connectivity_demand = (nodes[source_index].item(), nodes[destination_index].item())
+
+	instance = TemporalInstance.from_arrays(nodes, tails, heads, weights, existence)
+	if as_arrays:
+		return instance, connectivity_demand
+	graph, existence_for_node_time = instance.to_networkx()
+	return graph, existence_for_node_time, connectivity_demand
+
+def remove_waiting_self_loops(graph):
+	"""
+	Removes the self-loops of weight 0.001 that the generators add so that paths can wait at a node. Solve the result
+	with waiting=True (see ILP_solver/formulation.py), where waiting is an implicit free arc (v, t) -> (v, t+1): the
+	optimal subgraphs are the same, without the 0.001 per waiting node in their cost.
+
+	:param graph: a directed graph with attribute 'weight' on all edges, or a TemporalInstance
+	:return: a copy of the graph (or TemporalInstance) without self-loops
+	"""
+	if isinstance(graph, TemporalInstance):
+		return graph.subinstance(graph.tails != graph.heads)
+	graph = graph.copy()
+	graph.remove_edges_from(graph.selfloop_edges())
+	return graph
+
+def scale_free_edges(rng, num_nodes, alpha=0.41, beta=0.54, gamma=0.05, delta_in=0.2, delta_out=0.0, steps_per_block=4096):
+	"""
+	Samples the edges of a directed scale-free graph with the same model as networkx.scale_free_graph
+	(Bollobas et al.), in time linear in the number of edges, then drops parallel edges like networkx.DiGraph.
+
+	A node is chosen with probability proportional to its degree + delta by picking the endpoint of a uniformly
+	random edge with probability |E| / (|E| + delta * |V|), and a uniformly random node otherwise.
+
+	:param rng: a numpy.random.Generator
+	:param num_nodes: number of nodes in graph
+	:return: tails, heads (arrays of node positions)
+	"""
+	max_edges = 3 + int(4 * num_nodes / (alpha + gamma)) + steps_per_block
+	tails = numpy.empty(max_edges, dtype=numpy.int64)
+	heads = numpy.empty(max_edges, dtype=numpy.int64)
+	tails[:3], heads[:3] = [0, 1, 2], [1, 2, 0]
+	num_edges, current_nodes = 3, 3
+
+	while current_nodes < num_nodes:
+		if num_edges + steps_per_block > max_edges:
+			tails = numpy.concatenate((tails, numpy.empty(max_edges, dtype=numpy.int64)))
+			heads = numpy.concatenate((heads, numpy.empty(max_edges, dtype=numpy.int64)))
+			max_edges *= 2
+		draws = rng.random((steps_per_block, 5))
+		for step_kind, tail_draw, tail_pick, head_draw, head_pick in draws:
+			if current_nodes >= num_nodes:
+				break
+			if step_kind < alpha + beta:
+				# Head chosen by in-degree + delta_in
+				if head_draw * (num_edges + delta_in * current_nodes) < num_edges:
+					head = heads[int(head_pick * num_edges)]
+				else:
+					head = int(head_pick * current_nodes)
+			if step_kind >= alpha:
+				# Tail chosen by out-degree + delta_out
+				if tail_draw * (num_edges + delta_out * current_nodes) < num_edges:
+					tail = tails[int(tail_pick * num_edges)]
+				else:
+					tail = int(tail_pick * current_nodes)
+			if step_kind < alpha:
+				tail = current_nodes
+				current_nodes += 1
+			elif step_kind >= alpha + beta:
+				head = current_nodes
+				current_nodes += 1
+			tails[num_edges], heads[num_edges] = tail, head
+			num_edges += 1
+
+	unique_edges = numpy.unique(tails[:num_edges] * num_nodes + heads[:num_edges])
+	return unique_edges // num_nodes, unique_edges % num_nodes
+
+def generate_existence_matrix(rng, num_nodes, max_time, active_time_percent, source_index, destination_index):
+	"""
+	Samples the existence of every node at every time in bulk. The source only exists at time 0 and the
+	destination only at max_time.
+
+	:param rng: a numpy.random.Generator
+	:return: a boolean array of shape num_nodes x (max_time + 1)
+	"""
+	existence = rng.random((num_nodes, max_time + 1)) < active_time_percent
+	existence[source_index, :] = False
+	existence[source_index, 0] = True
+	existence[destination_index, :] = False
+	existence[destination_index, max_time] = True
+	return existence
+
 def generate_nodes(num_nodes=100):
 	"""
 	Returns a list from {1,...,num_nodes}
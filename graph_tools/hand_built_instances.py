@@ -0,0 +1,77 @@
+"""
+This file builds the small hand-built instances used by ILP_solver_tests.py and regression_benchmark.py.
+"""
+import networkx
+
+
+def edge_reuse_graph():
+	"""
+	:return: the graph of the edge reuse instances, in which the cheapest path to 6 goes around the cycle 3 -> 4 -> 5
+			 -> 3 and uses 3 -> 4 twice
+	"""
+	graph = networkx.DiGraph()
+
+	graph.add_edge(2, 2, weight=0.001)
+	graph.add_edge(1, 2, weight=3)
+	graph.add_edge(2, 6, weight=6)
+	graph.add_edge(1, 3, weight=5)
+	graph.add_edge(3, 4, weight=1)
+	graph.add_edge(4, 5, weight=1)
+	graph.add_edge(5, 3, weight=1)
+	graph.add_edge(4, 6, weight=1)
+	return graph
+
+def edge_reuse_TCP_instance():
+	"""
+	A TCP instance of necessary edge reuse.
+
+	:return: graph, existence_for_node_time (dictionary: V x T -> 1/0), connectivity_demand (source, destination)
+	"""
+	existence_for_node_time = {
+		(1, 0): 1, (1, 1): 0, (1, 2): 0, (1, 3): 0, (1, 4): 0, (1, 5): 0, (1, 6): 0,
+		(2, 0): 0, (2, 1): 1, (2, 2): 1, (2, 3): 1, (2, 4): 1, (2, 5): 1, (2, 6): 0,
+		(3, 0): 0, (3, 1): 1, (3, 2): 1, (3, 3): 0, (3, 4): 1, (3, 5): 0, (3, 6): 0,
+		(4, 0): 0, (4, 1): 0, (4, 2): 1, (4, 3): 0, (4, 4): 0, (4, 5): 1, (4, 6): 0,
+		(5, 0): 0, (5, 1): 0, (5, 2): 1, (5, 3): 1, (5, 4): 0, (5, 5): 0, (5, 6): 0,
+		(6, 0): 0, (6, 1): 0, (6, 2): 0, (6, 3): 0, (6, 4): 0, (6, 5): 0, (6, 6): 1,
+	}
+	return edge_reuse_graph(), existence_for_node_time, (1, 6)
+
+def edge_reuse_mTCP_instance():
+	"""
+	An mTCP instance of necessary edge reuse.
+
+	:return: graph, existence_for_node_time (dictionary: V x T -> 1/0), source, destinations
+	"""
+	existence_for_node_time = {
+		(1, 0): 1, (1, 1): 0, (1, 2): 0, (1, 3): 0, (1, 4): 0, (1, 5): 0, (1, 6): 0,
+		(2, 0): 0, (2, 1): 1, (2, 2): 1, (2, 3): 1, (2, 4): 1, (2, 5): 1, (2, 6): 1,
+		(3, 0): 0, (3, 1): 1, (3, 2): 1, (3, 3): 0, (3, 4): 1, (3, 5): 0, (3, 6): 0,
+		(4, 0): 0, (4, 1): 0, (4, 2): 1, (4, 3): 0, (4, 4): 0, (4, 5): 1, (4, 6): 0,
+		(5, 0): 0, (5, 1): 0, (5, 2): 1, (5, 3): 1, (5, 4): 0, (5, 5): 0, (5, 6): 1,
+		(6, 0): 0, (6, 1): 0, (6, 2): 0, (6, 3): 0, (6, 4): 0, (6, 5): 0, (6, 6): 1,
+	}
+	return edge_reuse_graph(), existence_for_node_time, 1, [2, 5]
+
+def alternative_paths_TCP_instance():
+	"""
+	A TCP instance with three optimal subgraphs, the paths 1 -> v -> 5 for v in {2, 3, 4}.
+
+	:return: graph, existence_for_node_time (dictionary: V x T -> 1/0), connectivity_demand (source, destination)
+	"""
+	graph = networkx.DiGraph()
+	graph.add_edge(1, 2, weight=1)
+	graph.add_edge(1, 3, weight=1)
+	graph.add_edge(1, 4, weight=1)
+	graph.add_edge(2, 5, weight=1)
+	graph.add_edge(3, 5, weight=1)
+	graph.add_edge(4, 5, weight=1)
+
+	existence_for_node_time = {
+		(1, 0): 1, (1, 1): 0, (1, 2): 0,
+		(2, 0): 0, (2, 1): 1, (2, 2): 0,
+		(3, 0): 0, (3, 1): 1, (3, 2): 0,
+		(4, 0): 0, (4, 1): 1, (4, 2): 0,
+		(5, 0): 0, (5, 1): 0, (5, 2): 1,
+	}
+	return graph, existence_for_node_time, (1, 5)
@@ -0,0 +1,185 @@
+"""
+This file saves and loads TCP/mTCP instances and their solutions.
+
+An instance is saved either as a directory of raw .npy arrays (loaded with memory-mapping, so that many processes
+share one copy of a large instance through the page cache) or as a single .npz file (loaded into memory):
+
+	manifest.json   format name and version, |T|, existence packing, demands, seed (and the node labels, if they are
+	                not numbers)
+	nodes.npy       node labels
+	indptr.npy      CSR row pointers of the out-adjacency
+	indices.npy     CSR edge heads
+	weights.npy     edge weights
+	existence.npy   existence matrix |V| x |T| (bit-packed along time if packed)
+
+A solution is saved as a single .npz file with the chosen edges and weights, and a manifest holding the objective
+and the solver statistics.
+"""
+import json
+import os
+import shutil
+import networkx
+import numpy
+from graph_tools.temporal_instance import TemporalInstance
+
+INSTANCE_FORMAT = 'temporal_instance'
+SOLUTION_FORMAT = 'temporal_solution'
+FORMAT_VERSION = 1
+
+
+def save_instance(path, instance, demands=(), seed=None):
+	"""
+	Saves an instance. The file is written under a temporary name and renamed, so readers never see a partial file.
+
+	:param path: a .npz file path, or a directory path for the memory-mappable raw-array format
+	:param instance: a TemporalInstance
+	:param demands: a list of demands (source, destinations), where destinations is a list of nodes
+	:param seed: the seed the instance was generated with, if any
+	"""
+	manifest = {
+		'format': INSTANCE_FORMAT,
+		'version': FORMAT_VERSION,
+		'num_times': instance.num_times,
+		'packed': instance.packed,
+		'demands': [[to_json_label(source), [to_json_label(destination) for destination in destinations]]
+					for source, destinations in demands],
+		'seed': seed,
+	}
+	arrays = {
+		'nodes': instance.nodes,
+		'indptr': instance.indptr,
+		'indices': instance.indices,
+		'weights': instance.weights,
+		'existence': instance.existence,
+	}
+	if instance.nodes.dtype == object:
+		manifest['node_labels'] = [to_json_label(node) for node in instance.nodes.tolist()]
+		arrays['nodes'] = numpy.arange(instance.num_nodes)
+
+	write_arrays(path, manifest, arrays)
+
+def load_instance(path, mmap=True):
+	"""
+	Loads an instance saved by save_instance.
+
+	:param path: the .npz file or directory the instance was saved to
+	:param mmap: flag which when True memory-maps the arrays of the directory format instead of reading them
+	:return: the TemporalInstance, the list of demands (source, destinations), and the seed
+	"""
+	manifest, arrays = read_arrays(path, INSTANCE_FORMAT, mmap)
+
+	nodes = arrays['nodes']
+	if 'node_labels' in manifest:
+		nodes = numpy.empty(len(manifest['node_labels']), dtype=object)
+		for i, node in enumerate(manifest['node_labels']):
+			nodes[i] = from_json_label(node)
+
+	instance = TemporalInstance(nodes, arrays['indptr'], arrays['indices'], arrays['weights'], arrays['existence'],
+								manifest['num_times'], manifest['packed'])
+	demands = [(from_json_label(source), [from_json_label(destination) for destination in destinations])
+			   for source, destinations in manifest['demands']]
+	return instance, demands, manifest['seed']
+
+def save_solution(path, subgraph, objective=None, stats=None):
+	"""
+	Saves a solution subgraph together with its objective and solver statistics.
+
+	:param path: a .npz file path
+	:param subgraph: a directed graph with attribute 'weight' on all edges (None if no solution was found)
+	:param objective: the objective value
+	:param stats: a dictionary of JSON-serializable solver statistics
+	"""
+	edges = subgraph.edges(data='weight') if subgraph is not None else []
+	manifest = {
+		'format': SOLUTION_FORMAT,
+		'version': FORMAT_VERSION,
+		'found': subgraph is not None,
+		'objective': objective,
+		'stats': stats or {},
+		'edges': [[to_json_label(u), to_json_label(v)] for u, v, weight in edges],
+	}
+	arrays = {'weights': numpy.array([weight for u, v, weight in edges], dtype=numpy.float64)}
+	write_arrays(path, manifest, arrays)
+
+def load_solution(path):
+	"""
+	Loads a solution saved by save_solution.
+
+	:param path: the .npz file the solution was saved to
+	:return: the subgraph (None if no solution was found), the objective, and the dictionary of solver statistics
+	"""
+	manifest, arrays = read_arrays(path, SOLUTION_FORMAT, mmap=False)
+	subgraph = None
+	if manifest['found']:
+		subgraph = networkx.DiGraph()
+		for (u, v), weight in zip(manifest['edges'], arrays['weights'].tolist()):
+			subgraph.add_edge(from_json_label(u), from_json_label(v), weight=weight)
+	return subgraph, manifest['objective'], manifest['stats']
+
+def write_arrays(path, manifest, arrays):
+	"""
+	Atomically writes a manifest and named arrays, as a .npz file or as a directory of .npy files. A directory cannot
+	replace another one in a single rename, so an existing directory is first renamed out of the way and deleted once
+	the new one is in place: a crash in between leaves it complete under <path>.old-<pid>.
+	"""
+	temporary_path = '%s.tmp-%s' % (path.rstrip(os.sep), os.getpid())
+	if path.endswith('.npz'):
+		with open(temporary_path, 'wb') as output_file:
+			numpy.savez(output_file, manifest=numpy.array(json.dumps(manifest)), **arrays)
+	else:
+		if os.path.exists(temporary_path):
+			shutil.rmtree(temporary_path)
+		os.makedirs(temporary_path)
+		for name, array in arrays.items():
+			numpy.save(os.path.join(temporary_path, name + '.npy'), numpy.asarray(array))
+		with open(os.path.join(temporary_path, 'manifest.json'), 'w') as manifest_file:
+			json.dump(manifest, manifest_file)
+		if os.path.isdir(path):
+			old_path = '%s.old-%s' % (path.rstrip(os.sep), os.getpid())
+			if os.path.exists(old_path):
+				shutil.rmtree(old_path)
+			os.rename(path, old_path)
+			os.rename(temporary_path, path)
+			shutil.rmtree(old_path)
+			return
+	os.rename(temporary_path, path)
+
+def read_arrays(path, expected_format, mmap=True):
+	"""
+	Reads a manifest and named arrays written by write_arrays, checking the format name and version.
+
+	:return: the manifest dictionary, and a dictionary of arrays
+	"""
+	if path.endswith('.npz'):
+		with numpy.load(path) as archive:
+			manifest = json.loads(str(archive['manifest']))
+			arrays = dict((name, archive[name]) for name in archive.files if name != 'manifest')
+	else:
+		with open(os.path.join(path, 'manifest.json')) as manifest_file:
+			manifest = json.load(manifest_file)
+		arrays = dict((file_name[:-len('.npy')], numpy.load(os.path.join(path, file_name), mmap_mode='r' if mmap else None))
+					  for file_name in os.listdir(path) if file_name.endswith('.npy'))
+
+	if manifest.get('format') != expected_format:
+		raise ValueError('%s is not a %s file' % (path, expected_format))
+	if manifest.get('version') != FORMAT_VERSION:
+		raise ValueError('%s has version %s, expected %s' % (path, manifest.get('version'), FORMAT_VERSION))
+	return manifest, arrays
+
+def to_json_label(node):
+	"""
+	Converts a node label to a JSON value (tuples become lists, numpy scalars become Python numbers).
+	"""
+	if isinstance(node, tuple):
+		return [to_json_label(part) for part in node]
+	if isinstance(node, numpy.generic):
+		return node.item()
+	return node
+
+def from_json_label(node):
+	"""
+	Inverse of to_json_label.
+	"""
+	if isinstance(node, list):
+		return tuple(from_json_label(part) for part in node)
+	return node
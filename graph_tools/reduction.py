@@ -0,0 +1,209 @@
+"""
+This file implements a structural reduction of TCP and mTCP instances, run before the model is generated:
+
+- path relevance: only the nodes reachable from the source and from which a destination is reachable (ignoring time)
+  can lie on a source -> destination path, every other node and its edges are dropped
+- chain contraction: a node v other than the source and the destinations whose only edges are u -> v and v -> w is
+  replaced by the edge u -> w of weight w(u, v) + w(v, w), when the activity of u, v and w makes the chain behave as
+  one edge in time (see contraction_is_exact), which holds for instance when v is active whenever u and w are and
+  v, like its neighbors, is not active two steps apart from them
+- dominated parallel routes: when the contracted edge u -> w already exists, only the cheaper of the two routes is
+  kept, since both let the same flow through at the same times
+
+Every edge of the reduced graph maps to the list of edges of the original graph it stands for, so that solutions
+of the reduced instance can be expanded back (see expand_subgraph, and the edge_mapping parameter of
+retreive_and_print_subgraph).
+"""
+import networkx
+import numpy
+
+
+def reduce_TCP_instance(graph, existence_for_node_time, connectivity_demand, detailed_output=True, waiting=False):
+	"""
+	Reduces a TCP instance to the nodes that can lie on a source -> destination path, with chains contracted.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param connectivity_demand: a connectivity demand (source, demand)
+	:param detailed_output: flag which when True will print how much of the instance was removed
+	:param waiting: flag which when True the instance is solved with waiting arcs (see ILP_solver/formulation.py)
+	:return: the reduced graph, the reduced existence_for_node_time, the edge mapping (a dictionary from every edge
+			 (u, v) of the reduced graph to the list of original edges (u, v, weight) it stands for), and a
+			 dictionary of reduction statistics
+	"""
+	source, destination = connectivity_demand
+	return reduce_instance(graph, existence_for_node_time, source, [destination], detailed_output, waiting)
+
+def reduce_mTCP_instance(graph, existence_for_node_time, source, destinations, detailed_output=True, waiting=False):
+	"""
+	Reduces an mTCP instance to the nodes that can lie on a source -> destination path for some destination, with
+	chains contracted.
+
+	:param graph: a directed graph with attribute 'weight' on all edges
+	:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+	:param source: the source node
+	:param destinations: a list of destination nodes
+	:param detailed_output: flag which when True will print how much of the instance was removed
+	:param waiting: flag which when True the instance is solved with waiting arcs (see ILP_solver/formulation.py)
+	:return: the reduced graph, the reduced existence_for_node_time, the edge mapping, and a dictionary of reduction
+			 statistics
+	"""
+	return reduce_instance(graph, existence_for_node_time, source, destinations, detailed_output, waiting)
+
+def reduce_instance(graph, existence_for_node_time, source, destinations, detailed_output=True, waiting=False):
+	"""
+	Shared reduction of reduce_TCP_instance and reduce_mTCP_instance. The input graph is not modified.
+
+	:return: the reduced graph, the reduced existence_for_node_time, the edge mapping, and a dictionary of reduction
+			 statistics
+	"""
+	kept_nodes = relevant_nodes(graph, source, destinations)
+	kept_nodes.add(source)
+	kept_nodes.update(destinations)
+
+	reduced_graph = networkx.DiGraph()
+	reduced_graph.add_nodes_from(kept_nodes)
+	edge_mapping = {}
+	for u, v, data in graph.edges_iter(data=True):
+		if u in kept_nodes and v in kept_nodes:
+			reduced_graph.add_edge(u, v, **data)
+			edge_mapping[u, v] = [(u, v, data['weight'])]
+	relevant_counts = (reduced_graph.number_of_nodes(), reduced_graph.number_of_edges())
+
+	times = sorted(set(t for _, t in existence_for_node_time))
+	activity = dict((node, numpy.array([bool(existence_for_node_time.get((node, t), 0)) for t in times]))
+					for node in reduced_graph.nodes_iter())
+	terminals = set([source]) | set(destinations)
+	contracted, dominated = contract_chains(reduced_graph, activity, terminals, edge_mapping, waiting)
+
+	reduced_existence = {}
+	for node in reduced_graph.nodes_iter():
+		for t in times:
+			reduced_existence[node, t] = existence_for_node_time.get((node, t), 0)
+
+	reduction_stats = {
+		'nodes': (graph.number_of_nodes(), relevant_counts[0], reduced_graph.number_of_nodes()),
+		'edges': (graph.number_of_edges(), relevant_counts[1], reduced_graph.number_of_edges()),
+		'contracted_nodes': contracted,
+		'dominated_routes': dominated,
+	}
+	if detailed_output:
+		print_reduction_stats(reduction_stats)
+	return reduced_graph, reduced_existence, edge_mapping, reduction_stats
+
+def relevant_nodes(graph, source, destinations):
+	"""
+	:return: the set of nodes reachable from the source from which some destination is reachable, ignoring time
+	"""
+	forward = reachable_nodes(graph.successors_iter, [source])
+	backward = reachable_nodes(graph.predecessors_iter, [destination for destination in destinations
+															 if destination in graph])
+	return forward & backward
+
+def reachable_nodes(neighbors, start_nodes):
+	"""
+	:param neighbors: a function from a node to an iterator over its neighbors
+	:param start_nodes: a list of nodes to search from
+	:return: the set of nodes reachable from any start node, the start nodes included
+	"""
+	reached = set(start_nodes)
+	stack = list(reached)
+	while stack:
+		node = stack.pop()
+		for neighbor in neighbors(node):
+			if neighbor not in reached:
+				reached.add(neighbor)
+				stack.append(neighbor)
+	return reached
+
+def contract_chains(graph, activity, terminals, edge_mapping, waiting=False):
+	"""
+	Contracts in place every node of a chain u -> v -> w for which contraction_is_exact holds, and keeps only the
+	cheapest route when the contracted edge already exists. Edges created by a contraction can be contracted again, so
+	longer chains collapse into a single edge.
+
+	:param graph: a directed graph with attribute 'weight' on all edges (modified in place)
+	:param activity: a dictionary from node to a boolean array over times
+	:param terminals: the set of nodes never contracted (the source and the destinations)
+	:param edge_mapping: a dictionary from every edge of the graph to the list of original edges it stands for
+						 (updated in place)
+	:param waiting: flag which when True nodes active at consecutive times can wait, and are not contracted
+	:return: the number of contracted nodes and the number of dominated routes removed
+	"""
+	contracted = 0
+	dominated = 0
+	candidates = list(graph.nodes_iter())
+	while candidates:
+		v = candidates.pop()
+		if v in terminals or v not in graph or graph.has_edge(v, v):
+			continue
+		if graph.in_degree(v) != 1 or graph.out_degree(v) != 1:
+			continue
+		u, w = graph.predecessors(v)[0], graph.successors(v)[0]
+		if u == w or (waiting and (activity[v][:-1] & activity[v][1:]).any()):
+			continue
+		if not contraction_is_exact(activity[u], activity[v], activity[w]):
+			continue
+
+		weight = graph[u][v]['weight'] + graph[v][w]['weight']
+		route = edge_mapping.pop((u, v)) + edge_mapping.pop((v, w))
+		graph.remove_node(v)
+		contracted += 1
+		if graph.has_edge(u, w):
+			dominated += 1
+			if graph[u][w]['weight'] <= weight:
+				continue
+		graph.add_edge(u, w, weight=weight)
+		edge_mapping[u, w] = route
+		candidates.extend([u, w])
+	return contracted, dominated
+
+def contraction_is_exact(u_activity, v_activity, w_activity):
+	"""
+	Checks that a chain u -> v -> w through a node v that cannot wait lets flow from (u, t) to (w, t') for exactly the
+	same pairs of times as an edge u -> w, which allows t' in {t, t+1}.
+
+	:param u_activity: boolean array over times of the activity of u
+	:param v_activity: boolean array over times of the activity of v
+	:param w_activity: boolean array over times of the activity of w
+	:return: True if v can be contracted
+	"""
+	u, v, w = u_activity, v_activity, w_activity
+	# (u, t) -> (w, t) needs v active at t
+	if (u & w & ~v).any():
+		return False
+	# (u, t) -> (w, t+1) needs v active at t or t+1
+	if (u[:-1] & w[1:] & ~(v[:-1] | v[1:])).any():
+		return False
+	# The chain must not allow (u, t) -> (v, t+1) -> (w, t+2), which an edge cannot
+	return not (u[:-2] & v[1:-1] & w[2:]).any()
+
+def expand_subgraph(subgraph, edge_mapping):
+	"""
+	Maps a subgraph of a reduced graph back to the edges of the original graph.
+
+	:param subgraph: a directed graph made of edges of the reduced graph
+	:param edge_mapping: the edge mapping returned by reduce_TCP_instance/reduce_mTCP_instance
+	:return: a directed graph with attribute 'weight' on all edges
+	"""
+	expanded = networkx.DiGraph()
+	expanded.add_nodes_from(subgraph.nodes_iter())
+	for u, v in subgraph.edges_iter():
+		for tail, head, weight in edge_mapping[u, v]:
+			expanded.add_edge(tail, head, weight=weight)
+	return expanded
+
+def print_reduction_stats(reduction_stats):
+	"""
+	Prints how much of the instance the reduction removed.
+
+	:param reduction_stats: a dictionary of reduction statistics as returned by reduce_instance
+	"""
+	print('-----------------------------------------------------------------------')
+	print('Structural reduction (before -> relevant -> contracted):')
+	for key in ['nodes', 'edges']:
+		before, relevant, after = reduction_stats[key]
+		removed = 100.0 * (before - after) / before if before else 0.0
+		print('    %s: %s -> %s -> %s (%.1f%% removed)' % (key, before, relevant, after, removed))
+	print('    %s chain nodes contracted, %s dominated routes removed'
+		  % (reduction_stats['contracted_nodes'], reduction_stats['dominated_routes']))
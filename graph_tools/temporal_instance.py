@@ -0,0 +1,194 @@
+"""
+This file implements TemporalInstance, a compact array-backed representation of a temporal graph
+(a weighted directed graph together with its existence function).
+"""
+import networkx
+import numpy
+
+
+class TemporalInstance(object):
+	"""
+	A weighted directed graph G = (V, E, w) with existence function rho : V x [T] -> {0, 1}, stored as
+
+	- nodes: array of node labels, node_index maps a label back to its position
+	- indptr, indices: CSR out-adjacency over node positions (the edges of node i are indices[indptr[i]:indptr[i+1]])
+	- weights: float array over the CSR edges
+	- existence: boolean array of shape |V| x |T|, or bit-packed along time (numpy.packbits) if packed is True
+
+	Edges are identified by their position in the CSR arrays.
+	"""
+
+	def __init__(self, nodes, indptr, indices, weights, existence, num_times=None, packed=False):
+		"""
+		:param nodes: array of node labels
+		:param indptr: CSR row pointer array of length |V| + 1
+		:param indices: CSR column array (edge heads) of length |E|
+		:param weights: array of edge weights of length |E|
+		:param existence: boolean array of shape |V| x |T|, or its numpy.packbits(axis=1) form if packed
+		:param num_times: |T|, required if packed
+		:param packed: flag which when True means existence is bit-packed
+		"""
+		self.nodes = numpy.asarray(nodes)
+		self.indptr = numpy.asarray(indptr, dtype=numpy.int64)
+		self.indices = numpy.asarray(indices, dtype=numpy.int64)
+		self.weights = numpy.asarray(weights, dtype=numpy.float64)
+		self.existence = existence
+		self.packed = packed
+		self.num_times = num_times if packed else existence.shape[1]
+		self._node_index = None
+
+	@classmethod
+	def from_arrays(cls, nodes, tails, heads, weights, existence, packed=False):
+		"""
+		Builds an instance from edge lists over node positions (the compact form of the graph generators).
+
+		:param nodes: array of node labels
+		:param tails: array of edge tails (node positions)
+		:param heads: array of edge heads (node positions)
+		:param weights: array of edge weights
+		:param existence: boolean array of shape |V| x |T|
+		:param packed: flag which when True bit-packs the existence matrix
+		:return: a TemporalInstance
+		"""
+		tails = numpy.asarray(tails, dtype=numpy.int64)
+		order = numpy.lexsort((heads, tails))
+		indptr = numpy.zeros(len(nodes) + 1, dtype=numpy.int64)
+		numpy.cumsum(numpy.bincount(tails, minlength=len(nodes)), out=indptr[1:])
+
+		existence = numpy.asarray(existence, dtype=bool)
+		num_times = existence.shape[1]
+		if packed:
+			existence = numpy.packbits(existence, axis=1)
+		return cls(nodes, indptr, numpy.asarray(heads)[order], numpy.asarray(weights)[order], existence, num_times, packed)
+
+	@classmethod
+	def from_networkx(cls, graph, existence_for_node_time, packed=False):
+		"""
+		Builds an instance from a networkx graph and an existence dictionary. Times are 0, ..., max time in the
+		dictionary, and missing (node, time) keys are inactive.
+
+		:param graph: a directed graph with attribute 'weight' on all edges
+		:param existence_for_node_time: a dictionary from (node, time) to existence {True, False}
+		:param packed: flag which when True bit-packs the existence matrix
+		:return: a TemporalInstance
+		"""
+		nodes = graph.nodes()
+		node_index = dict((node, i) for i, node in enumerate(nodes))
+
+		edges = graph.edges(data='weight')
+		tails = numpy.array([node_index[u] for u, v, weight in edges], dtype=numpy.int64)
+		heads = numpy.array([node_index[v] for u, v, weight in edges], dtype=numpy.int64)
+		weights = numpy.array([weight for u, v, weight in edges], dtype=numpy.float64)
+
+		num_times = max(node_time[1] for node_time in existence_for_node_time.keys()) + 1
+		existence = numpy.zeros((len(nodes), num_times), dtype=bool)
+		for (node, t), exists in existence_for_node_time.items():
+			if exists and node in node_index:
+				existence[node_index[node], t] = True
+
+		if all(isinstance(node, (int, numpy.integer)) for node in nodes):
+			node_labels = numpy.array(nodes, dtype=numpy.int64)
+		else:
+			node_labels = numpy.empty(len(nodes), dtype=object)
+			for i, node in enumerate(nodes):
+				node_labels[i] = node
+		return cls.from_arrays(node_labels, tails, heads, weights, existence, packed)
+
+	def to_networkx(self):
+		"""
+		Converts the instance back into a networkx graph and an existence dictionary.
+
+		:return: graph, existence_for_node_time (dictionary: V x T -> 1/0)
+		"""
+		node_labels = self.nodes.tolist()
+		graph = networkx.DiGraph()
+		graph.add_nodes_from(node_labels)
+		graph.add_weighted_edges_from(zip(self.nodes[self.tails].tolist(), self.nodes[self.indices].tolist(),
+										  self.weights.tolist()))
+
+		keys = zip(numpy.repeat(self.nodes, self.num_times).tolist(),
+				   numpy.tile(numpy.arange(self.num_times), self.num_nodes).tolist())
+		existence_for_node_time = dict(zip(keys, self.existence_matrix().ravel().astype(int).tolist()))
+		return graph, existence_for_node_time
+
+	@property
+	def node_index(self):
+		"""
+		Dictionary from node label to position, built on first use.
+		"""
+		if self._node_index is None:
+			self._node_index = dict((node, i) for i, node in enumerate(self.nodes.tolist()))
+		return self._node_index
+
+	@property
+	def num_nodes(self):
+		return len(self.nodes)
+
+	@property
+	def num_edges(self):
+		return len(self.indices)
+
+	@property
+	def max_time(self):
+		return self.num_times - 1
+
+	@property
+	def tails(self):
+		"""
+		Array of edge tails (node positions), aligned with indices and weights.
+		"""
+		return numpy.repeat(numpy.arange(self.num_nodes), numpy.diff(self.indptr))
+
+	@property
+	def heads(self):
+		"""
+		Array of edge heads (node positions), aligned with the tails and weights.
+		"""
+		return self.indices
+
+	@property
+	def nbytes(self):
+		"""
+		Memory used by the arrays of the instance, in bytes.
+		"""
+		return self.nodes.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes + self.existence.nbytes
+
+	def existence_matrix(self):
+		"""
+		:return: the existence function as a boolean array of shape |V| x |T|
+		"""
+		if self.packed:
+			return numpy.unpackbits(self.existence, axis=1)[:, :self.num_times].astype(bool)
+		return self.existence
+
+	def edge_list(self):
+		"""
+		:return: a list of edges (u, v) as node labels, in edge position order
+		"""
+		return list(zip(self.nodes[self.tails].tolist(), self.nodes[self.indices].tolist()))
+
+	def edge_position(self, u, v):
+		"""
+		:return: the position of edge (u, v), given as node labels
+		"""
+		tail = self.node_index[u]
+		neighbors = self.indices[self.indptr[tail]:self.indptr[tail + 1]]
+		offset = numpy.searchsorted(neighbors, self.node_index[v])
+		if offset == len(neighbors) or neighbors[offset] != self.node_index[v]:
+			raise KeyError((u, v))
+		return self.indptr[tail] + offset
+
+	def subinstance(self, edge_mask=None, existence=None):
+		"""
+		Returns an instance over the same nodes with only some edges kept and/or a different existence function.
+
+		:param edge_mask: boolean array over edges, True for kept edges (all edges if None)
+		:param existence: boolean array of shape |V| x |T| (unchanged if None)
+		:return: a TemporalInstance
+		"""
+		if edge_mask is None:
+			edge_mask = numpy.ones(self.num_edges, dtype=bool)
+		if existence is None:
+			existence = self.existence_matrix()
+		return TemporalInstance.from_arrays(self.nodes, self.tails[edge_mask], self.indices[edge_mask],
+											self.weights[edge_mask], existence, self.packed)
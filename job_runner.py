@@ -0,0 +1,471 @@
+"""
+This file runs campaigns of TCP/mTCP instances from a queue directory shared by several machines (e.g. over NFS),
+without a scheduler or service: every runner claims the next free job with a lock file, solves the demands of its
+instance and writes one result file per demand.
+
+	queue/jobs/            the instances, saved by save_instance (see graph_tools/instance_io.py) with their demands,
+	                       one job per instance (copied in by the enqueue command, or saved there directly)
+	queue/locks/           <job>.lock, the claim of a job, holding the host, process id and claim time of its runner
+	queue/results/<job>/   <index>.npz, the solution of the demand at position index of the job (see save_solution)
+	queue/results/         <job>.done once every demand of the job is solved, or <job>.failed with the traceback
+
+A job is claimed by hard-linking a complete lock file to locks/<job>.lock, which fails if the job is already claimed,
+also on NFS. The demands of a job are solved in a child process of its runner, spawned with the thread limits in its
+environment, while the runner touches the lock every HEARTBEAT_INTERVAL seconds: a solver holding the GIL for a long
+call cannot delay the heartbeat and make a live lock look stale. A lock is
+stale when its runner died: its process is gone (checked on the same host only), or the lock was not touched for
+stale_timeout seconds. Stale locks are broken and their jobs claimed again. Since result files are written under a
+temporary name and renamed, a runner restarted after a crash only solves the demands that have no result file yet.
+
+Failed jobs are not retried: delete their .failed file to queue them again.
+
+Example:
+	python job_runner.py enqueue --queue /shared/campaign instances/*.npz
+	python job_runner.py run --queue /shared/campaign --processes 8 --threads 2 --time-limit 600
+	python job_runner.py status --queue /shared/campaign
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import errno
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time as python_time
+import traceback
+import uuid
+from ILP_solver import batch
+from ILP_solver.solution_cache import json_stats
+from graph_tools.instance_io import load_instance, save_solution, load_solution, to_json_label
+
+JOBS_DIRECTORY = 'jobs'
+LOCKS_DIRECTORY = 'locks'
+RESULTS_DIRECTORY = 'results'
+LOCK_SUFFIX = '.lock'
+DONE_SUFFIX = '.done'
+FAILED_SUFFIX = '.failed'
+RESULT_SUFFIX = '.npz'
+
+# Seconds between two touches of the lock of a running job
+HEARTBEAT_INTERVAL = 60
+
+# Seconds after which a lock that was not touched is stale, well above HEARTBEAT_INTERVAL and the clock skew of the
+# hosts
+DEFAULT_STALE_TIMEOUT = 600
+
+
+class JobLock(object):
+	"""
+	The claim of a job by this process. Inside a with block, a thread touches the lock file every HEARTBEAT_INTERVAL
+	seconds, and the lock file is removed on exit. Nothing holding the GIL for long may run in this process meanwhile
+	(see run_job).
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.owner = {
+			'host': socket.gethostname(),
+			'pid': os.getpid(),
+			'time': python_time.time(),
+			'token': uuid.uuid4().hex,
+		}
+		self.stop_heartbeat = threading.Event()
+		self.heartbeat_thread = None
+
+	def acquire(self):
+		"""
+		:return: True if the job was claimed, False if it is claimed by another runner
+		"""
+		temporary_path = '%s.tmp-%s-%s' % (self.path, self.owner['host'], self.owner['pid'])
+		with open(temporary_path, 'w') as lock_file:
+			json.dump(self.owner, lock_file)
+		try:
+			os.link(temporary_path, self.path)
+		except OSError:
+			# Either claimed by another runner, or a retried link on NFS that did succeed: the content tells
+			pass
+		finally:
+			os.remove(temporary_path)
+		return read_lock(self.path) == self.owner
+
+	def heartbeat(self):
+		while not self.stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+			try:
+				os.utime(self.path, None)
+			except OSError:
+				# The lock was broken, the result files are still written atomically
+				pass
+
+	def __enter__(self):
+		self.heartbeat_thread = threading.Thread(target=self.heartbeat)
+		self.heartbeat_thread.daemon = True
+		self.heartbeat_thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop_heartbeat.set()
+		self.heartbeat_thread.join()
+		if read_lock(self.path) == self.owner:
+			os.remove(self.path)
+		return False
+
+
+def queue_directories(queue):
+	"""
+	:param queue: the queue directory
+	:return: the jobs, locks and results directories of a queue, created if missing
+	"""
+	directories = [os.path.join(queue, name) for name in (JOBS_DIRECTORY, LOCKS_DIRECTORY, RESULTS_DIRECTORY)]
+	for directory in directories:
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				# Created by another runner in the meantime
+				if not os.path.isdir(directory):
+					raise
+	return directories
+
+def enqueue_instances(queue, paths):
+	"""
+	Copies saved instances into the jobs directory of a queue, each one under a temporary name and renamed, so that
+	runners never claim a partial instance.
+
+	:param queue: the queue directory
+	:param paths: paths of instances saved by save_instance (.npz files or directories)
+	:return: the list of the names of the new jobs
+	"""
+	jobs_directory, _, _ = queue_directories(queue)
+	jobs = []
+	for path in paths:
+		job = os.path.basename(path.rstrip(os.sep))
+		job_path = os.path.join(jobs_directory, job)
+		if os.path.exists(job_path):
+			raise ValueError('Job %s is already in the queue' % job)
+		temporary_path = '%s.tmp-%s' % (job_path, os.getpid())
+		if os.path.isdir(path):
+			shutil.copytree(path, temporary_path)
+		else:
+			shutil.copyfile(path, temporary_path)
+		os.rename(temporary_path, job_path)
+		jobs.append(job)
+	return jobs
+
+def list_jobs(queue):
+	"""
+	:param queue: the queue directory
+	:return: the sorted names of the jobs of a queue, partial copies excluded
+	"""
+	jobs_directory, _, _ = queue_directories(queue)
+	return sorted(job for job in os.listdir(jobs_directory) if '.tmp-' not in job)
+
+def job_finished(queue, job):
+	"""
+	:return: True if a job is done or failed
+	"""
+	results_directory = os.path.join(queue, RESULTS_DIRECTORY)
+	return (os.path.exists(os.path.join(results_directory, job + DONE_SUFFIX)) or
+			os.path.exists(os.path.join(results_directory, job + FAILED_SUFFIX)))
+
+def read_lock(path):
+	"""
+	:return: the owner dictionary of a lock file (None if it does not exist or cannot be read)
+	"""
+	try:
+		with open(path) as lock_file:
+			return json.load(lock_file)
+	except (IOError, OSError, ValueError):
+		return None
+
+def lock_is_stale(path, owner, stale_timeout=DEFAULT_STALE_TIMEOUT):
+	"""
+	:param path: the path of a lock file
+	:param owner: its owner dictionary, as read by read_lock
+	:param stale_timeout: seconds after which a lock that was not touched is stale
+	:return: True if the runner holding the lock is dead
+	"""
+	try:
+		age = python_time.time() - os.stat(path).st_mtime
+	except OSError:
+		# Released in the meantime
+		return False
+	if age > stale_timeout:
+		return True
+	return owner is not None and owner['host'] == socket.gethostname() and not process_exists(owner['pid'])
+
+def process_exists(pid):
+	"""
+	:return: True if a process of this host has the given process id
+	"""
+	try:
+		os.kill(pid, 0)
+	except OSError as error:
+		return error.errno == errno.EPERM
+	return True
+
+def break_lock(path, owner):
+	"""
+	Removes a stale lock, unless another runner broke it and claimed the job again since owner was read.
+
+	:param path: the path of a lock file
+	:param owner: its owner dictionary, as read by read_lock
+	:return: True if the lock was removed
+	"""
+	broken_path = '%s.broken-%s-%s' % (path, socket.gethostname(), os.getpid())
+	try:
+		# Atomic, so only one of the runners breaking the same lock succeeds
+		os.rename(path, broken_path)
+	except OSError:
+		return False
+	broken = read_lock(broken_path) == owner
+	if not broken:
+		# The lock of the new owner was taken instead, put it back
+		try:
+			os.link(broken_path, path)
+		except OSError:
+			pass
+	os.remove(broken_path)
+	return broken
+
+def claim_job(queue, job, stale_timeout=DEFAULT_STALE_TIMEOUT):
+	"""
+	Claims a job, breaking its lock if it is stale.
+
+	:param queue: the queue directory
+	:param job: the name of the job
+	:param stale_timeout: seconds after which a lock that was not touched is stale
+	:return: a JobLock, or None if the job is claimed by a running runner
+	"""
+	lock = JobLock(os.path.join(queue, LOCKS_DIRECTORY, job + LOCK_SUFFIX))
+	if lock.acquire():
+		return lock
+	owner = read_lock(lock.path)
+	if lock_is_stale(lock.path, owner, stale_timeout) and break_lock(lock.path, owner) and lock.acquire():
+		return lock
+	return None
+
+def run_job(queue, job, threads=1, backend='highs', presolve=True, use_heuristic=True, waiting=False, **options):
+	"""
+	Solves the demands of a claimed job that have no result file yet, one at a time in a solver process, then marks
+	the job as done. Since the solver process is spawned, a script calling this must guard its main code with
+	if __name__ == '__main__'.
+
+	:param queue: the queue directory
+	:param job: the name of the job
+	:param threads: number of solver threads
+	:param options: the options of solve_batch
+	:return: the number of demands solved
+	"""
+	job_path = os.path.join(queue, JOBS_DIRECTORY, job)
+	results_directory = os.path.join(queue, RESULTS_DIRECTORY)
+	job_results_directory = os.path.join(results_directory, job)
+	_, demands, _ = load_instance(job_path)
+	if not os.path.isdir(job_results_directory):
+		os.makedirs(job_results_directory)
+	tasks = [(os.path.join(job_results_directory, str(index) + RESULT_SUFFIX), index, source, destinations)
+			 for index, (source, destinations) in enumerate(demands)]
+	tasks = [task for task in tasks if not os.path.exists(task[0])]
+	solved = 0
+	if tasks:
+		solver = solver_process(threads, (job_path, threads, backend, presolve, use_heuristic, waiting, None, options))
+		try:
+			for task in tasks:
+				# Waiting for the result releases the GIL, so the heartbeat of the lock keeps running
+				solver.submit(solve_job_demand, task).result()
+				solved += 1
+		finally:
+			solver.shutdown()
+
+	statuses = {}
+	for index in range(len(demands)):
+		_, _, stats = load_solution(os.path.join(job_results_directory, str(index) + RESULT_SUFFIX))
+		statuses[stats['status']] = statuses.get(stats['status'], 0) + 1
+	write_marker(os.path.join(results_directory, job + DONE_SUFFIX), {'demands': len(demands), 'statuses': statuses})
+	return solved
+
+def solver_process(threads, initargs):
+	"""
+	Starts the process in which the demands of a job are solved. It is spawned rather than forked, so that numpy and
+	scipy are imported there after the thread limits are set in its environment.
+
+	:param threads: number of solver threads
+	:param initargs: the arguments of batch.init_worker
+	:return: a ProcessPoolExecutor with one worker
+	"""
+	for variable in batch.THREAD_ENVIRONMENT_VARIABLES:
+		os.environ[variable] = str(threads)
+	return ProcessPoolExecutor(1, multiprocessing.get_context('spawn'), initializer=batch.init_worker,
+							   initargs=initargs)
+
+def solve_job_demand(task):
+	"""
+	Solves one demand of a job in the solver process and writes its result file.
+
+	:param task: a (result_path, index, source, destinations) tuple
+	"""
+	result_path, index, source, destinations = task
+	result = batch.solve_demand((index, source, destinations))
+	stats = dict(result.stats, host=socket.gethostname(),
+				 demand=[to_json_label(source), [to_json_label(destination) for destination in destinations]])
+	save_solution(result_path, result.subgraph, result.objective, json_stats(stats))
+
+def write_marker(path, record):
+	"""
+	Atomically writes a done or failed marker, with the host and time added to the record.
+	"""
+	record = dict(record, host=socket.gethostname(), time=python_time.time())
+	temporary_path = '%s.tmp-%s' % (path, os.getpid())
+	with open(temporary_path, 'w') as marker_file:
+		json.dump(record, marker_file, indent=1, sort_keys=True)
+	os.rename(temporary_path, path)
+
+def runner_loop(settings):
+	"""
+	Claims and runs jobs until a pass over the queue claims none (or, with poll, forever).
+
+	:param settings: a (queue, threads, backend, presolve, use_heuristic, waiting, options, stale_timeout, poll,
+					 max_jobs) tuple
+	:return: the number of jobs run
+	"""
+	queue, threads, backend, presolve, use_heuristic, waiting, options, stale_timeout, poll, max_jobs = settings
+	results_directory = os.path.join(queue, RESULTS_DIRECTORY)
+	jobs_run = 0
+	while max_jobs is None or jobs_run < max_jobs:
+		claimed = False
+		for job in list_jobs(queue):
+			if max_jobs is not None and jobs_run >= max_jobs:
+				break
+			if job_finished(queue, job):
+				continue
+			lock = claim_job(queue, job, stale_timeout)
+			if lock is None:
+				continue
+			with lock:
+				# Another runner may have finished the job between the check and the claim
+				if job_finished(queue, job):
+					continue
+				claimed = True
+				start_time = python_time.time()
+				try:
+					solved = run_job(queue, job, threads, backend, presolve, use_heuristic, waiting, **options)
+					print('%s: %s demands solved in %.1f s' % (job, solved, python_time.time() - start_time))
+				except Exception:
+					write_marker(os.path.join(results_directory, job + FAILED_SUFFIX),
+								 {'error': traceback.format_exc()})
+					print('%s: failed, see %s' % (job, job + FAILED_SUFFIX))
+				jobs_run += 1
+		if not claimed:
+			if poll is None:
+				break
+			python_time.sleep(poll)
+	return jobs_run
+
+def run_queue(queue, processes=1, threads=1, backend='highs', presolve=True, use_heuristic=True, waiting=False,
+			  stale_timeout=DEFAULT_STALE_TIMEOUT, poll=None, max_jobs=None, **options):
+	"""
+	Runs the jobs of a queue with several runner processes, each one solving one job at a time. Any number of hosts
+	can run the same queue at the same time.
+
+	:param queue: the queue directory
+	:param processes: number of runner processes of this host
+	:param threads: number of solver threads of every runner
+	:param backend: name of the backend in BACKENDS ('gurobi' or 'highs')
+	:param presolve: flag which when True runs the temporal reachability presolve before every solve
+	:param use_heuristic: flag which when True passes the heuristic subgraph to the backend as a MIP start and cutoff
+	:param waiting: flag which when True lets flow wait at active nodes for free (see ILP_solver/formulation.py)
+	:param stale_timeout: seconds after which a lock that was not touched is stale
+	:param poll: seconds between two passes over a queue without free jobs (the runners stop if None)
+	:param max_jobs: number of jobs after which every runner stops (no limit if None)
+	:param options: other backend options (time_limit, mip_gap)
+	:return: the number of jobs run
+	"""
+	queue_directories(queue)
+	settings = (queue, threads, backend, presolve, use_heuristic, waiting, options, stale_timeout, poll, max_jobs)
+	if processes == 1:
+		return runner_loop(settings)
+	# Not a multiprocessing.Pool, whose daemonic workers could not start the solver processes of their jobs
+	with ProcessPoolExecutor(processes) as runners:
+		return sum(runners.map(runner_loop, [settings] * processes))
+
+def queue_status(queue, stale_timeout=DEFAULT_STALE_TIMEOUT):
+	"""
+	:param queue: the queue directory
+	:param stale_timeout: seconds after which a lock that was not touched is stale
+	:return: a dictionary from state ('pending', 'running', 'stale', 'done', 'failed') to the list of its jobs, and a
+			 dictionary from running or stale job to the owner of its lock
+	"""
+	states = dict((state, []) for state in ('pending', 'running', 'stale', 'done', 'failed'))
+	owners = {}
+	for job in list_jobs(queue):
+		lock_path = os.path.join(queue, LOCKS_DIRECTORY, job + LOCK_SUFFIX)
+		if os.path.exists(os.path.join(queue, RESULTS_DIRECTORY, job + DONE_SUFFIX)):
+			states['done'].append(job)
+		elif os.path.exists(os.path.join(queue, RESULTS_DIRECTORY, job + FAILED_SUFFIX)):
+			states['failed'].append(job)
+		elif os.path.exists(lock_path):
+			owners[job] = read_lock(lock_path)
+			states['stale' if lock_is_stale(lock_path, owners[job], stale_timeout) else 'running'].append(job)
+		else:
+			states['pending'].append(job)
+	return states, owners
+
+def print_queue_status(queue, stale_timeout=DEFAULT_STALE_TIMEOUT):
+	"""
+	Prints the number of jobs in every state, then the running and stale jobs with their runner and progress.
+	"""
+	states, owners = queue_status(queue, stale_timeout)
+	print('-----------------------------------------------------------------------')
+	print('  '.join('%s %s' % (state, len(states[state])) for state in ('pending', 'running', 'stale', 'done', 'failed')))
+	for state in ('running', 'stale'):
+		for job in states[state]:
+			owner = owners[job] or {'host': '?', 'pid': '?', 'time': python_time.time()}
+			job_results_directory = os.path.join(queue, RESULTS_DIRECTORY, job)
+			solved = len([name for name in os.listdir(job_results_directory) if name.endswith(RESULT_SUFFIX)]
+						 ) if os.path.isdir(job_results_directory) else 0
+			print('%-7s %-30s %s:%s, %s demands solved, claimed %.0f s ago' % (
+				state, job, owner['host'], owner['pid'], solved, python_time.time() - owner['time']))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Run campaigns of TCP instances from a queue directory shared by '
+												 'several hosts.')
+	subparsers = parser.add_subparsers(dest='command')
+	enqueue_parser = subparsers.add_parser('enqueue', help='copy saved instances into the queue')
+	enqueue_parser.add_argument('instances', nargs='+', help='paths of instances saved by save_instance')
+	run_parser = subparsers.add_parser('run', help='claim and solve jobs until the queue has no free job')
+	run_parser.add_argument('--processes', type=int, default=None,
+							help='number of runner processes (default: cpu_count / threads)')
+	run_parser.add_argument('--threads', type=int, default=1, help='number of solver threads of every runner')
+	run_parser.add_argument('--backend', default='highs', choices=['gurobi', 'highs'])
+	run_parser.add_argument('--time-limit', type=float, default=None, help='time limit of every solve in seconds')
+	run_parser.add_argument('--mip-gap', type=float, default=None, help='relative gap at which every solve stops')
+	run_parser.add_argument('--no-presolve', action='store_true', help='skip the temporal reachability presolve')
+	run_parser.add_argument('--no-heuristic', action='store_true', help='skip the heuristic MIP start')
+	run_parser.add_argument('--waiting', action='store_true', help='let flow wait at active nodes for free')
+	run_parser.add_argument('--poll', type=float, default=None,
+							help='keep polling the queue for new jobs every this many seconds instead of stopping')
+	run_parser.add_argument('--max-jobs', type=int, default=None, help='number of jobs after which every runner stops')
+	status_parser = subparsers.add_parser('status', help='print the state of the jobs')
+	for subparser in [enqueue_parser, run_parser, status_parser]:
+		subparser.add_argument('--queue', required=True, help='path of the queue directory')
+	for subparser in [run_parser, status_parser]:
+		subparser.add_argument('--stale-timeout', type=float, default=DEFAULT_STALE_TIMEOUT,
+							   help='seconds after which a lock that was not touched is stale')
+	arguments = parser.parse_args()
+
+	if arguments.command == 'enqueue':
+		print('%s jobs added' % len(enqueue_instances(arguments.queue, arguments.instances)))
+	elif arguments.command == 'run':
+		options = {}
+		if arguments.time_limit is not None:
+			options['time_limit'] = arguments.time_limit
+		if arguments.mip_gap is not None:
+			options['mip_gap'] = arguments.mip_gap
+		processes = arguments.processes or max(1, multiprocessing.cpu_count() // arguments.threads)
+		jobs_run = run_queue(arguments.queue, processes, arguments.threads, arguments.backend,
+							 not arguments.no_presolve, not arguments.no_heuristic, arguments.waiting,
+							 arguments.stale_timeout, arguments.poll, arguments.max_jobs, **options)
+		print('%s jobs run' % jobs_run)
+	else:
+		print_queue_status(arguments.queue, arguments.stale_timeout)
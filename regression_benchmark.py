@@ -0,0 +1,244 @@
+"""
+This file runs a fixed suite of seeded TCP/mTCP instances through the sparse solver, stores the measurements as a
+baseline, and compares later runs against it, so that changes to the solver do not quietly slow it down.
+
+The suite (SUITE) is made of the hand-built edge reuse instances (see graph_tools/hand_built_instances.py) and of
+instances of several sizes from generate_graph and generate_scale_free_graph, generated after seeding the random
+module. Every case is run in its own worker process, repeats times, and records
+
+- build_time, solve_time, total_time: the smallest wall-clock times over the repeats (see ILP_solver/instrumentation.py)
+- peak_memory_mb: the peak resident set size of the worker process
+- num_variables, num_constraints, num_nonzeros: the size of the model
+- status, objective: the result, which must not change
+
+A run regresses when a time or the peak memory grows by more than the tolerance (and, for times, by more than
+MIN_TIME_DIFFERENCE), when the model grows by more than the tolerance, or when the result changes.
+
+Example:
+	python regression_benchmark.py run --output benchmark_baseline.json
+	python regression_benchmark.py compare --baseline benchmark_baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+from graph_tools.graph_generator import generate_graph, generate_scale_free_graph
+from graph_tools.hand_built_instances import edge_reuse_TCP_instance, edge_reuse_mTCP_instance, alternative_paths_TCP_instance
+from ILP_solver.backends import OPTIMAL, solve_sparse_mTCP_instance
+
+SUITE = [
+	{'name': 'edge_reuse_TCP', 'generator': 'edge_reuse_TCP'},
+	{'name': 'edge_reuse_mTCP', 'generator': 'edge_reuse_mTCP'},
+	{'name': 'alternative_paths_TCP', 'generator': 'alternative_paths_TCP'},
+	{'name': 'random_small', 'generator': 'generate_graph', 'seed': 1,
+	 'parameters': {'num_nodes': 50, 'edge_connectivity': 0.1, 'active_time_percent': 0.5, 'max_time': 3}},
+	{'name': 'random_medium', 'generator': 'generate_graph', 'seed': 2,
+	 'parameters': {'num_nodes': 100, 'edge_connectivity': 0.1, 'active_time_percent': 0.5, 'max_time': 5}},
+	{'name': 'random_large', 'generator': 'generate_graph', 'seed': 3,
+	 'parameters': {'num_nodes': 200, 'edge_connectivity': 0.03, 'active_time_percent': 0.5, 'max_time': 6}},
+	{'name': 'scale_free_small', 'generator': 'generate_scale_free_graph', 'seed': 1,
+	 'parameters': {'num_nodes': 100, 'active_time_percent': 0.8, 'max_time': 3}},
+	{'name': 'scale_free_medium', 'generator': 'generate_scale_free_graph', 'seed': 2,
+	 'parameters': {'num_nodes': 300, 'active_time_percent': 0.8, 'max_time': 5}},
+	{'name': 'scale_free_large', 'generator': 'generate_scale_free_graph', 'seed': 3,
+	 'parameters': {'num_nodes': 1000, 'active_time_percent': 0.8, 'max_time': 8}},
+]
+
+HAND_BUILT_INSTANCES = {
+	'edge_reuse_TCP': edge_reuse_TCP_instance,
+	'edge_reuse_mTCP': edge_reuse_mTCP_instance,
+	'alternative_paths_TCP': alternative_paths_TCP_instance,
+}
+
+TIME_FIELDS = ['build_time', 'solve_time', 'total_time']
+SIZE_FIELDS = ['num_variables', 'num_constraints', 'num_nonzeros']
+RESULT_FIELDS = ['name', 'status', 'objective'] + TIME_FIELDS + ['peak_memory_mb'] + SIZE_FIELDS
+
+# Time differences below this many seconds are never reported, since they are within the timer noise of small cases
+MIN_TIME_DIFFERENCE = 0.05
+
+DEFAULT_TOLERANCE = 0.25
+
+
+def suite_instance(case):
+	"""
+	Builds the instance of a case of the suite.
+
+	:param case: a case dictionary from SUITE
+	:return: graph, existence_for_node_time, source, destinations
+	"""
+	if case['generator'] in HAND_BUILT_INSTANCES:
+		instance = HAND_BUILT_INSTANCES[case['generator']]()
+		if len(instance) == 4:
+			return instance
+		graph, existence_for_node_time, (source, destination) = instance
+		return graph, existence_for_node_time, source, [destination]
+
+	random.seed(case['seed'])
+	if case['generator'] == 'generate_graph':
+		graph, existence_for_node_time, (source, destination) = generate_graph(**case['parameters'])
+	elif case['generator'] == 'generate_scale_free_graph':
+		# The seed must also reach networkx.scale_free_graph, which otherwise reseeds randomly
+		graph, existence_for_node_time, (source, destination) = generate_scale_free_graph(seed=case['seed'],
+																							**case['parameters'])
+	else:
+		raise ValueError('Unknown generator %s' % case['generator'])
+	return graph, existence_for_node_time, source, [destination]
+
+def run_case(task):
+	"""
+	Solves one case of the suite repeats times, keeping the smallest times.
+
+	:param task: a (case, backend, repeats, time_limit) tuple
+	:return: a result dictionary with the RESULT_FIELDS
+	"""
+	case, backend, repeats, time_limit = task
+	graph, existence_for_node_time, source, destinations = suite_instance(case)
+
+	# Solve a tiny instance first, so that the one-off loading of the solver library is not timed
+	graph_warmup, existence_warmup, (source_warmup, destination_warmup) = edge_reuse_TCP_instance()
+	solve_sparse_mTCP_instance(graph_warmup, existence_warmup, source_warmup, [destination_warmup], backend, quiet=True)
+
+	row = {'name': case['name']}
+	for _ in range(repeats):
+		options = {} if time_limit is None else {'time_limit': time_limit}
+		_, stats = solve_sparse_mTCP_instance(graph, existence_for_node_time, source, destinations, backend,
+											  return_stats=True, quiet=True, **options)
+		for field in TIME_FIELDS:
+			row[field] = min(row.get(field, stats[field]), stats[field])
+	for field in ['status', 'objective'] + SIZE_FIELDS:
+		row[field] = stats[field]
+	# ru_maxrss is in kilobytes on Linux
+	row['peak_memory_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+	return row
+
+def run_suite(names=None, backend='highs', repeats=3, time_limit=None, output=None):
+	"""
+	Runs the cases of the suite, one worker process per case, and writes the results as a JSON file.
+
+	:param names: names of the cases to run (all if None)
+	:param backend: name of the solver backend
+	:param repeats: number of solves per case
+	:param time_limit: time limit of every solve in seconds (no limit if None)
+	:param output: path of the JSON results file (not written if None)
+	:return: a results dictionary, with the run settings and a dictionary from case name to result
+	"""
+	cases = [case for case in SUITE if names is None or case['name'] in names]
+	tasks = [(case, backend, repeats, time_limit) for case in cases]
+	# One case at a time, so that the workers do not compete for cores and disturb the times
+	pool = multiprocessing.Pool(1, maxtasksperchild=1)
+	results = {}
+	try:
+		for row in pool.imap(run_case, tasks):
+			results[row['name']] = row
+			print('%-22s build %8.3fs  solve %8.3fs  peak %8.1f MB  %s' % (row['name'], row['build_time'],
+																		   row['solve_time'], row['peak_memory_mb'],
+																		   row['status']))
+	finally:
+		pool.close()
+		pool.join()
+
+	run = {
+		'backend': backend,
+		'repeats': repeats,
+		'time_limit': time_limit,
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'cases': results,
+	}
+	if output is not None:
+		with open(output, 'w') as json_file:
+			json.dump(run, json_file, indent=1, sort_keys=True)
+	return run
+
+def compare_runs(baseline, current, tolerance=DEFAULT_TOLERANCE, memory_tolerance=None):
+	"""
+	Compares a run against a baseline run.
+
+	:param baseline: a results dictionary as returned by run_suite (or loaded from its JSON file)
+	:param current: a results dictionary of the run to check
+	:param tolerance: relative growth of times and model sizes above which a case regresses
+	:param memory_tolerance: relative growth of the peak memory above which a case regresses (tolerance if None)
+	:return: a list of (case name, field, baseline value, current value) regressions
+	"""
+	if memory_tolerance is None:
+		memory_tolerance = tolerance
+	regressions = []
+	for name in sorted(baseline['cases']):
+		before = baseline['cases'][name]
+		after = current['cases'].get(name)
+		if after is None:
+			continue
+		for field in TIME_FIELDS:
+			if after[field] > before[field] * (1 + tolerance) and after[field] - before[field] > MIN_TIME_DIFFERENCE:
+				regressions.append((name, field, before[field], after[field]))
+		if after['peak_memory_mb'] > before['peak_memory_mb'] * (1 + memory_tolerance):
+			regressions.append((name, 'peak_memory_mb', before['peak_memory_mb'], after['peak_memory_mb']))
+		for field in SIZE_FIELDS:
+			if after[field] > before[field] * (1 + tolerance):
+				regressions.append((name, field, before[field], after[field]))
+		if after['status'] != before['status']:
+			regressions.append((name, 'status', before['status'], after['status']))
+		elif before['status'] == OPTIMAL and abs(after['objective'] - before['objective']) > 1e-6:
+			regressions.append((name, 'objective', before['objective'], after['objective']))
+	return regressions
+
+def print_comparison(baseline, current, regressions):
+	"""
+	Prints the ratio of every time to its baseline, then the regressions.
+	"""
+	print('-----------------------------------------------------------------------')
+	if baseline['backend'] != current['backend']:
+		print('Warning: baseline backend %s, current backend %s' % (baseline['backend'], current['backend']))
+	for name in sorted(baseline['cases']):
+		if name not in current['cases']:
+			print('%-22s missing from the current run' % name)
+			continue
+		before, after = baseline['cases'][name], current['cases'][name]
+		ratios = ['%s x%.2f' % (field, after[field] / before[field]) if before[field] else '%s -' % field
+				  for field in TIME_FIELDS + ['peak_memory_mb']]
+		print('%-22s %s' % (name, '  '.join(ratios)))
+	print('-----------------------------------------------------------------------')
+	if not regressions:
+		print('No regressions')
+	for name, field, before, after in regressions:
+		print('REGRESSION %s %s: %s -> %s' % (name, field, before, after))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Run the seeded regression benchmark suite of the TCP solver.')
+	subparsers = parser.add_subparsers(dest='command')
+	run_parser = subparsers.add_parser('run', help='run the suite and write the results (e.g. a new baseline)')
+	compare_parser = subparsers.add_parser('compare', help='compare a run with a baseline')
+	compare_parser.add_argument('--baseline', required=True, help='path of the baseline JSON file')
+	compare_parser.add_argument('--current', default=None, help='path of a results JSON file (the suite is run if '
+																 'omitted)')
+	compare_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+								help='relative growth of times and model sizes reported as a regression')
+	compare_parser.add_argument('--memory-tolerance', type=float, default=None,
+								help='relative growth of the peak memory reported as a regression (default: tolerance)')
+	for subparser in [run_parser, compare_parser]:
+		subparser.add_argument('--cases', nargs='+', default=None, choices=[case['name'] for case in SUITE])
+		subparser.add_argument('--backend', default='highs', choices=['gurobi', 'highs'])
+		subparser.add_argument('--repeats', type=int, default=3, help='number of solves per case')
+		subparser.add_argument('--time-limit', type=float, default=None, help='time limit of every solve in seconds')
+		subparser.add_argument('--output', default=None, help='path of the JSON results file')
+	arguments = parser.parse_args()
+
+	if arguments.command == 'run':
+		run_suite(arguments.cases, arguments.backend, arguments.repeats, arguments.time_limit,
+				  arguments.output or 'benchmark_baseline.json')
+	else:
+		with open(arguments.baseline) as json_file:
+			baseline = json.load(json_file)
+		if arguments.current is not None:
+			with open(arguments.current) as json_file:
+				current = json.load(json_file)
+		else:
+			current = run_suite(arguments.cases or sorted(baseline['cases']), arguments.backend, arguments.repeats,
+								arguments.time_limit, arguments.output)
+		regressions = compare_runs(baseline, current, arguments.tolerance, arguments.memory_tolerance)
+		print_comparison(baseline, current, regressions)
+		sys.exit(1 if regressions else 0)
@@ -0,0 +1,332 @@
+"""
+Tests of the sparse formulation solved with HiGHS, which run under pytest without a Gurobi license: every result is
+compared with the optimum found by enumerating all the edge subsets of small seeded instances.
+
+Example:
+	python -m pytest test_sparse_solver.py
+"""
+import itertools
+import random
+import networkx
+import pytest
+from ILP_solver.backends import OPTIMAL, INFEASIBLE, solve_sparse_mTCP_instance
+from ILP_solver.bounds import BOUND_METHODS, lower_bound_mTCP_instance
+from ILP_solver.cut_formulation import solve_cut_mTCP_instance
+from ILP_solver.decomposition import decomposition_instance
+from ILP_solver.heuristic import heuristic_mTCP_instance
+from ILP_solver.solution_cache import SolutionCache, instance_digest, solve_cached_mTCP_instance
+from ILP_solver.streaming import StreamingSolver, snapshots_from_existence
+from graph_tools.graph_generator import generate_graph, remove_waiting_self_loops
+from graph_tools.hand_built_instances import edge_reuse_TCP_instance, edge_reuse_mTCP_instance, alternative_paths_TCP_instance
+from graph_tools.temporal_instance import TemporalInstance
+
+# Instances with more edges than this are skipped, since brute_force_optimum enumerates 2 ** |E| subsets
+MAX_BRUTE_FORCE_EDGES = 14
+
+SEEDS = list(range(40))
+
+
+def small_instance(seed, num_destinations=1):
+	"""
+	Generates a small seeded instance from generate_graph, with extra destinations drawn among the other nodes.
+
+	:return: graph, existence_for_node_time, source, destinations
+	"""
+	random.seed(seed)
+	graph, existence_for_node_time, (source, destination) = generate_graph(num_nodes=5, edge_connectivity=0.35,
+																			active_time_percent=0.9, max_time=3,
+																			weight_distribution=(1.0, 5.0))
+	others = sorted(node for node in graph.nodes() if node not in (source, destination))
+	return graph, existence_for_node_time, source, [destination] + random.sample(others, num_destinations - 1)
+
+def chain_TCP_instance():
+	"""
+	A TCP instance of two parallel chains 1 -> 2 -> 3 -> 4 and 1 -> 5 -> 4 whose inner nodes are active only once, so
+	that the structural reduction contracts both chains and keeps the cheaper one.
+
+	:return: graph, existence_for_node_time, source, destinations
+	"""
+	graph = networkx.DiGraph()
+	graph.add_weighted_edges_from([(1, 2, 1.0), (2, 3, 1.0), (3, 4, 1.0), (1, 5, 2.0), (5, 4, 2.5)])
+	existence_for_node_time = {
+		(1, 0): 1, (1, 1): 0,
+		(2, 0): 1, (2, 1): 0,
+		(3, 0): 1, (3, 1): 0,
+		(4, 0): 0, (4, 1): 1,
+		(5, 0): 0, (5, 1): 1,
+	}
+	return graph, existence_for_node_time, 1, [4]
+
+def cycle_TCP_instance():
+	"""
+	A TCP instance whose nodes are active at every time, so that every time prefix of it is feasible and the streaming
+	solver carries its previous solution forward over the cycle 2 -> 3 -> 2.
+
+	:return: graph, existence_for_node_time, source, destinations
+	"""
+	graph = networkx.DiGraph()
+	graph.add_weighted_edges_from([(1, 2, 1.0), (2, 3, 1.0), (3, 2, 1.0), (1, 3, 3.0)])
+	existence_for_node_time = dict(((node, time), 1) for node in graph.nodes() for time in range(4))
+	return graph, existence_for_node_time, 1, [3]
+
+def solver_instances(num_destinations=1):
+	"""
+	:return: the hand-built instances and the small seeded instances that are small enough to enumerate
+	"""
+	graph, existence_for_node_time, (source, destination) = edge_reuse_TCP_instance()
+	instances = [(graph, existence_for_node_time, source, [destination])]
+	if num_destinations > 1:
+		instances = [edge_reuse_mTCP_instance()]
+	else:
+		graph, existence_for_node_time, (source, destination) = alternative_paths_TCP_instance()
+		instances.append((graph, existence_for_node_time, source, [destination]))
+		instances.append(chain_TCP_instance())
+		instances.append(cycle_TCP_instance())
+	for seed in SEEDS:
+		instance = small_instance(seed, num_destinations)
+		if instance[0].number_of_edges() <= MAX_BRUTE_FORCE_EDGES:
+			instances.append(instance)
+	return instances
+
+def connects(edges, existence_for_node_time, source, destinations, max_time, waiting=False):
+	"""
+	:param edges: a list of edges (u, v)
+	:param waiting: flag which when True lets paths wait at active nodes for free
+	:return: True if every destination is active at max_time and reachable from (source, 0) by a temporal path over
+			 the edges, which moves along an edge from (u, t) to (v, t) or (v, t + 1) between active nodes
+	"""
+	if not existence_for_node_time.get((source, 0)):
+		return False
+	reached = set([(source, 0)])
+	stack = [(source, 0)]
+	while stack:
+		node, time = stack.pop()
+		next_states = [(v, next_time) for u, v in edges if u == node for next_time in (time, time + 1)]
+		if waiting:
+			next_states.append((node, time + 1))
+		for state in next_states:
+			if state[1] <= max_time and existence_for_node_time.get(state) and state not in reached:
+				reached.add(state)
+				stack.append(state)
+	return all((destination, max_time) in reached for destination in destinations)
+
+def brute_force_optimum(graph, existence_for_node_time, source, destinations, waiting=False):
+	"""
+	:return: the cost of the cheapest edge subset that connects every destination (None if there is none)
+	"""
+	edges = graph.edges()
+	assert len(edges) <= MAX_BRUTE_FORCE_EDGES
+	max_time = max(time for _, time in existence_for_node_time)
+	best = None
+	for size in range(len(edges) + 1):
+		for subset in itertools.combinations(edges, size):
+			cost = sum(graph[u][v]['weight'] for u, v in subset)
+			if (best is None or cost < best) and connects(subset, existence_for_node_time, source, destinations,
+														  max_time, waiting):
+				best = cost
+	return best
+
+def check_optimal(subgraph, stats, optimum, graph, existence_for_node_time, source, destinations, waiting=False):
+	"""
+	Asserts that a solve returned a feasible subgraph of the graph with the brute force optimum cost, or found the
+	instance infeasible.
+	"""
+	if optimum is None:
+		assert subgraph is None and stats['status'] == INFEASIBLE
+		return
+	assert stats['status'] == OPTIMAL
+	assert abs(stats['objective'] - optimum) < 1e-6
+	assert abs(subgraph.size(weight='weight') - optimum) < 1e-6
+	assert all(graph.has_edge(u, v) for u, v in subgraph.edges())
+	max_time = max(time for _, time in existence_for_node_time)
+	assert connects(subgraph.edges(), existence_for_node_time, source, destinations, max_time, waiting)
+
+@pytest.mark.parametrize('num_destinations', [1, 2])
+def test_sparse_highs_matches_brute_force(num_destinations):
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations)
+		for use_heuristic, presolve in [(False, False), (True, False), (True, True)]:
+			subgraph, stats = solve_sparse_mTCP_instance(graph, existence_for_node_time, source, destinations,
+														 'highs', return_stats=True, quiet=True,
+														 use_heuristic=use_heuristic, presolve=presolve)
+			check_optimal(subgraph, stats, optimum, graph, existence_for_node_time, source, destinations)
+
+@pytest.mark.parametrize('num_destinations', [1, 2])
+def test_heuristic_is_feasible_upper_bound(num_destinations):
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations)
+		subgraph, cost = heuristic_mTCP_instance(graph, existence_for_node_time, source, destinations,
+												 detailed_output=False)
+		if optimum is None:
+			assert subgraph is None
+			continue
+		max_time = max(time for _, time in existence_for_node_time)
+		assert connects(subgraph.edges(), existence_for_node_time, source, destinations, max_time)
+		assert abs(subgraph.size(weight='weight') - cost) < 1e-6
+		assert cost >= optimum - 1e-6
+
+@pytest.mark.parametrize('num_destinations', [1, 2])
+def test_waiting_arcs_match_brute_force(num_destinations):
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		graph = remove_waiting_self_loops(graph)
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations, waiting=True)
+		for presolve in [False, True]:
+			subgraph, stats = solve_sparse_mTCP_instance(graph, existence_for_node_time, source, destinations,
+														 'highs', return_stats=True, quiet=True, presolve=presolve,
+														 waiting=True)
+			check_optimal(subgraph, stats, optimum, graph, existence_for_node_time, source, destinations, waiting=True)
+
+		subgraph, cost = heuristic_mTCP_instance(graph, existence_for_node_time, source, destinations,
+												 detailed_output=False, waiting=True)
+		if optimum is None:
+			assert subgraph is None
+			continue
+		max_time = max(time for _, time in existence_for_node_time)
+		assert connects(subgraph.edges(), existence_for_node_time, source, destinations, max_time, waiting=True)
+		assert cost >= optimum - 1e-6
+
+@pytest.mark.parametrize('waiting', [False, True])
+def test_reduced_graph_matches_brute_force(waiting):
+	contracted_nodes = 0
+	for num_destinations in [1, 2]:
+		for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+			if waiting:
+				graph = remove_waiting_self_loops(graph)
+			optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations, waiting)
+			subgraph, stats = solve_sparse_mTCP_instance(graph, existence_for_node_time, source, destinations,
+														 'highs', return_stats=True, quiet=True, reduce_graph=True,
+														 waiting=waiting)
+			# The subgraph is expanded back to edges of the original graph
+			check_optimal(subgraph, stats, optimum, graph, existence_for_node_time, source, destinations, waiting)
+			contracted_nodes += stats['reduction']['contracted_nodes']
+	assert contracted_nodes > 0
+
+def test_instance_digest_ignores_construction_order():
+	graph, existence_for_node_time, _, _ = small_instance(SEEDS[0])
+	reordered = networkx.DiGraph()
+	reordered.add_nodes_from(reversed(graph.nodes()))
+	edges = graph.edges(data='weight')
+	random.Random(0).shuffle(edges)
+	reordered.add_weighted_edges_from(edges)
+	digest = instance_digest(TemporalInstance.from_networkx(graph, existence_for_node_time))
+	assert instance_digest(TemporalInstance.from_networkx(reordered, existence_for_node_time)) == digest
+
+	# The canonical form is by label, so relabeling nodes or changing a weight gives another digest
+	relabeled = networkx.relabel_nodes(graph, dict((node, node + 100) for node in graph.nodes()))
+	relabeled_existence = dict(((node + 100, time), value) for (node, time), value in existence_for_node_time.items())
+	assert instance_digest(TemporalInstance.from_networkx(relabeled, relabeled_existence)) != digest
+	u, v = graph.edges()[0]
+	reordered[u][v]['weight'] += 1.0
+	assert instance_digest(TemporalInstance.from_networkx(reordered, existence_for_node_time)) != digest
+
+def test_solution_cache_hits_and_misses(tmp_path):
+	cache = SolutionCache(str(tmp_path))
+	for graph, existence_for_node_time, source, destinations in solver_instances(2):
+		first, first_stats = solve_cached_mTCP_instance(cache, graph, existence_for_node_time, source, destinations,
+														'highs', return_stats=True, quiet=True)
+		second, second_stats = solve_cached_mTCP_instance(cache, graph, existence_for_node_time, source, destinations,
+														  'highs', return_stats=True, quiet=True)
+		assert first_stats['cache'] == 'miss' and second_stats['cache'] == 'hit'
+		assert second_stats['objective'] == first_stats['objective']
+		assert (first is None) == (second is None)
+		if first is None:
+			continue
+		assert abs(second.size(weight='weight') - first.size(weight='weight')) < 1e-6
+
+		# Feasible solves stopped at a relative gap are not stored, a different waiting option is a different query
+		for _ in range(2):
+			_, stats = solve_cached_mTCP_instance(cache, graph, existence_for_node_time, source, destinations, 'highs',
+												  return_stats=True, quiet=True, waiting=True, mip_gap=0.5)
+			assert stats['cache'] == 'miss'
+
+def check_feasible_start(formulation, start):
+	"""
+	Asserts that a start vector satisfies every constraint of a formulation.
+	"""
+	assert (formulation.inequality_matrix.dot(start) <= formulation.inequality_rhs + 1e-6).all()
+	assert abs(formulation.equality_matrix.dot(start) - formulation.equality_rhs).max() < 1e-6
+	assert (start >= -1e-6).all() and (start <= formulation.upper_bounds + 1e-6).all()
+
+@pytest.mark.parametrize('waiting', [False, True])
+def test_streaming_solve_matches_brute_force(waiting):
+	carried_starts = 0
+	for num_destinations in [1, 2]:
+		for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+			if waiting:
+				graph = remove_waiting_self_loops(graph)
+			solver = StreamingSolver(graph, source, destinations, waiting=waiting)
+			for time, active_nodes in enumerate(snapshots_from_existence(graph, existence_for_node_time)):
+				solver.add_snapshot(active_nodes)
+				# The instance up to the latest snapshot, whose destinations are reached at that time
+				prefix = dict((key, value) for key, value in existence_for_node_time.items() if key[1] <= time)
+				optimum = brute_force_optimum(graph, prefix, source, destinations, waiting)
+				if solver.previous_values is not None and solver.is_connected():
+					# The previous solution is carried forward over the appended time step
+					formulation, _ = solver.window_formulation()
+					start = solver.expanding.carried_start(formulation, solver.previous_values, solver.previous_sizes,
+														   solver.destination_indices.tolist())
+					if start is not None:
+						check_feasible_start(formulation, start)
+						assert formulation.objective.dot(start) >= optimum - 1e-6
+						carried_starts += 1
+				subgraph, cost = solver.solve()
+				if optimum is None:
+					assert subgraph is None
+					continue
+				assert abs(cost - optimum) < 1e-6
+				assert connects(subgraph.edges(), prefix, source, destinations, time, waiting)
+	assert carried_starts > 0
+
+@pytest.mark.parametrize('method', BOUND_METHODS)
+@pytest.mark.parametrize('num_destinations', [1, 2])
+def test_bounds_surround_brute_force(num_destinations, method):
+	infeasible = 0
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations)
+		result = lower_bound_mTCP_instance(graph, existence_for_node_time, source, destinations, method,
+										   detailed_output=False)
+		if optimum is None:
+			assert not result.feasible
+			infeasible += 1
+			continue
+		assert result.feasible
+		assert result.lower_bound - 1e-6 <= optimum <= result.upper_bound + 1e-6
+	assert infeasible > 0
+
+@pytest.mark.parametrize('num_destinations, processes', [(1, 1), (2, 1), (2, 2)])
+def test_decomposition_is_feasible_upper_bound(num_destinations, processes):
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations)
+		result = decomposition_instance(TemporalInstance.from_networkx(graph, existence_for_node_time), source,
+										destinations, processes=processes)
+		if optimum is None:
+			assert result.subgraph is None
+			continue
+		max_time = max(time for _, time in existence_for_node_time)
+		assert connects(result.subgraph.edges(), existence_for_node_time, source, destinations, max_time)
+		assert abs(result.subgraph.size(weight='weight') - result.objective) < 1e-6
+		assert result.objective >= optimum - 1e-6
+
+@pytest.mark.parametrize('waiting', [False, True])
+@pytest.mark.parametrize('num_destinations', [1, 2])
+def test_cut_formulation_matches_brute_force(num_destinations, waiting):
+	for graph, existence_for_node_time, source, destinations in solver_instances(num_destinations):
+		if waiting:
+			graph = remove_waiting_self_loops(graph)
+		optimum = brute_force_optimum(graph, existence_for_node_time, source, destinations, waiting)
+		for use_heuristic, presolve in [(False, False), (True, True)]:
+			subgraph, stats = solve_cut_mTCP_instance(graph, existence_for_node_time, source, destinations, 'highs',
+													  return_stats=True, quiet=True, use_heuristic=use_heuristic,
+													  presolve=presolve, waiting=waiting)
+			check_optimal(subgraph, stats, optimum, graph, existence_for_node_time, source, destinations, waiting)
+
+def test_cut_formulation_unreachable_destination():
+	# The destination has an incoming edge, so the initial cuts do not prove the instance infeasible
+	graph = networkx.DiGraph()
+	graph.add_weighted_edges_from([(1, 2, 1.0), (2, 1, 1.0), (3, 4, 1.0), (4, 5, 1.0), (5, 3, 1.0)])
+	existence_for_node_time = dict(((node, time), 1) for node in graph.nodes() for time in range(3))
+	assert brute_force_optimum(graph, existence_for_node_time, 1, [4]) is None
+	for root_rounds in [0, 1]:
+		subgraph, stats = solve_cut_mTCP_instance(graph, existence_for_node_time, 1, [4], 'highs', return_stats=True,
+												  quiet=True, presolve=False, root_rounds=root_rounds)
+		assert subgraph is None and stats['status'] == INFEASIBLE
@@ -1,40 +1,69 @@
 """
-This file runs time-tests on ILP_solver by only varying one parameter.
-Graphs are also generated of results.
+This file plots the time-tests of ILP_solver written by benchmark_runner.py, where only one parameter is varied.
+Model building and solving times are averaged over seeds and plotted separately.
 """
+import csv
 import matplotlib.pyplot as plt
-from ILP_solver.ILP_solver import solve_TCP_instance
-from graph_tools.graph_generator import generate_graph
 
 
-def modulate_num_nodes():
-	num_nodes = [25*i for i in range(1,9)]
-	times = []
-	for node_count in num_nodes:
-		graph, existence_for_node_time, connectivity_demand = generate_graph(num_nodes=node_count)
-		times.append(solve_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_output=True))
-	print num_nodes, times
-	plot(num_nodes, times, "Number of Nodes", "Time (Seconds)", "TCP Runtime for Nodes vs Time ")
+def modulate_num_nodes(results_path='benchmark_results.csv'):
+	num_nodes, build_times, solve_times = average_times(load_results(results_path), 'num_nodes')
+	print(num_nodes, build_times, solve_times)
+	plot_times(num_nodes, build_times, solve_times, "Number of Nodes", "TCP Runtime for Nodes vs Time ")
 
 
-def modulate_edge_percentage_active():
-	percentage_edges_active = [0.05*i for i in range(1,21)]
-	times = []
-	for percentage in percentage_edges_active:
-		graph, existence_for_node_time, connectivity_demand = generate_graph(edge_connectivity=percentage)
-		times.append(solve_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_output=True))
-	print percentage_edges_active, times
-	plot(percentage_edges_active, times, "Percentage of Edges Active", "Time (Seconds)", "TCP Runtime for Percentage of Edge Active vs Time ")
+def modulate_edge_percentage_active(results_path='benchmark_results.csv'):
+	percentage_edges_active, build_times, solve_times = average_times(load_results(results_path), 'edge_connectivity')
+	print(percentage_edges_active, build_times, solve_times)
+	plot_times(percentage_edges_active, build_times, solve_times, "Percentage of Edges Active", "TCP Runtime for Percentage of Edge Active vs Time ")
 
 
-def modulate_node_percentage_active():
-	percentage_nodes_active = [0.05*i for i in range(1,21)]
-	times = []
-	for percentage in percentage_nodes_active:
-		graph, existence_for_node_time, connectivity_demand = generate_graph(active_time_percent=percentage)
-		times.append(solve_TCP_instance(graph, existence_for_node_time, connectivity_demand, time_output=True))
-	print percentage_nodes_active, times
-	plot(percentage_nodes_active, times, "Percentage of Edges Active", "Time (Seconds)", "TCP Runtime for Percentage of Edge Active vs Time ")
+def modulate_node_percentage_active(results_path='benchmark_results.csv'):
+	percentage_nodes_active, build_times, solve_times = average_times(load_results(results_path), 'active_time_percent')
+	print(percentage_nodes_active, build_times, solve_times)
+	plot_times(percentage_nodes_active, build_times, solve_times, "Percentage of Nodes Active", "TCP Runtime for Percentage of Node Active vs Time ")
+
+
+def modulate_max_time(results_path='benchmark_results.csv'):
+	max_times, build_times, solve_times = average_times(load_results(results_path), 'max_time')
+	print(max_times, build_times, solve_times)
+	plot_times(max_times, build_times, solve_times, "Number of Time Steps", "TCP Runtime for Time Steps vs Time ")
+
+
+def load_results(results_path):
+	"""
+	Reads the rows of a benchmark_runner.py CSV file.
+	"""
+	with open(results_path) as results_file:
+		return list(csv.DictReader(results_file))
+
+
+def average_times(results, parameter):
+	"""
+	Averages the build and solve times over seeds for every value of the varied parameter.
+
+	:return: values, mean build times, mean solve times
+	"""
+	times_for_value = {}
+	for row in results:
+		if row['parameter'] == parameter:
+			times_for_value.setdefault(float(row['value']), []).append((float(row['build_time']), float(row['solve_time'])))
+
+	values = sorted(times_for_value)
+	build_times = [sum(times[0] for times in times_for_value[value]) / len(times_for_value[value]) for value in values]
+	solve_times = [sum(times[1] for times in times_for_value[value]) / len(times_for_value[value]) for value in values]
+	return values, build_times, solve_times
+
+
+def plot_times(x, build_times, solve_times, x_axis, title):
+	plt.plot(x, build_times, "-o", label="Model building")
+	plt.plot(x, solve_times, "-o", label="Solving")
+	plt.plot(x, [build + solve for build, solve in zip(build_times, solve_times)], "-o", label="Total")
+	plt.legend()
+	plt.title(title)
+	plt.xlabel(x_axis)
+	plt.ylabel("Time (Seconds)")
+	plt.show()
 
 
 def plot(x,y, x_axis, y_axis, title):
@@ -47,3 +76,4 @@ def plot(x,y, x_axis, y_axis, title):
 #modulate_num_nodes()
 #modulate_edge_percentage_active()
 #modulate_node_percentage_active()
+#modulate_max_time()